@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import hmac
 import json
@@ -9,10 +10,12 @@ import httpx
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
 from database import get_db, User
+from cache import user_cache, TTLCache
 
 
 security = HTTPBearer()
@@ -92,29 +95,93 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
 
 
-def get_current_user(
+async def get_current_user(
     telegram_id: int = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
-    Mendapatkan user saat ini dari database
+    Mendapatkan user saat ini dari cache, atau dari database jika belum ada
     """
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await user_cache.get(telegram_id)
+    if user:
+        return user
+    
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    await user_cache.set(user)
     return user
 
 
+# Client HTTP bersama untuk Bot API (keep-alive), dibuat saat pertama dipakai
+_bot_api_client: Optional[httpx.AsyncClient] = None
+_bot_api_semaphore = asyncio.Semaphore(settings.telegram_api_max_concurrency)
+
+# Hasil getMe per hash token; hasil positif dan negatif punya TTL berbeda
+_bot_token_cache = TTLCache(settings.bot_token_cache_maxsize, settings.bot_token_cache_ttl)
+
+
+def get_bot_api_client() -> httpx.AsyncClient:
+    """
+    Mendapatkan client HTTP bersama untuk Telegram Bot API
+    """
+    global _bot_api_client
+    if _bot_api_client is None:
+        _bot_api_client = httpx.AsyncClient(
+            base_url=settings.telegram_api_base_url,
+            timeout=settings.telegram_api_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.telegram_api_max_concurrency,
+                max_keepalive_connections=settings.telegram_api_max_concurrency
+            )
+        )
+    return _bot_api_client
+
+
+async def close_bot_api_client():
+    """
+    Tutup client HTTP bersama (dipanggil saat aplikasi shutdown)
+    """
+    global _bot_api_client
+    if _bot_api_client is not None:
+        await _bot_api_client.aclose()
+        _bot_api_client = None
+
+
 async def verify_telegram_bot_token(bot_token: str) -> bool:
     """
     Verifikasi apakah bot token valid dengan memanggil Telegram API
     """
+    cache_key = hashlib.sha256(bot_token.encode()).hexdigest()
+    cached = _bot_token_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://api.telegram.org/bot{bot_token}/getMe")
-            return response.status_code == 200 and response.json().get("ok", False)
-    except:
-        return False
\ No newline at end of file
+        async with _bot_api_semaphore:
+            response = await get_bot_api_client().get(f"/bot{bot_token}/getMe")
+    except httpx.HTTPError:
+        # Gangguan jaringan tidak di-cache agar bisa dicoba lagi
+        return False
+    
+    if response.status_code == 200:
+        try:
+            data = response.json()
+        except ValueError:
+            # Bukan balasan Bot API (misal halaman proxy), jangan di-cache
+            return False
+        valid = isinstance(data, dict) and data.get("ok") is True
+    elif response.status_code in (401, 404):
+        # Token ditolak oleh Telegram
+        valid = False
+    else:
+        # Rate limit atau error server, jangan di-cache
+        return False
+    
+    ttl = settings.bot_token_cache_ttl if valid else settings.bot_token_negative_cache_ttl
+    _bot_token_cache.set(cache_key, valid, ttl)
+    return valid
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Benchmark throughput query proyek: session sinkron yang dijalankan langsung
+di event loop (cara lama) vs AsyncSession dengan connection pool.
+
+Jalankan di dalam container backend (butuh PostgreSQL yang aktif):
+
+    docker-compose exec backend python benchmarks/bench_async_db.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+from database import SessionLocal, Project, engine as async_engine
+
+
+async def run_sync_on_loop(total: int, concurrency: int, owner_id: int) -> float:
+    sync_engine = create_engine(settings.database_url, pool_size=concurrency)
+    SyncSession = sessionmaker(bind=sync_engine)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def handler():
+        async with semaphore:
+            db = SyncSession()
+            try:
+                db.query(Project).filter(Project.owner_id == owner_id).all()
+            finally:
+                db.close()
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[handler() for _ in range(total)])
+    elapsed = time.perf_counter() - start
+    sync_engine.dispose()
+    return total / elapsed
+
+
+async def run_async(total: int, concurrency: int, owner_id: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def handler():
+        async with semaphore:
+            async with SessionLocal() as db:
+                result = await db.execute(select(Project).where(Project.owner_id == owner_id))
+                result.scalars().all()
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[handler() for _ in range(total)])
+    elapsed = time.perf_counter() - start
+    return total / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--owner-id", type=int, default=0)
+    args = parser.parse_args()
+    
+    sync_rps = await run_sync_on_loop(args.requests, args.concurrency, args.owner_id)
+    async_rps = await run_async(args.requests, args.concurrency, args.owner_id)
+    await async_engine.dispose()
+    
+    print(f"requests={args.requests} concurrency={args.concurrency}")
+    print(f"sync session on event loop : {sync_rps:8.1f} req/s")
+    print(f"async session + pool       : {async_rps:8.1f} req/s")
+    print(f"speedup                    : {async_rps / sync_rps:8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
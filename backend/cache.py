@@ -0,0 +1,114 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from config import settings
+from database import User
+
+
+class TTLCache:
+    """
+    Cache in-process dengan eviction LRU dan masa berlaku (TTL) per entri
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+    
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def delete(self, key):
+        self._data.pop(key, None)
+    
+    def clear(self):
+        self._data.clear()
+
+
+class UserCache:
+    """
+    Cache data user untuk get_current_user. Lapisan pertama ada di memori
+    proses; jika Redis diaktifkan, entri juga dibagi antar proses API
+    sehingga invalidasi dari /auth/telegram berlaku di semua instance
+    """
+    
+    def __init__(self, maxsize: int, ttl: int, redis_url: Optional[str] = None, local_ttl: Optional[int] = None):
+        self.ttl = ttl
+        # Dengan Redis, TTL lokal dibuat pendek agar invalidasi dari instance
+        # lain cepat terlihat
+        self.local = TTLCache(maxsize, local_ttl if redis_url and local_ttl else ttl)
+        self.redis = aioredis.from_url(redis_url) if redis_url else None
+    
+    @staticmethod
+    def _redis_key(telegram_id: int) -> str:
+        return f"ziphostbot:user:{telegram_id}"
+    
+    @staticmethod
+    def _to_user(data: dict) -> User:
+        # Objek transient (tidak terikat session) yang cukup untuk kebutuhan auth
+        return User(
+            telegram_id=data["telegram_id"],
+            first_name=data["first_name"],
+            username=data["username"]
+        )
+    
+    async def get(self, telegram_id: int) -> Optional[User]:
+        data = self.local.get(telegram_id)
+        if data is None and self.redis is not None:
+            try:
+                raw = await self.redis.get(self._redis_key(telegram_id))
+            except Exception as e:
+                print(f"User cache Redis error: {e}")
+                raw = None
+            if raw is not None:
+                data = json.loads(raw)
+                self.local.set(telegram_id, data)
+        return self._to_user(data) if data is not None else None
+    
+    async def set(self, user: User):
+        data = {
+            "telegram_id": user.telegram_id,
+            "first_name": user.first_name,
+            "username": user.username
+        }
+        self.local.set(user.telegram_id, data)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._redis_key(user.telegram_id), json.dumps(data), ex=self.ttl)
+            except Exception as e:
+                print(f"User cache Redis error: {e}")
+    
+    async def invalidate(self, telegram_id: int):
+        self.local.delete(telegram_id)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._redis_key(telegram_id))
+            except Exception as e:
+                print(f"User cache Redis error: {e}")
+
+
+# Instance global
+user_cache = UserCache(
+    settings.user_cache_maxsize,
+    settings.user_cache_ttl,
+    settings.redis_url if settings.user_cache_redis else None,
+    settings.user_cache_local_ttl
+)
@@ -21,4 +21,11 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Start/stop dikirim ke queue control agar tidak antre di belakang build
+    task_routes={
+        'stop_project': {'queue': 'control'},
+        'start_project': {'queue': 'control'},
+        'wake_project': {'queue': 'control'},
+        'remove_project_images': {'queue': 'control'},
+    },
 )
\ No newline at end of file
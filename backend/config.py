@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import os
 
 
@@ -15,6 +15,10 @@ class Settings(BaseSettings):
     postgres_db: str
     postgres_host: str = "localhost"
     postgres_port: int = 5432
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800  # detik
+    db_pool_timeout: int = 30  # detik
     
     # Redis Configuration
     redis_host: str = "localhost"
@@ -27,10 +31,42 @@ class Settings(BaseSettings):
     minio_bucket_name: str
     minio_endpoint: str = "minio:9000"
     minio_secure: bool = False
+    minio_part_size: int = 5 * 1024 * 1024  # 5MB, ukuran minimum part S3
+    minio_max_concurrency: int = 8
+    minio_max_connections: int = 10
+    minio_timeout: int = 300  # detik
     
     # Application Configuration
     domain: str = "mgx.dev"
     max_file_size: int = 50 * 1024 * 1024  # 50MB
+    upload_chunk_size: int = 1024 * 1024  # 1MB
+    
+    # Cache Configuration
+    user_cache_ttl: int = 300  # detik
+    user_cache_local_ttl: int = 30  # detik, dipakai jika cache Redis aktif
+    user_cache_maxsize: int = 10000
+    user_cache_redis: bool = False
+    bot_token_cache_ttl: int = 300  # detik
+    bot_token_negative_cache_ttl: int = 30  # detik
+    bot_token_cache_maxsize: int = 10000
+    
+    # Telegram Bot API Configuration
+    telegram_api_base_url: str = "https://api.telegram.org"
+    telegram_api_timeout: float = 10.0  # detik
+    telegram_api_max_concurrency: int = 20
+    
+    # Task Dispatch (dedup per proyek, sama dengan worker)
+    build_dispatch_ttl: int = 2 * 60 * 60  # detik
+    control_dispatch_ttl: int = 5 * 60  # detik
+    
+    # Ingress webhook bot mode hibernasi
+    hibernation_buffer_max: int = 1000  # update per proyek yang di-buffer saat bot tidur
+    hibernation_buffer_ttl: int = 24 * 60 * 60  # detik, sama dengan retensi update Telegram
+    hibernation_delivery_timeout: float = 10.0  # detik, penerusan update ke container
+    
+    # Profil resource container bot (definisi batasnya ada di config worker)
+    resource_profiles: List[str] = ["small", "medium", "large"]
+    default_resource_profile: str = "small"
     
     class Config:
         env_file = ".env"
@@ -40,6 +76,10 @@ class Settings(BaseSettings):
     def database_url(self) -> str:
         return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
     
+    @property
+    def async_database_url(self) -> str:
+        return f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
+    
     @property
     def redis_url(self) -> str:
         return f"redis://{self.redis_host}:{self.redis_port}/{self.redis_db}"
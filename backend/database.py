@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Column, BigInteger, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, Text, DateTime, Enum, ForeignKey, Boolean
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import enum
@@ -8,9 +9,16 @@ import uuid
 
 from config import settings
 
-# Database engine
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Database engine (async, dengan connection pool yang bisa dikonfigurasi)
+engine = create_async_engine(
+    settings.async_database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    pool_timeout=settings.db_pool_timeout,
+    pool_pre_ping=True
+)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -21,6 +29,7 @@ class ProjectStatus(enum.Enum):
     RUNNING = "RUNNING"
     STOPPED = "STOPPED"
     FAILED = "FAILED"
+    HIBERNATED = "HIBERNATED"  # container dihentikan karena idle, dibangunkan saat ada update
 
 
 class User(Base):
@@ -42,9 +51,14 @@ class Project(Base):
     owner_id = Column(BigInteger, ForeignKey("users.telegram_id"), nullable=False)
     name = Column(Text, nullable=False)
     status = Column(Enum(ProjectStatus), default=ProjectStatus.PENDING)
+    pipeline_stage = Column(Text)  # tahap pipeline yang sedang/terakhir berjalan: queued, scan, build, run
     last_error_log = Column(Text)
     container_id = Column(Text)
+    docker_host = Column(Text)  # nama Docker host tempat container berjalan
+    resource_profile = Column(Text)  # profil resource container (small, medium, large)
+    hibernation_enabled = Column(Boolean, default=False)  # opt-in hibernasi saat idle (bot mode webhook)
     zip_storage_path = Column(Text)
+    zip_digest = Column(Text, index=True)
     encrypted_bot_token = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -53,10 +67,17 @@ class Project(Base):
     owner = relationship("User", back_populates="projects")
 
 
+class ZipObject(Base):
+    __tablename__ = "zip_objects"
+    
+    digest = Column(Text, primary_key=True)
+    storage_path = Column(Text, nullable=False, unique=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
\ No newline at end of file
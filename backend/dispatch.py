@@ -0,0 +1,40 @@
+import uuid
+from typing import List, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from celery_app import celery_app
+from config import settings
+
+# Sama dengan key yang dipakai worker (worker/locks.py)
+DISPATCH_KEY = "ziphostbot:dispatch:{project_id}:{action}"
+
+redis_client = aioredis.from_url(settings.redis_url)
+
+
+async def dispatch_once(project_id: str, action: str, task_name: str, args: List, ttl: int) -> Tuple[str, bool]:
+    """
+    Kirim task aksi proyek kecuali aksi yang sama masih berjalan. Return
+    (task_id, dikirim); request duplikat mendapat task_id yang sedang berjalan
+    """
+    key = DISPATCH_KEY.format(project_id=project_id, action=action)
+    task_id = str(uuid.uuid4())
+    
+    try:
+        if not await redis_client.set(key, task_id, nx=True, ex=ttl):
+            existing = await redis_client.get(key)
+            if existing is not None:
+                return existing.decode(), False
+            # Key kedaluwarsa di antara SET dan GET
+            await redis_client.set(key, task_id, ex=ttl)
+    except RedisError as e:
+        # Tanpa Redis task tetap dikirim; lock proyek di worker tetap berlaku
+        print(f"Error claiming dispatch {key}: {e}")
+    
+    celery_app.send_task(task_name, args=args, task_id=task_id)
+    return task_id, True
+
+
+async def close_dispatch_client():
+    await redis_client.close()
@@ -0,0 +1,116 @@
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+import httpx
+import redis.asyncio as aioredis
+
+from auth import get_bot_api_client
+from config import settings
+
+# Sama dengan key yang dipakai worker (worker/hibernation.py)
+ENDPOINT_KEY = "ziphostbot:hibernation:endpoint:{project_id}"
+BUFFER_KEY = "ziphostbot:hibernation:buffer:{project_id}"
+WAKE_STARTED_KEY = "ziphostbot:hibernation:wake_started:{project_id}"
+ACTIVITY_KEY = "ziphostbot:hibernation:activity"
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+redis_client = aioredis.from_url(settings.redis_url)
+
+# Client HTTP untuk meneruskan update ke container bot, dibuat saat pertama dipakai
+_delivery_client: Optional[httpx.AsyncClient] = None
+
+
+def webhook_secret(project_id: str) -> str:
+    """
+    Secret token webhook per proyek (sama dengan yang didaftarkan worker)
+    """
+    return hmac.new(settings.encryption_key.encode(), project_id.encode(), hashlib.sha256).hexdigest()
+
+
+def get_delivery_client() -> httpx.AsyncClient:
+    global _delivery_client
+    if _delivery_client is None:
+        _delivery_client = httpx.AsyncClient(timeout=settings.hibernation_delivery_timeout)
+    return _delivery_client
+
+
+async def record_activity(project_id: str):
+    """
+    Catat waktu update terakhir (dipakai worker untuk mendeteksi bot idle)
+    """
+    await redis_client.zadd(ACTIVITY_KEY, {project_id: time.time()})
+
+
+async def forward_update(project_id: str, update: bytes) -> bool:
+    """
+    Teruskan update langsung ke container jika bot aktif dan tidak ada update
+    lama yang masih menunggu replay. Return False jika update harus di-buffer
+    """
+    endpoint = await redis_client.get(ENDPOINT_KEY.format(project_id=project_id))
+    if endpoint is None or await redis_client.llen(BUFFER_KEY.format(project_id=project_id)):
+        return False
+    
+    try:
+        response = await get_delivery_client().post(
+            endpoint.decode(),
+            content=update,
+            headers={'Content-Type': 'application/json', SECRET_HEADER: webhook_secret(project_id)}
+        )
+    except httpx.TransportError as e:
+        # Container mati/restart: buffer dan publish ulang endpoint lewat wake
+        print(f"Error forwarding update to project {project_id}: {e}")
+        await redis_client.delete(ENDPOINT_KEY.format(project_id=project_id))
+        return False
+    
+    if response.status_code >= 400:
+        # Bot menerima update tapi gagal memprosesnya; tidak diulang
+        print(f"Bot of project {project_id} answered update with {response.status_code}")
+    return True
+
+
+async def buffer_update(project_id: str, update: bytes, cold_start: bool):
+    """
+    Simpan update sampai bot siap. cold_start=True menandai awal wake untuk
+    metrik latensi cold start
+    """
+    buffer_key = BUFFER_KEY.format(project_id=project_id)
+    pipe = redis_client.pipeline()
+    pipe.rpush(buffer_key, update)
+    pipe.ltrim(buffer_key, -settings.hibernation_buffer_max, -1)
+    pipe.expire(buffer_key, settings.hibernation_buffer_ttl)
+    if cold_start:
+        pipe.set(WAKE_STARTED_KEY.format(project_id=project_id), time.time(), nx=True, ex=settings.hibernation_buffer_ttl)
+    await pipe.execute()
+
+
+async def forget(project_id: str):
+    """
+    Hapus state hibernasi proyek yang dihapus
+    """
+    pipe = redis_client.pipeline()
+    pipe.delete(ENDPOINT_KEY.format(project_id=project_id))
+    pipe.delete(BUFFER_KEY.format(project_id=project_id))
+    pipe.delete(WAKE_STARTED_KEY.format(project_id=project_id))
+    pipe.zrem(ACTIVITY_KEY, project_id)
+    await pipe.execute()
+
+
+async def delete_webhook(bot_token: str):
+    """
+    Lepas webhook agar token bot bisa dipakai lagi dengan getUpdates
+    """
+    try:
+        await get_bot_api_client().post(f"/bot{bot_token}/deleteWebhook")
+    except httpx.HTTPError as e:
+        print(f"Error deleting webhook: {e}")
+
+
+async def close_hibernation_clients():
+    global _delivery_client
+    if _delivery_client is not None:
+        await _delivery_client.aclose()
+        _delivery_client = None
+    await redis_client.close()
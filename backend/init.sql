@@ -2,7 +2,7 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- Enum untuk status project
-CREATE TYPE project_status AS ENUM ('PENDING', 'PROCESSING', 'RUNNING', 'STOPPED', 'FAILED');
+CREATE TYPE project_status AS ENUM ('PENDING', 'PROCESSING', 'RUNNING', 'STOPPED', 'FAILED', 'HIBERNATED');
 
 -- Tabel users untuk menyimpan data pengguna dari Telegram
 CREATE TABLE users (
@@ -18,18 +18,81 @@ CREATE TABLE projects (
     owner_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
     name TEXT NOT NULL,
     status project_status DEFAULT 'PENDING',
+    pipeline_stage TEXT,
     last_error_log TEXT,
     container_id TEXT,
+    docker_host TEXT,
+    resource_profile TEXT,
+    hibernation_enabled BOOLEAN DEFAULT FALSE,
     zip_storage_path TEXT,
+    zip_digest TEXT,
     encrypted_bot_token TEXT NOT NULL,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Tabel zip_objects untuk file ZIP content-addressed (key = SHA-256 isi file)
+-- beserta jumlah proyek yang merujuknya
+CREATE TABLE zip_objects (
+    digest TEXT PRIMARY KEY,
+    storage_path TEXT NOT NULL UNIQUE,
+    size_bytes BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Transisi status project yang valid (harus sama dengan ALLOWED_TRANSITIONS
+-- di worker/database.py). Update ke status yang sama selalu diizinkan
+CREATE TABLE project_status_transitions (
+    from_status project_status NOT NULL,
+    to_status project_status NOT NULL,
+    PRIMARY KEY (from_status, to_status)
+);
+
+INSERT INTO project_status_transitions (from_status, to_status) VALUES
+    ('PENDING', 'PROCESSING'),
+    ('PENDING', 'FAILED'),
+    ('PROCESSING', 'RUNNING'),
+    ('PROCESSING', 'FAILED'),
+    ('RUNNING', 'STOPPED'),
+    ('RUNNING', 'FAILED'),
+    ('RUNNING', 'HIBERNATED'),
+    ('STOPPED', 'PROCESSING'),
+    ('STOPPED', 'RUNNING'),
+    ('STOPPED', 'FAILED'),
+    ('FAILED', 'PROCESSING'),
+    ('FAILED', 'RUNNING'),
+    ('FAILED', 'STOPPED'),
+    ('HIBERNATED', 'PROCESSING'),
+    ('HIBERNATED', 'RUNNING'),
+    ('HIBERNATED', 'STOPPED'),
+    ('HIBERNATED', 'FAILED');
+
+-- Tolak transisi status ilegal di database, termasuk dari update di luar worker
+CREATE OR REPLACE FUNCTION check_project_status_transition()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.status IS DISTINCT FROM OLD.status AND NOT EXISTS (
+        SELECT 1 FROM project_status_transitions
+        WHERE from_status = OLD.status AND to_status = NEW.status
+    ) THEN
+        RAISE EXCEPTION 'Invalid project status transition: % -> %', OLD.status, NEW.status
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER check_projects_status_transition
+    BEFORE UPDATE OF status ON projects
+    FOR EACH ROW
+    EXECUTE FUNCTION check_project_status_transition();
+
 -- Index untuk performa query
 CREATE INDEX idx_projects_owner_id ON projects(owner_id);
 CREATE INDEX idx_projects_status ON projects(status);
 CREATE INDEX idx_projects_created_at ON projects(created_at);
+CREATE INDEX idx_projects_zip_digest ON projects(zip_digest);
 
 -- Trigger untuk update timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
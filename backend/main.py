@@ -1,15 +1,23 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, Request, status, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional
+import hmac
 import uuid
 
 from database import get_db, User, Project, ProjectStatus
-from auth import verify_telegram_auth, create_access_token, get_current_user, verify_telegram_bot_token
+from auth import verify_telegram_auth, create_access_token, get_current_user, verify_telegram_bot_token, close_bot_api_client
 from encryption import token_encryption
-from storage import storage
-from celery_app import celery_app
+from cache import user_cache
+from storage import async_storage, FileTooLargeError
+from dispatch import dispatch_once, close_dispatch_client
+from hibernation import (
+    SECRET_HEADER, webhook_secret, record_activity, forward_update, buffer_update, forget, delete_webhook,
+    close_hibernation_clients
+)
+from metrics import MetricsMiddleware, metrics_response
 from config import settings
 
 app = FastAPI(title="ZipHostBot API", version="1.0.0")
@@ -23,14 +31,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latensi request per route (paling luar agar error dari middleware lain ikut terukur)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_bot_api_client()
+    await close_dispatch_client()
+    await close_hibernation_clients()
+
 
 @app.get("/")
 async def root():
     return {"message": "ZipHostBot API is running"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Endpoint scrape Prometheus (diblokir di nginx, hanya untuk jaringan internal)
+    """
+    return metrics_response()
+
+
 @app.post("/auth/telegram")
-async def telegram_auth(auth_data: Dict[str, Any], db: Session = Depends(get_db)):
+async def telegram_auth(auth_data: Dict[str, Any], db: AsyncSession = Depends(get_db)):
     """
     Endpoint untuk otentikasi menggunakan Telegram Login Widget
     """
@@ -46,7 +72,8 @@ async def telegram_auth(auth_data: Dict[str, Any], db: Session = Depends(get_db)
     username = auth_data.get("username")
     
     # Cari atau buat user
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    user = result.scalars().first()
     if not user:
         user = User(
             telegram_id=telegram_id,
@@ -54,13 +81,16 @@ async def telegram_auth(auth_data: Dict[str, Any], db: Session = Depends(get_db)
             username=username
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     else:
         # Update user info jika ada perubahan
         user.first_name = first_name
         user.username = username
-        db.commit()
+        await db.commit()
+    
+    # Data user berubah, buang entri lama dari cache
+    await user_cache.invalidate(telegram_id)
     
     # Buat JWT token
     access_token = create_access_token(data={"telegram_id": telegram_id})
@@ -79,12 +109,13 @@ async def telegram_auth(auth_data: Dict[str, Any], db: Session = Depends(get_db)
 @app.get("/projects")
 async def get_projects(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Mendapatkan daftar proyek milik user
     """
-    projects = db.query(Project).filter(Project.owner_id == current_user.telegram_id).all()
+    result = await db.execute(select(Project).where(Project.owner_id == current_user.telegram_id))
+    projects = result.scalars().all()
     
     return {
         "projects": [
@@ -92,6 +123,7 @@ async def get_projects(
                 "id": str(project.id),
                 "name": project.name,
                 "status": project.status.value,
+                "pipeline_stage": project.pipeline_stage,
                 "created_at": project.created_at.isoformat(),
                 "updated_at": project.updated_at.isoformat(),
                 "last_error_log": project.last_error_log
@@ -106,12 +138,21 @@ async def create_project(
     name: str = Form(...),
     bot_token: str = Form(...),
     zip_file: UploadFile = File(...),
+    resource_profile: Optional[str] = Form(None),
+    hibernation: bool = Form(False),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Membuat proyek baru dengan upload file ZIP
     """
+    resource_profile = resource_profile or settings.default_resource_profile
+    if resource_profile not in settings.resource_profiles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown resource profile, choose one of: {', '.join(settings.resource_profiles)}"
+        )
+    
     # Validasi file
     if not zip_file.filename.endswith('.zip'):
         raise HTTPException(
@@ -119,13 +160,14 @@ async def create_project(
             detail="File must be a ZIP archive"
         )
     
-    # Validasi ukuran file
-    file_content = await zip_file.read()
-    if len(file_content) > settings.max_file_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds maximum limit of {settings.max_file_size // (1024*1024)}MB"
-        )
+    # Validasi ukuran file (cek awal jika ukuran sudah diketahui, batas
+    # sebenarnya ditegakkan saat streaming ke MinIO)
+    file_too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds maximum limit of {settings.max_file_size // (1024*1024)}MB"
+    )
+    if zip_file.size is not None and zip_file.size > settings.max_file_size:
+        raise file_too_large
     
     # Validasi bot token
     if not await verify_telegram_bot_token(bot_token):
@@ -135,8 +177,12 @@ async def create_project(
         )
     
     try:
-        # Upload file ke MinIO
-        zip_storage_path = storage.upload_file(file_content, zip_file.filename)
+        # Upload file ke MinIO (dilewati jika isi yang sama sudah tersimpan)
+        zip_storage_path, zip_digest = await async_storage.store_file(
+            db,
+            zip_file.file,
+            max_size=settings.max_file_size
+        )
         
         # Enkripsi bot token
         encrypted_token = token_encryption.encrypt_token(bot_token)
@@ -146,16 +192,22 @@ async def create_project(
             owner_id=current_user.telegram_id,
             name=name,
             zip_storage_path=zip_storage_path,
+            zip_digest=zip_digest,
+            resource_profile=resource_profile,
+            hibernation_enabled=hibernation,
             encrypted_bot_token=encrypted_token,
             status=ProjectStatus.PENDING
         )
         
         db.add(project)
-        db.commit()
-        db.refresh(project)
+        await db.commit()
+        await db.refresh(project)
         
-        # Kirim task ke Celery worker
-        celery_app.send_task('process_project', args=[str(project.id)])
+        # Masukkan ke antrean build fair-share milik user
+        await dispatch_once(
+            str(project.id), 'build', 'enqueue_build',
+            [str(project.id), current_user.telegram_id], settings.build_dispatch_ttl
+        )
         
         return {
             "message": "Project created successfully",
@@ -163,7 +215,11 @@ async def create_project(
             "status": "PENDING"
         }
         
+    except FileTooLargeError:
+        await db.rollback()
+        raise file_too_large
     except Exception as e:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create project: {str(e)}"
@@ -174,7 +230,7 @@ async def create_project(
 async def get_project(
     project_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Mendapatkan detail proyek
@@ -187,10 +243,11 @@ async def get_project(
             detail="Invalid project ID format"
         )
     
-    project = db.query(Project).filter(
+    result = await db.execute(select(Project).where(
         Project.id == project_uuid,
         Project.owner_id == current_user.telegram_id
-    ).first()
+    ))
+    project = result.scalars().first()
     
     if not project:
         raise HTTPException(
@@ -202,10 +259,14 @@ async def get_project(
         "id": str(project.id),
         "name": project.name,
         "status": project.status.value,
+        "pipeline_stage": project.pipeline_stage,
         "created_at": project.created_at.isoformat(),
         "updated_at": project.updated_at.isoformat(),
         "last_error_log": project.last_error_log,
-        "container_id": project.container_id
+        "container_id": project.container_id,
+        "docker_host": project.docker_host,
+        "resource_profile": project.resource_profile,
+        "hibernation_enabled": project.hibernation_enabled
     }
 
 
@@ -213,7 +274,7 @@ async def get_project(
 async def delete_project(
     project_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Menghapus proyek
@@ -226,10 +287,11 @@ async def delete_project(
             detail="Invalid project ID format"
         )
     
-    project = db.query(Project).filter(
+    result = await db.execute(select(Project).where(
         Project.id == project_uuid,
         Project.owner_id == current_user.telegram_id
-    ).first()
+    ))
+    project = result.scalars().first()
     
     if not project:
         raise HTTPException(
@@ -239,15 +301,29 @@ async def delete_project(
     
     # Kirim task untuk stop container dan cleanup
     if project.container_id:
-        celery_app.send_task('stop_project', args=[str(project.id)])
+        await dispatch_once(str(project.id), 'stop', 'stop_project', [str(project.id)], settings.control_dispatch_ttl)
     
-    # Hapus file dari storage
-    if project.zip_storage_path:
-        storage.delete_file(project.zip_storage_path)
+    # Bot mode hibernasi: lepas webhook dan buang update yang di-buffer
+    if project.hibernation_enabled:
+        await delete_webhook(token_encryption.decrypt_token(project.encrypted_bot_token))
+        await forget(str(project.id))
+    
+    # Lepas referensi file di storage
+    zip_storage_path = project.zip_storage_path
+    unreferenced = zip_storage_path and await async_storage.delete_file(zip_storage_path, db)
     
     # Hapus dari database
-    db.delete(project)
-    db.commit()
+    await db.delete(project)
+    await db.commit()
+    
+    # Object dihapus setelah commit (jika tidak dipakai proyek lain), agar
+    # rollback tidak meninggalkan proyek yang file-nya sudah hilang
+    if unreferenced:
+        await async_storage.remove_unreferenced(db, zip_storage_path)
+        await db.commit()
+    
+    # Image proyek langsung dihapus dari semua host, tidak menunggu GC image
+    await dispatch_once(str(project.id), 'remove_images', 'remove_project_images', [str(project.id)], settings.control_dispatch_ttl)
     
     return {"message": "Project deleted successfully"}
 
@@ -256,7 +332,7 @@ async def delete_project(
 async def stop_project(
     project_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Menghentikan proyek yang sedang berjalan
@@ -269,10 +345,11 @@ async def stop_project(
             detail="Invalid project ID format"
         )
     
-    project = db.query(Project).filter(
+    result = await db.execute(select(Project).where(
         Project.id == project_uuid,
         Project.owner_id == current_user.telegram_id
-    ).first()
+    ))
+    project = result.scalars().first()
     
     if not project:
         raise HTTPException(
@@ -280,23 +357,23 @@ async def stop_project(
             detail="Project not found"
         )
     
-    if project.status != ProjectStatus.RUNNING:
+    if project.status not in [ProjectStatus.RUNNING, ProjectStatus.HIBERNATED]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Project is not running"
         )
     
-    # Kirim task untuk stop container
-    celery_app.send_task('stop_project', args=[str(project.id)])
+    # Kirim task untuk stop container (request ganda digabung ke task yang sama)
+    task_id, sent = await dispatch_once(str(project.id), 'stop', 'stop_project', [str(project.id)], settings.control_dispatch_ttl)
     
-    return {"message": "Stop request sent"}
+    return {"message": "Stop request sent" if sent else "Stop already in progress", "task_id": task_id}
 
 
 @app.post("/projects/{project_id}/start")
 async def start_project(
     project_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Memulai ulang proyek yang sudah di-build
@@ -309,10 +386,11 @@ async def start_project(
             detail="Invalid project ID format"
         )
     
-    project = db.query(Project).filter(
+    result = await db.execute(select(Project).where(
         Project.id == project_uuid,
         Project.owner_id == current_user.telegram_id
-    ).first()
+    ))
+    project = result.scalars().first()
     
     if not project:
         raise HTTPException(
@@ -326,10 +404,44 @@ async def start_project(
             detail="Project cannot be started in current state"
         )
     
-    # Kirim task untuk start container
-    celery_app.send_task('start_project', args=[str(project.id)])
+    # Kirim task untuk start container (request ganda digabung ke task yang sama)
+    task_id, sent = await dispatch_once(str(project.id), 'start', 'start_project', [str(project.id)], settings.control_dispatch_ttl)
+    
+    return {"message": "Start request sent" if sent else "Start already in progress", "task_id": task_id}
+
+
+@app.post("/telegram/webhook/{project_id}")
+async def telegram_webhook(project_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Ingress webhook untuk bot mode hibernasi: update diteruskan ke container
+    yang aktif, atau di-buffer (dan proyek dibangunkan) selama bot tidur
+    """
+    if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), webhook_secret(project_id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid secret token"
+        )
+    
+    update = await request.body()
+    await record_activity(project_id)
+    if await forward_update(project_id, update):
+        return {"ok": True}
+    
+    # Jalur dingin: hanya di sini status proyek dibaca dari database
+    result = await db.execute(
+        select(Project.status, Project.hibernation_enabled).where(Project.id == uuid.UUID(project_id))
+    )
+    project = result.first()
+    if not project or not project.hibernation_enabled or project.status in [ProjectStatus.STOPPED, ProjectStatus.FAILED]:
+        # Update dibuang; 200 agar Telegram tidak mengirim ulang
+        return {"ok": True}
+    
+    # Proyek yang sedang diproses mendapat replay saat tahap run selesai
+    await buffer_update(project_id, update, cold_start=project.status == ProjectStatus.HIBERNATED)
+    if project.status in [ProjectStatus.RUNNING, ProjectStatus.HIBERNATED]:
+        await dispatch_once(project_id, 'wake', 'wake_project', [project_id], settings.control_dispatch_ttl)
     
-    return {"message": "Start request sent"}
+    return {"ok": True}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import time
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Label dibatasi nilai yang jumlahnya tetap: template route (bukan path
+# dengan ID proyek), method dan kelas status
+REQUEST_SECONDS = Histogram(
+    'ziphostbot_http_request_duration_seconds',
+    'Latensi request API',
+    ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+MINIO_ERRORS = Counter('ziphostbot_minio_errors_total', 'Error dari MinIO', ['kind'])
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def record_minio_error(error: Exception):
+    """
+    Hitung error MinIO per kode error S3 (NoSuchKey, AccessDenied, ...)
+    """
+    MINIO_ERRORS.labels(getattr(error, 'code', None) or type(error).__name__).inc()
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI pengukur latensi request. Dibuat ASGI murni (bukan
+    BaseHTTPMiddleware) agar tidak menambah task dan antrean per request
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route diisi router FastAPI setelah path cocok; path yang tidak
+            # dikenal digabung agar scan URL tidak membuat series baru
+            route = scope.get('route')
+            method = scope['method'] if scope['method'] in METHODS else 'OTHER'
+            REQUEST_SECONDS.labels(
+                method, getattr(route, 'path', 'other'), f"{status_code // 100}xx"
+            ).observe(time.perf_counter() - started)
+
+
+def metrics_response() -> Response:
+    """
+    Response format teks Prometheus untuk endpoint /metrics
+    """
+    return Response(generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
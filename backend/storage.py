@@ -1,18 +1,118 @@
 from minio import Minio
 from minio.error import S3Error
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import certifi
+import hashlib
 import io
-from typing import Optional
-import uuid
+import urllib3
+from typing import Optional, BinaryIO, Tuple
 from config import settings
+from database import ZipObject
+from metrics import record_minio_error
+
+
+# Prefix object content-addressed; object lain berasal dari sebelum ada
+# reference count dan hanya dipakai satu proyek
+CONTENT_PREFIX = "sha256/"
+
+
+class FileTooLargeError(Exception):
+    """
+    Dilempar ketika upload melebihi batas ukuran yang diizinkan
+    """
+    pass
+
+
+class HashingReader:
+    """
+    Pembungkus file-like yang menghitung SHA-256 dan ukuran data secara
+    bertahap saat dibaca, serta menghentikan pembacaan begitu batas ukuran
+    terlampaui
+    """
+    
+    def __init__(self, file_obj: BinaryIO, max_size: Optional[int] = None):
+        self.file_obj = file_obj
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file_obj.read(size)
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise FileTooLargeError(f"File exceeds maximum size of {self.max_size} bytes")
+        self._hash.update(chunk)
+        return chunk
+    
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+
+def _retain_statement(digest: str, object_name: str, size: int):
+    """
+    Tambah reference count object (baris dibuat jika belum ada) dan return
+    count barunya. Baris tetap terkunci sampai transaksi di-commit
+    """
+    return (
+        insert(ZipObject)
+        .values(digest=digest, storage_path=object_name, size_bytes=size, ref_count=1)
+        .on_conflict_do_update(
+            index_elements=[ZipObject.digest],
+            set_={"ref_count": ZipObject.ref_count + 1}
+        )
+        .returning(ZipObject.ref_count)
+    )
+
+
+def _release_statement(file_path: str):
+    """
+    Kurangi reference count object dan return digest beserta sisa count-nya
+    """
+    return (
+        update(ZipObject)
+        .where(ZipObject.storage_path == file_path)
+        .values(ref_count=ZipObject.ref_count - 1)
+        .returning(ZipObject.digest, ZipObject.ref_count)
+    )
+
+
+def _lock_statement(file_path: str):
+    """
+    Kunci baris object untuk dihapus
+    """
+    return (
+        select(ZipObject.digest, ZipObject.ref_count)
+        .where(ZipObject.storage_path == file_path)
+        .with_for_update()
+    )
 
 
 class MinIOStorage:
     def __init__(self):
+        # Satu connection pool keep-alive dipakai bersama oleh semua request
+        http_client = urllib3.PoolManager(
+            maxsize=settings.minio_max_connections,
+            timeout=urllib3.Timeout(connect=10, read=settings.minio_timeout),
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=certifi.where(),
+            retries=urllib3.Retry(
+                total=5,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
         self.client = Minio(
             settings.minio_endpoint,
             access_key=settings.minio_root_user,
             secret_key=settings.minio_root_password,
-            secure=settings.minio_secure
+            secure=settings.minio_secure,
+            http_client=http_client
         )
         self.bucket_name = settings.minio_bucket_name
         self._ensure_bucket_exists()
@@ -25,30 +125,95 @@ class MinIOStorage:
             if not self.client.bucket_exists(self.bucket_name):
                 self.client.make_bucket(self.bucket_name)
         except S3Error as e:
+            record_minio_error(e)
             print(f"Error creating bucket: {e}")
     
-    def upload_file(self, file_data: bytes, filename: str) -> str:
+    @staticmethod
+    def object_name_for(digest: str) -> str:
+        """
+        Nama object berbasis isi (content-addressed) untuk digest SHA-256
+        """
+        return f"{CONTENT_PREFIX}{digest}.zip"
+    
+    def hash_file(self, file_obj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Hitung SHA-256 dan ukuran file secara bertahap. Return (digest, ukuran)
+        """
+        reader = HashingReader(file_obj, max_size)
+        while reader.read(settings.upload_chunk_size):
+            pass
+        return reader.sha256, reader.size
+    
+    def object_exists(self, object_name: str) -> bool:
         """
-        Upload file ke MinIO dan return path
+        Cek apakah object sudah ada di bucket
         """
         try:
-            # Generate unique filename
-            file_extension = filename.split('.')[-1] if '.' in filename else ''
-            unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
-            
-            # Upload file
+            self.client.stat_object(self.bucket_name, object_name)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            record_minio_error(e)
+            raise Exception(f"Failed to stat file: {e}")
+    
+    def upload_stream(self, file_obj: BinaryIO, object_name: str, length: int = -1):
+        """
+        Upload file secara streaming (multipart) ke MinIO tanpa memuat seluruh
+        isi file ke memori
+        """
+        try:
+            # Client membaca per part_size dan mengirim multipart upload;
+            # upload dibatalkan otomatis bila terjadi error
             self.client.put_object(
                 self.bucket_name,
-                unique_filename,
-                io.BytesIO(file_data),
-                length=len(file_data),
+                object_name,
+                file_obj,
+                length=length,
+                part_size=settings.minio_part_size,
                 content_type='application/zip'
             )
-            
-            return unique_filename
         except S3Error as e:
+            record_minio_error(e)
             raise Exception(f"Failed to upload file: {e}")
     
+    def upload_file(self, file_data: bytes, filename: str) -> str:
+        """
+        Upload file ke MinIO dan return path. Isi yang sama selalu
+        disimpan di path yang sama sehingga tidak ada duplikasi
+        """
+        digest = hashlib.sha256(file_data).hexdigest()
+        object_name = self.object_name_for(digest)
+        if not self.object_exists(object_name):
+            self.upload_stream(io.BytesIO(file_data), object_name, len(file_data))
+        return object_name
+    
+    def store_file(self, db: Session, file_obj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, str]:
+        """
+        Simpan file secara content-addressed dan tambah reference count-nya.
+        Upload dilewati jika isi yang sama sudah tersimpan. Return (path, digest).
+        
+        Upload dilakukan sebelum baris zip_objects dikunci agar upload lain
+        dengan isi yang sama tidak menunggu. Baris tetap terkunci sampai
+        caller melakukan commit, sehingga remove_unreferenced yang berjalan
+        bersamaan tidak bisa menghapus object ini.
+        """
+        digest, size = self.hash_file(file_obj, max_size)
+        object_name = self.object_name_for(digest)
+        
+        if not self.object_exists(object_name):
+            file_obj.seek(0)
+            self.upload_stream(file_obj, object_name, size)
+        
+        # Referensi pertama: object bisa dihapus remove_unreferenced sebelum
+        # baris terkunci, jadi dicek ulang (jarang, hanya isi yang baru)
+        ref_count = db.execute(_retain_statement(digest, object_name, size)).scalar_one()
+        if ref_count == 1 and not self.object_exists(object_name):
+            file_obj.seek(0)
+            self.upload_stream(file_obj, object_name, size)
+        
+        return object_name, digest
+    
     def download_file(self, file_path: str) -> bytes:
         """
         Download file dari MinIO
@@ -57,23 +222,127 @@ class MinIOStorage:
             response = self.client.get_object(self.bucket_name, file_path)
             return response.read()
         except S3Error as e:
+            record_minio_error(e)
             raise Exception(f"Failed to download file: {e}")
         finally:
             if 'response' in locals():
                 response.close()
                 response.release_conn()
     
-    def delete_file(self, file_path: str) -> bool:
+    def delete_file(self, file_path: str, db: Optional[Session] = None) -> bool:
         """
-        Hapus file dari MinIO
+        Hapus file dari MinIO. Jika session database diberikan, hanya
+        reference count yang dikurangi (caller melakukan commit) dan return
+        True jika object tidak dipakai proyek lain lagi: setelah commit
+        caller memanggil remove_unreferenced untuk menghapusnya.
+        """
+        if db is None:
+            return self.remove_object(file_path)
+        row = db.execute(_release_statement(file_path)).first()
+        return row is None or row.ref_count <= 0
+    
+    def remove_unreferenced(self, db: Session, file_path: str) -> bool:
+        """
+        Hapus object yang reference count-nya sudah 0 beserta barisnya.
+        Baris dikunci selama object dihapus sehingga store_file untuk isi
+        yang sama menunggu lalu meng-upload ulang. Caller melakukan commit.
+        """
+        row = db.execute(_lock_statement(file_path)).first()
+        if not self._remove_locked(file_path, row):
+            return False
+        if row is not None:
+            db.execute(delete(ZipObject).where(ZipObject.digest == row.digest))
+        return True
+    
+    def _remove_locked(self, file_path: str, row) -> bool:
+        """
+        Hapus object jika baris terkuncinya (atau ketiadaan baris) menandakan
+        tidak ada referensi lagi. Object content-addressed tanpa baris
+        dilewati: barisnya bisa sedang dibuat store_file yang belum commit
+        """
+        if row is None:
+            if file_path.startswith(CONTENT_PREFIX):
+                return False
+        elif row.ref_count > 0:
+            return False
+        return self.remove_object(file_path)
+    
+    def remove_object(self, file_path: str) -> bool:
+        """
+        Hapus object dari MinIO tanpa memeriksa reference count
         """
         try:
             self.client.remove_object(self.bucket_name, file_path)
             return True
         except S3Error as e:
+            record_minio_error(e)
             print(f"Error deleting file: {e}")
             return False
 
 
+class AsyncMinIOStorage:
+    """
+    Storage non-blocking untuk handler async. Setiap panggilan ke client
+    MinIO (yang sinkron) dijalankan di thread pool sehingga event loop
+    tidak tertahan, dengan jumlah operasi paralel dibatasi semaphore
+    """
+    
+    def __init__(self, storage: MinIOStorage, max_concurrency: int):
+        self.storage = storage
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def _run(self, func, *args):
+        async with self._semaphore:
+            return await run_in_threadpool(func, *args)
+    
+    async def object_exists(self, object_name: str) -> bool:
+        return await self._run(self.storage.object_exists, object_name)
+    
+    async def upload_file(self, file_data: bytes, filename: str) -> str:
+        return await self._run(self.storage.upload_file, file_data, filename)
+    
+    async def store_file(self, db: AsyncSession, file_obj: BinaryIO, max_size: Optional[int] = None) -> Tuple[str, str]:
+        """
+        Versi async dari MinIOStorage.store_file
+        """
+        digest, size = await self._run(self.storage.hash_file, file_obj, max_size)
+        object_name = self.storage.object_name_for(digest)
+        
+        if not await self.object_exists(object_name):
+            file_obj.seek(0)
+            await self._run(self.storage.upload_stream, file_obj, object_name, size)
+        
+        ref_count = (await db.execute(_retain_statement(digest, object_name, size))).scalar_one()
+        if ref_count == 1 and not await self.object_exists(object_name):
+            file_obj.seek(0)
+            await self._run(self.storage.upload_stream, file_obj, object_name, size)
+        
+        return object_name, digest
+    
+    async def download_file(self, file_path: str) -> bytes:
+        return await self._run(self.storage.download_file, file_path)
+    
+    async def delete_file(self, file_path: str, db: Optional[AsyncSession] = None) -> bool:
+        """
+        Versi async dari MinIOStorage.delete_file
+        """
+        if db is None:
+            return await self._run(self.storage.remove_object, file_path)
+        row = (await db.execute(_release_statement(file_path))).first()
+        return row is None or row.ref_count <= 0
+    
+    async def remove_unreferenced(self, db: AsyncSession, file_path: str) -> bool:
+        """
+        Versi async dari MinIOStorage.remove_unreferenced
+        """
+        row = (await db.execute(_lock_statement(file_path))).first()
+        if not await self._run(self.storage._remove_locked, file_path, row):
+            return False
+        if row is not None:
+            await db.execute(delete(ZipObject).where(ZipObject.digest == row.digest))
+        return True
+
+
 # Instance global
-storage = MinIOStorage()
\ No newline at end of file
+storage = MinIOStorage()
+async_storage = AsyncMinIOStorage(storage, settings.minio_max_concurrency)
\ No newline at end of file
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Konfigurasi minimal agar modul backend bisa di-import tanpa .env
+os.environ.setdefault("PLATFORM_BOT_TOKEN", "123456:test-platform-token")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("MINIO_ROOT_USER", "test")
+os.environ.setdefault("MINIO_ROOT_PASSWORD", "test")
+os.environ.setdefault("MINIO_BUCKET_NAME", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,141 @@
+"""
+Test verify_telegram_bot_token terhadap stub Bot API (httpx.MockTransport)
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import auth
+import cache
+from config import settings
+
+VALID_TOKEN = "111:valid"
+INVALID_TOKEN = "222:invalid"
+
+
+class BotApiStub:
+    """
+    Stub getMe: balasan per token bisa diatur, mencatat jumlah request dan
+    request yang berjalan bersamaan
+    """
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.responses = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            token = request.url.path.split("/")[1][len("bot"):]
+            response = self.responses.get(token)
+            if isinstance(response, Exception):
+                raise response
+            if response is not None:
+                return response
+            if token == INVALID_TOKEN:
+                return httpx.Response(401, json={"ok": False, "error_code": 401, "description": "Unauthorized"})
+            return httpx.Response(200, json={"ok": True, "result": {"id": 1, "is_bot": True}})
+        finally:
+            self.in_flight -= 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = BotApiStub()
+    client = httpx.AsyncClient(base_url=settings.telegram_api_base_url, transport=httpx.MockTransport(stub.handler))
+    monkeypatch.setattr(auth, "_bot_api_client", client)
+    auth._bot_token_cache.clear()
+    yield stub
+    auth._bot_token_cache.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def verify(token: str) -> bool:
+    return asyncio.run(auth.verify_telegram_bot_token(token))
+
+
+def test_shared_client_is_reused_and_closed(monkeypatch):
+    monkeypatch.setattr(auth, "_bot_api_client", None)
+    client = auth.get_bot_api_client()
+    assert auth.get_bot_api_client() is client
+    assert str(client.base_url).rstrip("/") == settings.telegram_api_base_url
+    
+    asyncio.run(auth.close_bot_api_client())
+    assert client.is_closed
+    assert auth._bot_api_client is None
+
+
+def test_valid_token_cached_for_positive_ttl(stub, clock):
+    assert verify(VALID_TOKEN) is True
+    clock.now += settings.bot_token_cache_ttl - 1
+    assert verify(VALID_TOKEN) is True
+    assert stub.requests == 1
+    
+    clock.now += 2
+    assert verify(VALID_TOKEN) is True
+    assert stub.requests == 2
+
+
+def test_invalid_token_cached_for_negative_ttl(stub, clock):
+    assert verify(INVALID_TOKEN) is False
+    clock.now += settings.bot_token_negative_cache_ttl - 1
+    assert verify(INVALID_TOKEN) is False
+    assert stub.requests == 1
+    
+    clock.now += 2
+    assert verify(INVALID_TOKEN) is False
+    assert stub.requests == 2
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(429, json={"ok": False, "error_code": 429, "parameters": {"retry_after": 5}}),
+    httpx.Response(500, text="Internal Server Error"),
+    httpx.Response(502, text="Bad Gateway"),
+    httpx.Response(200, text="<html>captive portal</html>"),
+    httpx.ConnectError("connection refused"),
+    httpx.ReadTimeout("timed out"),
+])
+def test_transient_failures_are_not_cached(stub, response):
+    stub.responses[VALID_TOKEN] = response
+    assert verify(VALID_TOKEN) is False
+    
+    # Setelah gangguan selesai token yang sama langsung diverifikasi ulang
+    del stub.responses[VALID_TOKEN]
+    assert verify(VALID_TOKEN) is True
+    assert stub.requests == 2
+
+
+def test_concurrent_requests_are_capped(stub, monkeypatch):
+    stub.delay = 0.02
+    limit = 3
+    
+    async def run():
+        monkeypatch.setattr(auth, "_bot_api_semaphore", asyncio.Semaphore(limit))
+        tokens = [f"{index}:token" for index in range(limit * 4)]
+        return await asyncio.gather(*(auth.verify_telegram_bot_token(token) for token in tokens))
+    
+    assert all(asyncio.run(run()))
+    assert stub.requests == limit * 4
+    assert stub.max_in_flight == limit
@@ -24,6 +24,8 @@ export default function ProjectCard({ project, onUpdate }: ProjectCardProps) {
         return 'status-badge status-stopped';
       case 'FAILED':
         return 'status-badge status-failed';
+      case 'HIBERNATED':
+        return 'status-badge status-hibernated';
       default:
         return 'status-badge status-pending';
     }
@@ -66,6 +68,7 @@ export default function ProjectCard({ project, onUpdate }: ProjectCardProps) {
         <h3 className="text-lg font-semibold text-gray-900">{project.name}</h3>
         <span className={getStatusClass(project.status)}>
           {project.status}
+          {(project.status === 'PENDING' || project.status === 'PROCESSING') && project.pipeline_stage && ` (${project.pipeline_stage})`}
         </span>
       </div>
 
@@ -87,7 +90,7 @@ export default function ProjectCard({ project, onUpdate }: ProjectCardProps) {
       )}
 
       <div className="flex gap-2">
-        {project.status === 'RUNNING' && (
+        {(project.status === 'RUNNING' || project.status === 'HIBERNATED') && (
           <button
             onClick={() => handleAction('stop')}
             disabled={loading}
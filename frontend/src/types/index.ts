@@ -7,11 +7,14 @@ export interface User {
 export interface Project {
   id: string;
   name: string;
-  status: 'PENDING' | 'PROCESSING' | 'RUNNING' | 'STOPPED' | 'FAILED';
+  status: 'PENDING' | 'PROCESSING' | 'RUNNING' | 'STOPPED' | 'FAILED' | 'HIBERNATED';
+  pipeline_stage?: 'queued' | 'scan' | 'build' | 'run' | null;
   created_at: string;
   updated_at: string;
   last_error_log?: string;
   container_id?: string;
+  resource_profile?: 'small' | 'medium' | 'large';
+  hibernation_enabled?: boolean;
 }
 
 export interface TelegramAuthData {
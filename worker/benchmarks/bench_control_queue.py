@@ -0,0 +1,192 @@
+"""
+Benchmark latensi stop/start proyek terhadap SLO: queue bersama dengan pool
+2 slot (cara lama, stop antre di belakang build) vs routing yang
+dikonfigurasi di tasks (task_routes: stop_project/start_project ke queue
+control yang dilayani pool thread seperti worker_control, build di queue
+build). Task stop_project dan start_project asli dijalankan oleh worker
+Celery di proses ini (broker memory://, task tidak bocor ke worker
+sungguhan) terhadap daemon Docker palsu dan tabel proyek palsu.
+
+Butuh konfigurasi worker dan Redis (settings.redis_url) untuk lock proyek,
+misalnya di container worker:
+
+    python benchmarks/bench_control_queue.py --builds 4 --stops 50 --starts 20 --slo 1.0
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from contextlib import ExitStack
+
+from celery.contrib.testing.worker import start_worker
+from kombu.transport import memory
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_db import FakeProjects
+from fake_docker import FakeDockerDaemon
+
+from config import settings
+from database import ProjectStatus
+from docker_hosts import DockerHostPool, PROJECT_LABEL
+from encryption import token_encryption
+import image_gc
+import tasks
+
+HOST = "bench"
+POLLING_INTERVAL = 0.005
+
+_drain_events = memory.Transport.drain_events
+
+
+def drain_events(self, connection, timeout=None):
+    # Worker dengan transport memory memakai synloop yang menjalankan ack
+    # tertunda (dari thread pool) hanya di antara drain_events dengan timeout
+    # 2 detik, sehingga slot yang kosong menunggu. Dengan Redis worker memakai
+    # event loop; timeout dipendekkan agar perilakunya sama
+    return _drain_events(self, connection, timeout=POLLING_INTERVAL if timeout else timeout)
+
+
+memory.Transport.drain_events = drain_events
+
+
+@tasks.app.task(name='bench_build')
+def bench_build():
+    # Pengganti build_project: satu request build yang lama di daemon build
+    for _ in tasks.host_pool.client(HOST).api.build(fileobj=iter([b'']), custom_context=True, decode=True):
+        pass
+
+
+def add_projects(daemon: FakeDockerDaemon, projects: FakeProjects, stops: int, starts: int) -> list:
+    """
+    Proyek RUNNING (untuk stop) dan STOPPED (untuk start) berselang-seling,
+    urutan request yang akan dikirim
+    """
+    encrypted_token = token_encryption.encrypt_token("123456:bench-token")
+    requests = []
+    for i in range(max(stops, starts)):
+        if i < stops:
+            project_id = str(uuid.uuid4())
+            container_id = daemon.add_container(name=f"ziphostbot_{project_id}", labels={PROJECT_LABEL: project_id})
+            projects.add(project_id, container_id=container_id, docker_host=HOST, encrypted_bot_token=encrypted_token)
+            requests.append((tasks.stop_project, project_id, ProjectStatus.STOPPED))
+        if i < starts:
+            project_id = str(uuid.uuid4())
+            daemon.images.add(image_gc.project_image_tag(project_id))
+            projects.add(project_id, status=ProjectStatus.STOPPED, resource_profile="small", encrypted_bot_token=encrypted_token)
+            requests.append((tasks.start_project, project_id, ProjectStatus.RUNNING))
+    return requests
+
+
+def run_scenario(daemon: FakeDockerDaemon, workers: list, builds: int, stops: int, starts: int,
+                 interval: float, queue: str = None) -> tuple:
+    """
+    Jalankan worker (queues, concurrency) lalu kirim build dan request
+    stop/start. queue=None memakai task_routes, selain itu semua task dikirim
+    ke queue itu. Return latensi stop dan start (kirim -> status berubah)
+    """
+    projects = FakeProjects()
+    projects.install()
+    requests = add_projects(daemon, projects, stops, starts)
+    options = {'queue': queue} if queue else {}
+    submitted = {}
+    
+    with ExitStack() as stack:
+        for queues, concurrency in workers:
+            stack.enter_context(start_worker(tasks.app, pool='threads', concurrency=concurrency, queues=queues,
+                                             perform_ping_check=False, shutdown_timeout=60))
+        for _ in range(builds):
+            bench_build.apply_async(**options)
+        # Beri waktu build mengambil slot dulu, seperti build yang sudah berjalan
+        time.sleep(0.05)
+        for task, project_id, _ in requests:
+            submitted[project_id] = time.time()
+            task.apply_async(args=[project_id], **options)
+            time.sleep(interval)
+        
+        deadline = time.time() + 60 + builds * daemon.build_delay
+        while time.time() < deadline and any(projects.get(project_id)['status'] != status for _, project_id, status in requests):
+            time.sleep(0.01)
+    
+    latencies = {tasks.stop_project: [], tasks.start_project: []}
+    for task, project_id, status in requests:
+        row = projects.get(project_id)
+        if row['status'] == status:
+            latencies[task].append(row['updated_at'] - submitted[project_id])
+        if row['container_id']:
+            daemon.containers.pop(row['container_id'], None)
+        image_gc.redis_client.zrem(image_gc.LAST_USED_KEY.format(host=HOST), project_id)
+    return latencies[tasks.stop_project], latencies[tasks.start_project]
+
+
+def report(name: str, latencies: list, expected: int, slo: float) -> bool:
+    if not latencies:
+        print(f"{name:<34} no request finished  SLO p95<={slo}s: FAIL")
+        return False
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    passed = p95 <= slo and len(latencies) == expected
+    print(f"{name:<34} p50={p50:7.3f}s p95={p95:7.3f}s max={latencies[-1]:7.3f}s "
+          f"done={len(latencies)}/{expected}  SLO p95<={slo}s: {'PASS' if passed else 'FAIL'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--builds", type=int, default=4, help="Build yang sudah antre/berjalan")
+    parser.add_argument("--build-delay", type=float, default=5.0)
+    parser.add_argument("--stops", type=int, default=50)
+    parser.add_argument("--starts", type=int, default=20)
+    parser.add_argument("--stop-delay", type=float, default=0.2, help="Lama daemon menghentikan container")
+    parser.add_argument("--start-delay", type=float, default=0.1, help="Lama daemon menjalankan container")
+    parser.add_argument("--interval", type=float, default=0.02, help="Jeda antar request stop/start")
+    parser.add_argument("--shared-concurrency", type=int, default=2)
+    parser.add_argument("--control-concurrency", type=int, default=16)
+    parser.add_argument("--slo", type=float, default=1.0, help="Target p95 latensi stop/start (detik)")
+    args = parser.parse_args()
+    
+    daemon = FakeDockerDaemon(stop_delay=args.stop_delay, start_delay=args.start_delay, build_delay=args.build_delay,
+                              memory_total=256 * 1024 ** 3, cpus=256)
+    daemon.start()
+    # Host palsu sekaligus host build agar ensure_image tidak menyalin image
+    tasks.host_pool = DockerHostPool({HOST: daemon.base_url}, build_host=HOST)
+    settings.image_store_enabled = False
+    settings.reuse_stopped_containers = False
+    # Worker di proses ini tidak menyiapkan base image atau membuka port metrics
+    settings.build_base_images_on_startup = False
+    settings.metrics_port = 0
+    # Broker di memori agar task tidak diambil worker sungguhan
+    tasks.app.conf.update(broker_url='memory://', broker_transport_options={'polling_interval': POLLING_INTERVAL},
+                          result_backend='cache+memory://', task_ignore_result=True)
+    # Build stand-in mengikuti route build_project
+    tasks.app.conf.task_routes['bench_build'] = tasks.app.conf.task_routes['build_project']
+    
+    print(f"builds={args.builds} build_delay={args.build_delay}s stops={args.stops} starts={args.starts} "
+          f"stop_delay={args.stop_delay}s start_delay={args.start_delay}s")
+    
+    try:
+        # Cara lama: semua task di queue default, satu pool 2 slot
+        default_queue = tasks.app.conf.task_default_queue
+        shared = run_scenario(daemon, [([default_queue], args.shared_concurrency)], args.builds, args.stops, args.starts,
+                              args.interval, queue=default_queue)
+        # task_routes: build di pool 2 slot, stop/start di pool thread worker control
+        routes = tasks.app.conf.task_routes
+        routed = run_scenario(daemon, [([routes['build_project']['queue']], args.shared_concurrency),
+                                       ([routes['stop_project']['queue']], args.control_concurrency)],
+                              args.builds, args.stops, args.starts, args.interval)
+    finally:
+        daemon.stop()
+    
+    report(f"shared queue stop ({args.shared_concurrency} slots)", shared[0], args.stops, args.slo)
+    report(f"shared queue start ({args.shared_concurrency} slots)", shared[1], args.starts, args.slo)
+    passed = report(f"control queue stop ({args.control_concurrency} threads)", routed[0], args.stops, args.slo)
+    passed = report(f"control queue start ({args.control_concurrency} threads)", routed[1], args.starts, args.slo) and passed
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Simulasi antrean build dengan noisy neighbour: satu owner mengunggah banyak
+proyek sekaligus, beberapa owner ringan mengunggah satu proyek di waktu acak.
+Membandingkan wait time owner ringan pada antrean FIFO (cara lama) vs
+scheduler fair-share. Murni simulasi (event-driven), tidak butuh Redis.
+
+    python benchmarks/bench_fair_share.py --noisy-projects 30 --light-users 5 --runs 200
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fair_share import FairShareScheduler, MemoryStore
+
+NOISY_OWNER = 1
+
+
+class FifoScheduler:
+    """
+    Perilaku lama: satu antrean FIFO untuk semua owner
+    """
+    
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.queue = deque()
+        self.running = set()
+    
+    def enqueue(self, owner_id: int, project_id: str, now: float):
+        self.queue.append((owner_id, project_id, now))
+    
+    def release(self, project_id: str):
+        self.running.discard(project_id)
+    
+    def dispatch(self, now: float):
+        dispatched = []
+        while self.queue and len(self.running) < self.slots:
+            owner_id, project_id, enqueued_at = self.queue.popleft()
+            self.running.add(project_id)
+            dispatched.append((owner_id, project_id, now - enqueued_at))
+        return dispatched
+
+
+def simulate(scheduler, arrivals, build_time: float, rng: random.Random):
+    """
+    Return dict owner_id -> list wait time
+    """
+    events = [(at, 0, 'arrive', owner_id, project_id) for at, owner_id, project_id in arrivals]
+    heapq.heapify(events)
+    seq = len(events)
+    waits = {}
+    
+    while events:
+        now, _, kind, owner_id, project_id = heapq.heappop(events)
+        if kind == 'arrive':
+            scheduler.enqueue(owner_id, project_id, now)
+        else:
+            scheduler.release(project_id)
+        
+        for picked_owner, picked_project, wait in scheduler.dispatch(now):
+            waits.setdefault(picked_owner, []).append(wait)
+            seq += 1
+            duration = build_time * rng.uniform(0.5, 1.5)
+            heapq.heappush(events, (now + duration, seq, 'done', picked_owner, picked_project))
+    return waits
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--slots", type=int, default=2, help="Build bersamaan (kapasitas worker build)")
+    parser.add_argument("--per-user-limit", type=int, default=1)
+    parser.add_argument("--noisy-projects", type=int, default=30)
+    parser.add_argument("--light-users", type=int, default=5)
+    parser.add_argument("--build-time", type=float, default=60.0, help="Rata-rata durasi build (detik)")
+    parser.add_argument("--window", type=float, default=600.0, help="Rentang waktu upload owner ringan (detik)")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    
+    results = {'fifo': ([], []), 'fair-share': ([], [])}
+    for run in range(args.runs):
+        rng = random.Random(args.seed + run)
+        arrivals = [(0.0, NOISY_OWNER, f"noisy-{i}") for i in range(args.noisy_projects)]
+        arrivals += [(rng.uniform(0, args.window), 100 + i, f"light-{i}") for i in range(args.light_users)]
+        
+        schedulers = {
+            'fifo': FifoScheduler(args.slots),
+            'fair-share': FairShareScheduler(MemoryStore(), args.slots, args.per_user_limit),
+        }
+        for name, scheduler in schedulers.items():
+            # Durasi build sama untuk kedua scheduler
+            waits = simulate(scheduler, arrivals, args.build_time, random.Random(args.seed + run))
+            light, noisy = results[name]
+            for owner_id, owner_waits in waits.items():
+                (noisy if owner_id == NOISY_OWNER else light).extend(owner_waits)
+    
+    print(f"slots={args.slots} per_user_limit={args.per_user_limit} noisy_projects={args.noisy_projects} "
+          f"light_users={args.light_users} build_time~{args.build_time}s runs={args.runs}")
+    print(f"{'':<12}{'light p50':>11}{'light p95':>11}{'light p99':>11}{'light max':>11}{'noisy p50':>11}{'noisy max':>11}")
+    for name, (light, noisy) in results.items():
+        print(f"{name:<12}"
+              f"{statistics.median(light):10.1f}s{percentile(light, 0.95):10.1f}s{percentile(light, 0.99):10.1f}s{max(light):10.1f}s"
+              f"{statistics.median(noisy):10.1f}s{max(noisy):10.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Skenario placement container bot di beberapa Docker host: DockerHostPool
+di atas beberapa daemon Docker palsu dengan kapasitas berbeda, container
+dibuat lewat tasks.place_container + tasks.run_container. Memeriksa bahwa
+container tersebar ke host yang paling longgar, admission ditolak ketika
+semua host penuh (juga saat banyak worker menempatkan bersamaan), host
+sebelumnya diutamakan, dan reservasi selalu dilepas.
+
+Butuh konfigurasi worker dan Redis (settings.redis_url), misalnya di
+container worker:
+
+    python benchmarks/bench_placement.py --hosts 3 --concurrency 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_docker import FakeDockerDaemon
+
+from config import settings
+from docker_hosts import DockerHostPool, NoCapacityError, PROJECT_LABEL, RESERVATIONS_KEY, redis_client
+from resources import get_profile
+import image_gc
+import tasks
+
+GB = 1024 ** 3
+
+
+class Scenario:
+    def __init__(self, hosts: int, memory: int, cpus: int):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.daemons = {}
+        for index in range(hosts):
+            daemon = FakeDockerDaemon(memory_total=memory, cpus=cpus, start_delay=0.01, stop_delay=0.01)
+            daemon.start()
+            self.daemons[f"bench-{self.run_id}-{index}"] = daemon
+        self.pool = DockerHostPool({name: daemon.base_url for name, daemon in self.daemons.items()},
+                                   build_host=next(iter(self.daemons)), capacity_ttl=0)
+        tasks.host_pool = self.pool
+        self.profile = get_profile("small")
+        self.results = []
+    
+    def check(self, name: str, passed: bool, detail: str = ""):
+        self.results.append(passed)
+        print(f"{name:<44} {'PASS' if passed else 'FAIL'}  {detail}")
+    
+    def counts(self) -> dict:
+        return {name: len(daemon.list_containers({'label': [PROJECT_LABEL]})) for name, daemon in self.daemons.items()}
+    
+    def reservations(self) -> int:
+        return sum(redis_client.hlen(RESERVATIONS_KEY.format(host=name)) for name in self.daemons)
+    
+    def place(self, project_id: str = None, preferred: str = None) -> str:
+        # Sama dengan jalur run_project/start_project: admission lalu container dibuat di dalam blok
+        project_id = project_id or str(uuid.uuid4())
+        tag = image_gc.project_image_tag(project_id)
+        for daemon in self.daemons.values():
+            daemon.images.add(tag)
+        with tasks.place_container(project_id, self.profile, preferred) as host:
+            tasks.run_container(project_id, tag, "123456:bench-token", host, self.profile)
+        return host
+    
+    def remove_one(self, host: str) -> str:
+        daemon = self.daemons[host]
+        container_id = next(iter(daemon.containers))
+        project_id = daemon.containers.pop(container_id)['Config']['Labels'][PROJECT_LABEL]
+        return project_id
+    
+    def capacity(self) -> int:
+        memory_total, cpus = self.pool._host_capacity(next(iter(self.daemons)))
+        return min(int(memory_total // self.profile.memory), int(cpus // self.profile.cpus))
+    
+    def cleanup(self):
+        for name, daemon in self.daemons.items():
+            redis_client.delete(RESERVATIONS_KEY.format(host=name), image_gc.LAST_USED_KEY.format(host=name))
+            daemon.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=3)
+    parser.add_argument("--memory", type=float, default=2.0, help="Memori per host (GB)")
+    parser.add_argument("--cpus", type=int, default=2, help="CPU per host")
+    parser.add_argument("--concurrency", type=int, default=16, help="Worker yang menempatkan container bersamaan")
+    args = parser.parse_args()
+    
+    # Kapasitas host = ukuran daemon palsu, tanpa cadangan dan overcommit
+    settings.host_memory_reserve = 0
+    settings.host_memory_overcommit = 1.0
+    settings.host_cpu_overcommit = 1.0
+    settings.image_store_enabled = False
+    
+    scenario = Scenario(args.hosts, int(args.memory * GB), args.cpus)
+    per_host = scenario.capacity()
+    print(f"hosts={args.hosts} memory={args.memory}GB cpus={args.cpus} profile={scenario.profile.name} "
+          f"capacity={per_host} bots/host concurrency={args.concurrency}")
+    try:
+        # Tersebar: setiap container masuk ke host yang paling longgar
+        placed = [scenario.place() for _ in range(args.hosts * 2)]
+        counts = scenario.counts()
+        scenario.check("spread across hosts", set(counts.values()) == {2}, f"containers per host {sorted(counts.values())}")
+        scenario.check("reservations released after placement", scenario.reservations() == 0)
+        
+        # Host sebelumnya diutamakan walaupun host lain lebih longgar
+        loosest = placed[0]
+        scenario.remove_one(loosest)
+        preferred = next(name for name in scenario.daemons if name != loosest)
+        host = scenario.place(preferred=preferred)
+        scenario.check("previous host preferred", host == preferred, f"placed on {host[-1]}, loosest {loosest[-1]}")
+        host = scenario.place()
+        scenario.check("without preference loosest host wins", host == loosest, f"placed on {host[-1]}")
+        
+        # Container gagal dibuat: reservasi tetap dilepas
+        try:
+            with tasks.place_container(str(uuid.uuid4()), scenario.profile):
+                raise RuntimeError("create failed")
+        except RuntimeError:
+            pass
+        scenario.check("reservation released when create fails", scenario.reservations() == 0)
+        
+        # Banyak worker bersamaan: tepat sebanyak kapasitas yang diterima
+        remaining = per_host * args.hosts - sum(scenario.counts().values())
+        refused = []
+        lock = threading.Lock()
+        
+        def place_concurrently(_):
+            try:
+                scenario.place()
+            except NoCapacityError:
+                with lock:
+                    refused.append(1)
+        
+        attempts = remaining + args.concurrency
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(place_concurrently, range(attempts)))
+        elapsed = time.perf_counter() - started
+        counts = scenario.counts()
+        scenario.check("concurrent admission fills exactly to capacity",
+                       len(refused) == attempts - remaining and max(counts.values()) <= per_host,
+                       f"{attempts - len(refused)}/{attempts} admitted in {elapsed:.2f}s, per host {sorted(counts.values())}")
+        
+        # Semua host penuh: admission ditolak
+        try:
+            scenario.place()
+            scenario.check("admission refused when all hosts are full", False)
+        except NoCapacityError:
+            scenario.check("admission refused when all hosts are full", True)
+        scenario.check("no reservations left", scenario.reservations() == 0)
+    finally:
+        scenario.cleanup()
+    
+    sys.exit(0 if all(scenario.results) else 1)
+
+
+if __name__ == "__main__":
+    main()
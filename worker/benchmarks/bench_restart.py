@@ -0,0 +1,116 @@
+"""
+Benchmark latensi stop -> start proyek: mode recreate (stop menghapus
+container, start mendekripsi token dan membuat container baru) vs mode
+reuse (REUSE_STOPPED_CONTAINERS, container yang dihentikan dijalankan lagi
+di tempat). Task stop_project dan start_project asli dijalankan langsung
+(tanpa broker) terhadap daemon Docker palsu dan tabel proyek palsu.
+
+Butuh konfigurasi worker dan Redis (settings.redis_url), misalnya di
+container worker:
+
+    python benchmarks/bench_restart.py --cycles 50 --create-delay 0.15 --rotate-every 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_db import FakeProjects
+from fake_docker import FakeDockerDaemon
+
+from config import settings
+from database import ProjectStatus
+from docker_hosts import DockerHostPool
+from encryption import token_encryption
+import image_gc
+import tasks
+
+HOST = "bench"
+
+
+def run_task(projects: FakeProjects, task, project_id: str, status: ProjectStatus) -> float:
+    started = time.perf_counter()
+    task.apply(args=[project_id])
+    elapsed = time.perf_counter() - started
+    row = projects.get(project_id)
+    if row['status'] != status:
+        raise Exception(f"{task.name} left project in {row['status'].value}: {row.get('last_error_log')}")
+    return elapsed
+
+
+def run_mode(daemon: FakeDockerDaemon, reuse: bool, cycles: int, rotate_every: int) -> tuple:
+    settings.reuse_stopped_containers = reuse
+    project_id = str(uuid.uuid4())
+    daemon.images.add(image_gc.project_image_tag(project_id))
+    projects = FakeProjects()
+    projects.install()
+    projects.add(project_id, status=ProjectStatus.STOPPED, resource_profile="small",
+                 encrypted_bot_token=token_encryption.encrypt_token("123456:bench-token"))
+    run_task(projects, tasks.start_project, project_id, ProjectStatus.RUNNING)
+    stop_latencies = []
+    start_latencies = []
+    recreated = 0
+    try:
+        for cycle in range(1, cycles + 1):
+            container_id = projects.get(project_id)['container_id']
+            stop_latencies.append(run_task(projects, tasks.stop_project, project_id, ProjectStatus.STOPPED))
+            if rotate_every and cycle % rotate_every == 0:
+                # User mengganti token bot
+                projects.set_project_fields(project_id, encrypted_bot_token=token_encryption.encrypt_token(f"123456:bench-token-{cycle}"))
+            start_latencies.append(run_task(projects, tasks.start_project, project_id, ProjectStatus.RUNNING))
+            recreated += projects.get(project_id)['container_id'] != container_id
+    finally:
+        container_id = projects.get(project_id)['container_id']
+        if container_id:
+            tasks.host_pool.client(HOST).containers.get(container_id).remove(force=True)
+        image_gc.redis_client.zrem(image_gc.LAST_USED_KEY.format(host=HOST), project_id)
+    return stop_latencies, start_latencies, recreated
+
+
+def report(name: str, latencies: list) -> float:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<22} p50={p50:7.3f}s p95={p95:7.3f}s max={latencies[-1]:7.3f}s")
+    return p50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cycles", type=int, default=50)
+    parser.add_argument("--create-delay", type=float, default=0.15, help="Lama daemon membuat container baru")
+    parser.add_argument("--start-delay", type=float, default=0.1, help="Lama daemon menjalankan container")
+    parser.add_argument("--stop-delay", type=float, default=0.2, help="Lama daemon menghentikan container")
+    parser.add_argument("--rotate-every", type=int, default=10, help="Token diganti setiap N siklus (0 = tidak pernah)")
+    args = parser.parse_args()
+    
+    daemon = FakeDockerDaemon(stop_delay=args.stop_delay, start_delay=args.start_delay, create_delay=args.create_delay)
+    daemon.start()
+    # Host palsu sekaligus host build agar ensure_image tidak menyalin image
+    tasks.host_pool = DockerHostPool({HOST: daemon.base_url}, build_host=HOST)
+    settings.image_store_enabled = False
+    
+    print(f"cycles={args.cycles} create_delay={args.create_delay}s start_delay={args.start_delay}s "
+          f"stop_delay={args.stop_delay}s rotate_every={args.rotate_every}")
+    try:
+        results = {}
+        for name, reuse in (("recreate", False), ("reuse", True)):
+            requests_before = daemon.requests
+            stops, starts, recreated = run_mode(daemon, reuse, args.cycles, args.rotate_every)
+            print(f"[{name}] containers created: {recreated}/{args.cycles}, "
+                  f"API requests per cycle: {(daemon.requests - requests_before) / args.cycles:.1f}")
+            report(f"{name} stop", stops)
+            results[name] = report(f"{name} start", starts)
+    finally:
+        daemon.stop()
+    
+    print(f"start p50 speedup (reuse vs recreate): {results['recreate'] / results['reuse']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Benchmark cold start bot mode hibernasi: update dikirim lewat Bot API
+palsu ke ingress, di-buffer selama bot tidur, proyek dibangunkan lalu
+buffer di-replay ke bot. Mengukur waktu dari update pertama dikirim sampai
+diterima bot, dan memeriksa urutan update.
+
+Ingress memakai fungsi backend asli (record_activity, forward_update,
+buffer_update dari backend/hibernation.py dan dispatch_once), hibernasi dan
+wake memakai task asli (hibernate_project, wake_project, publish_endpoint)
+yang dijalankan di proses ini seperti worker control. Docker diganti daemon
+palsu dan tabel proyek diganti tabel di memori.
+
+Butuh dependency backend dan worker (make install-dev) serta Redis
+(settings.redis_url), dijalankan dari direktori worker:
+
+    python benchmarks/bench_wake.py --wakes 20 --burst 5 --boot-delay 0.5
+"""
+import argparse
+import asyncio
+import hmac
+import importlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_DIR = os.path.dirname(BENCHMARKS_DIR)
+BACKEND_DIR = os.path.join(os.path.dirname(WORKER_DIR), 'backend')
+
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, WORKER_DIR)
+
+from fake_db import FakeProjects
+from fake_docker import FakeDockerDaemon
+from fake_telegram import FakeTelegram
+
+from config import settings
+from database import Project, ProjectStatus
+from docker_hosts import DockerHostPool
+from encryption import token_encryption
+import hibernation
+import image_gc
+import locks
+import tasks
+
+BOT_TOKEN = "123456:bench-token"
+HOST = "bench"
+
+
+def import_backend(*names) -> list:
+    """
+    Import modul backend di proses yang sama dengan tasks worker. Nama modul
+    backend bentrok dengan modul worker (config, hibernation, ...), jadi
+    modul worker disingkirkan dari sys.modules selama import lalu dipasang lagi
+    """
+    backend_names = {name[:-3] for name in os.listdir(BACKEND_DIR) if name.endswith('.py')}
+    worker_modules = {name: sys.modules.pop(name) for name in backend_names if name in sys.modules}
+    sys.path.insert(0, BACKEND_DIR)
+    try:
+        return [importlib.import_module(name) for name in names]
+    finally:
+        sys.path.remove(BACKEND_DIR)
+        for name in backend_names:
+            sys.modules.pop(name, None)
+        sys.modules.update(worker_modules)
+
+
+backend_hibernation, backend_dispatch = import_backend('hibernation', 'dispatch')
+
+
+def serve(handler_class, port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StubBot:
+    """
+    Proses bot di dalam container: server HTTP yang menerima update, hanya
+    listen setelah container start + boot_delay dan berhenti saat container
+    dihentikan
+    """
+    
+    def __init__(self, secret: str, boot_delay: float):
+        self.secret = secret
+        self.boot_delay = boot_delay
+        self.received = []  # (update_id, waktu diterima)
+        self._server = serve(self._handler())
+        self.port = self._server.server_address[1]
+        self.sleep()
+    
+    def _handler(self):
+        bot = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                update = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                if self.headers.get(hibernation.SECRET_HEADER) != bot.secret:
+                    self.send_response(403)
+                else:
+                    bot.received.append((update['update_id'], time.time()))
+                    self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+        
+        return Handler
+    
+    def sleep(self, container: dict = None):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def boot(self, container: dict = None):
+        def listen():
+            time.sleep(self.boot_delay)
+            self._server = serve(self._handler(), self.port)
+        threading.Thread(target=listen, daemon=True).start()
+
+
+class Ingress:
+    """
+    Ingress backend (/telegram/webhook/<project_id>) dengan fungsi
+    backend/hibernation.py dan dispatch_once. Hanya query status proyek yang
+    diganti tabel palsu
+    """
+    
+    def __init__(self, projects: FakeProjects):
+        self.projects = projects
+        # Client Redis/HTTP async backend terikat ke satu event loop
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self._server = serve(self._handler())
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+    
+    def _handler(self):
+        ingress = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                project_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+                update = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                secret = self.headers.get(backend_hibernation.SECRET_HEADER, '')
+                if not hmac.compare_digest(secret, backend_hibernation.webhook_secret(project_id)):
+                    self.send_response(403)
+                else:
+                    asyncio.run_coroutine_threadsafe(ingress.telegram_webhook(project_id, update), ingress.loop).result()
+                    self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+        
+        return Handler
+    
+    async def telegram_webhook(self, project_id: str, update: bytes):
+        # Sama dengan telegram_webhook di backend/main.py
+        await backend_hibernation.record_activity(project_id)
+        if await backend_hibernation.forward_update(project_id, update):
+            return
+        
+        project = self.projects.fetch_project(project_id, Project.status, Project.hibernation_enabled)
+        if not project or not project.hibernation_enabled or project.status in [ProjectStatus.STOPPED, ProjectStatus.FAILED]:
+            return
+        
+        await backend_hibernation.buffer_update(project_id, update, cold_start=project.status == ProjectStatus.HIBERNATED)
+        if project.status in [ProjectStatus.RUNNING, ProjectStatus.HIBERNATED]:
+            await backend_dispatch.dispatch_once(project_id, 'wake', 'wake_project', [project_id], settings.control_dispatch_ttl)
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        asyncio.run_coroutine_threadsafe(backend_hibernation.close_hibernation_clients(), self.loop).result()
+        asyncio.run_coroutine_threadsafe(backend_dispatch.close_dispatch_client(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def send_task(name: str, args: list, task_id: str):
+    """
+    Pengganti celery_app.send_task backend: task dijalankan di thread proses
+    ini (seperti pool thread worker control) dengan task_id yang diklaim
+    dispatch_once
+    """
+    task = tasks.app.tasks[name]
+    threading.Thread(target=task.apply, kwargs={'args': args, 'task_id': task_id}, daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--wakes", type=int, default=20)
+    parser.add_argument("--burst", type=int, default=5, help="Update yang dikirim selama bot tidur")
+    parser.add_argument("--start-delay", type=float, default=0.3, help="Lama daemon menjalankan container")
+    parser.add_argument("--boot-delay", type=float, default=0.5, help="Lama bot siap menerima update setelah start")
+    args = parser.parse_args()
+    
+    project_id = str(uuid.uuid4())
+    # Statistik benchmark tidak dicampur dengan statistik produksi
+    hibernation.STATS_KEY = f"ziphostbot:bench:{project_id}:stats"
+    hibernation.COLD_STARTS_KEY = f"ziphostbot:bench:{project_id}:cold_starts"
+    
+    bot = StubBot(hibernation.webhook_secret(project_id), args.boot_delay)
+    daemon = FakeDockerDaemon(start_delay=args.start_delay, published_port=bot.port, on_start=bot.boot, on_stop=bot.sleep)
+    daemon.start()
+    daemon.images.add(image_gc.project_image_tag(project_id))
+    # Host palsu sekaligus host build agar ensure_image tidak menyalin image
+    tasks.host_pool = DockerHostPool({HOST: daemon.base_url}, build_host=HOST)
+    settings.image_store_enabled = False
+    # Hibernasi di awal tiap putaran tidak menunggu idle
+    settings.hibernation_idle_timeout = 0
+    # Worker control di proses ini: wake dari hibernate_project ikut dijalankan langsung
+    tasks.app.conf.task_always_eager = True
+    backend_dispatch.celery_app.send_task = send_task
+    
+    projects = FakeProjects()
+    projects.install()
+    projects.add(project_id, status=ProjectStatus.HIBERNATED, hibernation_enabled=True, resource_profile="small",
+                 encrypted_bot_token=token_encryption.encrypt_token(BOT_TOKEN))
+    
+    ingress = Ingress(projects)
+    telegram = FakeTelegram(retry_interval=0.5)
+    telegram.start()
+    settings.telegram_api_base_url = telegram.base_url
+    settings.public_api_url = ingress.base_url
+    hibernation.register_webhook(project_id, BOT_TOKEN)
+    
+    print(f"wakes={args.wakes} burst={args.burst} start_delay={args.start_delay}s boot_delay={args.boot_delay}s")
+    
+    cold_starts = []
+    warm = []
+    sent = 0
+    try:
+        for _ in range(args.wakes):
+            if projects.get(project_id)['status'] == ProjectStatus.RUNNING:
+                # Hibernasi seperti dari beat: endpoint dilepas, container dihentikan dan dihapus
+                tasks.hibernate_project.apply(args=[project_id])
+            
+            received_before = len(bot.received)
+            first_sent = time.time()
+            first_update_id = None
+            for _ in range(args.burst):
+                update_id = telegram.send_update(BOT_TOKEN, {'message': {'text': 'ping'}})
+                first_update_id = first_update_id or update_id
+                sent += 1
+            
+            deadline = time.time() + settings.hibernation_wake_timeout
+            while len(bot.received) < received_before + args.burst and time.time() < deadline:
+                time.sleep(0.01)
+            received_at = next((at for update_id, at in bot.received if update_id == first_update_id), None)
+            if received_at is None:
+                print(f"Bot did not receive the buffered updates in time (status {projects.get(project_id)['status'].value})")
+                break
+            cold_starts.append(received_at - first_sent)
+            
+            # Tunggu wake selesai agar wake putaran berikutnya tidak digabung ke wake ini
+            while locks.redis_client.exists(locks.DISPATCH_KEY.format(project_id=project_id, action='wake')):
+                time.sleep(0.01)
+            
+            # Bot aktif: update diteruskan langsung oleh ingress (forward_update)
+            warm_sent = time.time()
+            update_id = telegram.send_update(BOT_TOKEN, {'message': {'text': 'ping'}})
+            sent += 1
+            while not any(received == update_id for received, _ in bot.received) and time.time() < deadline:
+                time.sleep(0.005)
+            warm.extend(at - warm_sent for received, at in bot.received if received == update_id)
+        
+        stats = hibernation.get_stats()
+    finally:
+        row = projects.get(project_id)
+        if row['container_id']:
+            tasks.host_pool.client(HOST).containers.get(row['container_id']).remove(force=True)
+        hibernation.forget(project_id)
+        hibernation.redis_client.delete(hibernation.STATS_KEY, hibernation.COLD_STARTS_KEY)
+        image_gc.redis_client.zrem(image_gc.LAST_USED_KEY.format(host=HOST), project_id)
+        telegram.stop()
+        ingress.stop()
+        daemon.stop()
+    
+    update_ids = [update_id for update_id, _ in bot.received]
+    in_order = update_ids == sorted(update_ids) and len(set(update_ids)) == len(update_ids)
+    
+    if cold_starts:
+        cold_starts.sort()
+        print(f"cold start p50: {statistics.median(cold_starts):.3f}s")
+        print(f"cold start p95: {cold_starts[min(len(cold_starts) - 1, int(len(cold_starts) * 0.95))]:.3f}s")
+        print(f"cold start max: {cold_starts[-1]:.3f}s")
+    if warm:
+        print(f"warm update p50: {statistics.median(warm):.3f}s")
+    print(f"updates sent: {sent}, received by bot: {len(update_ids)}, in order: {in_order}")
+    print(f"wakes recorded: {int(stats.get('wakes', 0))}, hibernations recorded: {int(stats.get('hibernations', 0))}, "
+          f"replayed updates: {int(stats.get('replayed_updates', 0))}")
+    sys.exit(0 if in_order and len(update_ids) == sent else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Tabel proyek palsu (di memori) untuk benchmark. Menggantikan
+fetch_project, transition_status dan set_project_fields di tasks sehingga
+task asli (stop_project, start_project, wake_project, ...) bisa dijalankan
+tanpa PostgreSQL. Transisi status dicek dengan ALLOWED_TRANSITIONS yang
+sama dengan trigger database; updated_at diisi time.time() setiap update.
+
+Pakai dari kode:
+
+    projects = FakeProjects()
+    projects.install()
+    projects.add(project_id, status=ProjectStatus.RUNNING, encrypted_bot_token=token)
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+from database import ALLOWED_TRANSITIONS, ProjectStatus
+import tasks
+
+
+class FakeProjects:
+    def __init__(self):
+        self.rows = {}
+        self._lock = threading.Lock()
+    
+    def add(self, project_id: str, **values):
+        row = {
+            'id': project_id,
+            'owner_id': 1,
+            'status': ProjectStatus.RUNNING,
+            'container_id': None,
+            'docker_host': None,
+            'resource_profile': None,
+            'hibernation_enabled': False,
+            'encrypted_bot_token': None,
+            'updated_at': time.time(),
+        }
+        row.update(values)
+        with self._lock:
+            self.rows[project_id] = row
+    
+    def get(self, project_id: str) -> dict:
+        with self._lock:
+            return dict(self.rows[project_id])
+    
+    def fetch_project(self, project_id: str, *columns):
+        with self._lock:
+            row = self.rows.get(project_id)
+            if row is None:
+                return None
+            return SimpleNamespace(**{column.key: row[column.key] for column in columns})
+    
+    def transition_status(self, project_id: str, status: ProjectStatus, **values) -> bool:
+        with self._lock:
+            row = self.rows.get(project_id)
+            if row is None or (row['status'] != status and status not in ALLOWED_TRANSITIONS[row['status']]):
+                return False
+            row.update(status=status, updated_at=time.time(), **values)
+            return True
+    
+    def set_project_fields(self, project_id: str, **values):
+        with self._lock:
+            if project_id in self.rows:
+                self.rows[project_id].update(updated_at=time.time(), **values)
+    
+    def install(self):
+        tasks.fetch_project = self.fetch_project
+        tasks.transition_status = self.transition_status
+        tasks.set_project_fields = self.set_project_fields
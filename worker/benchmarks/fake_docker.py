@@ -0,0 +1,208 @@
+"""
+Daemon Docker palsu (HTTP) untuk benchmark. Hanya endpoint yang dipakai
+worker yang diimplementasikan, dengan latensi yang bisa diatur, sehingga
+benchmark bisa jalan tanpa Docker sungguhan.
+
+Beberapa instance dengan kapasitas berbeda (memory_total, cpus) bisa
+dipakai sebagai host untuk DockerHostPool. Port container yang dipublish
+semuanya dipetakan ke published_port (mis. server bot tiruan di benchmark).
+on_start/on_stop dipanggil dengan data container setiap kali container
+dijalankan/dihentikan (mis. untuk menyalakan server bot tiruan).
+
+Pakai dari kode:
+
+    daemon = FakeDockerDaemon(stop_delay=0.2, build_delay=5.0)
+    daemon.start()
+    client = docker.DockerClient(base_url=daemon.base_url, version=API_VERSION)
+"""
+import json
+import re
+import urllib.parse
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_VERSION = "1.41"
+
+_PATH = re.compile(r'^(?:/v[\d.]+)?(?P<path>/[^?]*)')
+
+
+class FakeDockerDaemon:
+    def __init__(self, stop_delay: float = 0.2, start_delay: float = 0.1, build_delay: float = 5.0, api_delay: float = 0.002,
+                 memory_total: int = 8 * 1024 ** 3, cpus: int = 4, published_port: int = None, create_delay: float = 0.0,
+                 on_start=None, on_stop=None):
+        self.memory_total = memory_total
+        self.published_port = published_port
+        self.cpus = cpus
+        self.stop_delay = stop_delay
+        self.start_delay = start_delay
+        self.create_delay = create_delay
+        self.build_delay = build_delay
+        self.api_delay = api_delay
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.containers = {}
+        self.images = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"tcp://{host}:{port}"
+    
+    def start(self):
+        daemon = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def _read_body(self) -> bytes:
+                if self.headers.get('Transfer-Encoding') == 'chunked':
+                    body = b''
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        body += self.rfile.read(size + 2)[:size]
+                        if size == 0:
+                            return body
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            
+            def _send(self, status: int, body=None, content_type='application/json'):
+                data = b'' if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _handle(self):
+                self.body = self._read_body()
+                with daemon._lock:
+                    daemon.requests += 1
+                time.sleep(daemon.api_delay)
+                path = urllib.parse.unquote(_PATH.match(self.path).group('path'))
+                self.query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+                parts = path.strip('/').split('/')
+                return self.command, path, parts
+            
+            def do_GET(self):
+                method, path, parts = self._handle()
+                if path == '/_ping':
+                    return self._send(200, b'OK', 'text/plain')
+                if path == '/version':
+                    return self._send(200, {'ApiVersion': API_VERSION, 'Version': 'fake'})
+                if path == '/info':
+                    return self._send(200, {'MemTotal': daemon.memory_total, 'NCPU': daemon.cpus, 'Containers': len(daemon.containers)})
+                if path == '/containers/json':
+                    return self._send(200, daemon.list_containers(json.loads(self.query.get('filters') or '{}')))
+                if parts[0] == 'containers' and parts[-1] == 'json' and len(parts) == 3:
+                    container = daemon.find_container(parts[1])
+                    if container is None:
+                        return self._send(404, {'message': f"No such container: {parts[1]}"})
+                    return self._send(200, container)
+                if parts[0] == 'images' and parts[-1] == 'json':
+                    name = '/'.join(parts[1:-1])
+                    if name not in daemon.images:
+                        return self._send(404, {'message': f"No such image: {name}"})
+                    return self._send(200, {'Id': daemon.image_id(name), 'RepoTags': [name]})
+                if parts[0] == 'images' and parts[-1] == 'get':
+                    name = '/'.join(parts[1:-1])
+                    if name not in daemon.images:
+                        return self._send(404, {'message': f"No such image: {name}"})
+                    return self._send(200, json.dumps({'image': name}).encode(), 'application/x-tar')
+                self._send(404, {'message': 'not implemented'})
+            
+            def do_POST(self):
+                method, path, parts = self._handle()
+                if path == '/containers/create':
+                    config = json.loads(self.body or b'{}')
+                    name = self.query.get('name')
+                    if name and daemon.find_container(name):
+                        return self._send(409, {'message': f"Conflict. The container name \"/{name}\" is already in use"})
+                    ports = (config.get('HostConfig') or {}).get('PortBindings') or {}
+                    time.sleep(daemon.create_delay)
+                    container_id = daemon.add_container(running=False, name=name, image=config.get('Image'), labels=config.get('Labels'),
+                                                        ports=list(ports))
+                    return self._send(201, {'Id': container_id, 'Warnings': []})
+                if parts[0] == 'containers' and len(parts) == 3 and parts[2] in ('start', 'stop', 'restart'):
+                    container = daemon.find_container(parts[1])
+                    if container is None:
+                        return self._send(404, {'message': f"No such container: {parts[1]}"})
+                    time.sleep(daemon.stop_delay if parts[2] == 'stop' else daemon.start_delay)
+                    running = parts[2] != 'stop'
+                    container['State'].update({'Running': running, 'Status': 'running' if running else 'exited'})
+                    callback = daemon.on_start if running else daemon.on_stop
+                    if callback:
+                        callback(container)
+                    return self._send(204)
+                if path == '/build':
+                    time.sleep(daemon.build_delay)
+                    image_id = f"sha256:{uuid.uuid4().hex}"
+                    daemon.images.add(image_id)
+                    if self.query.get('t'):
+                        daemon.images.add(self.query['t'])
+                    return self._send(200, json.dumps({'aux': {'ID': image_id}}).encode() + b'\n')
+                if path == '/images/load':
+                    daemon.images.add(json.loads(self.body)['image'])
+                    return self._send(200, b'{"stream": "Loaded image"}\n')
+                self._send(404, {'message': 'not implemented'})
+            
+            def do_DELETE(self):
+                method, path, parts = self._handle()
+                if parts[0] == 'containers' and len(parts) == 2:
+                    container = daemon.find_container(parts[1])
+                    if container is None:
+                        return self._send(404, {'message': f"No such container: {parts[1]}"})
+                    del daemon.containers[container['Id']]
+                    return self._send(204)
+                self._send(404, {'message': 'not implemented'})
+        
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    
+    def add_container(self, running: bool = True, name: str = None, image: str = None, labels: dict = None,
+                      ports: list = None) -> str:
+        container_id = uuid.uuid4().hex
+        self.containers[container_id] = {
+            'Id': container_id,
+            'Name': f"/{name or container_id[:12]}",
+            'Image': self.image_id(image) if image else '',
+            'State': {'Running': running, 'Status': 'running' if running else 'created'},
+            'Config': {'Image': image, 'Labels': labels or {}},
+            'NetworkSettings': {'Ports': {port: [{'HostIp': '0.0.0.0', 'HostPort': str(self.published_port)}]
+                                          for port in ports or []}},
+        }
+        return container_id
+    
+    def find_container(self, id_or_name: str):
+        container = self.containers.get(id_or_name)
+        if container is None:
+            container = next((c for c in self.containers.values() if c['Name'] == f"/{id_or_name}"), None)
+        return container
+    
+    def list_containers(self, filters: dict) -> list:
+        result = []
+        for container in self.containers.values():
+            labels = container['Config']['Labels']
+            if any(label.split('=')[0] not in labels for label in filters.get('label', [])):
+                continue
+            if not container['State']['Running'] and not filters.get('status') == ['exited']:
+                continue
+            result.append({'Id': container['Id'], 'Names': [container['Name']], 'Image': container['Config']['Image'],
+                           'Labels': labels, 'State': container['State']['Status']})
+        return result
+    
+    @staticmethod
+    def image_id(name: str) -> str:
+        return name if name.startswith('sha256:') else f"sha256:{uuid.uuid5(uuid.NAMESPACE_URL, name).hex}"
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
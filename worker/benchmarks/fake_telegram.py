@@ -0,0 +1,201 @@
+"""
+Stand-in lokal untuk Telegram Bot API. Cukup untuk menguji jalur webhook
+dan wake bot mode hibernasi tanpa akses ke api.telegram.org: getMe,
+setWebhook, deleteWebhook, getWebhookInfo dan getUpdates. Update yang
+dikirim lewat send_update() diantar ke webhook (dengan secret token);
+pengiriman yang gagal diulang seperti Telegram.
+
+Pakai dari kode:
+
+    telegram = FakeTelegram()
+    telegram.start()
+    settings.telegram_api_base_url = telegram.base_url
+    telegram.send_update(bot_token, {'message': {'text': '/start'}})
+
+Atau jalankan terpisah dan arahkan TELEGRAM_API_BASE_URL backend/worker
+ke sini; update dikirim dengan POST /_send/<token> berisi JSON update:
+
+    python benchmarks/fake_telegram.py --port 8081
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class FakeTelegram:
+    def __init__(self, retry_interval: float = 1.0, host: str = '127.0.0.1', port: int = 0):
+        self.retry_interval = retry_interval
+        self.address = (host, port)
+        self.webhooks = {}  # token -> {'url', 'secret_token', 'max_connections'}
+        self.pending = {}  # token -> [update] yang belum terkirim
+        self.delivered = []  # (token, update_id, waktu terkirim)
+        self.requests = 0
+        self._next_update_id = 1
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._server = None
+        self._stopped = threading.Event()
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+    
+    def start(self):
+        telegram = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def _send(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _params(self) -> dict:
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                return json.loads(body) if body else {}
+            
+            def do_GET(self):
+                self.do_POST()
+            
+            def do_POST(self):
+                with telegram._lock:
+                    telegram.requests += 1
+                params = self._params()
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                if parts[0] == '_send' and len(parts) == 2:
+                    update_id = telegram.send_update(parts[1], params)
+                    return self._send(200, {'ok': True, 'result': update_id})
+                if len(parts) != 2 or not parts[0].startswith('bot'):
+                    return self._send(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                status, body = telegram.call(parts[0][len('bot'):], parts[1], params)
+                self._send(status, body)
+        
+        self._server = ThreadingHTTPServer(self.address, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._retry_loop, daemon=True).start()
+    
+    def call(self, token: str, method: str, params: dict) -> tuple:
+        """
+        Jalankan method Bot API. Return (status HTTP, body)
+        """
+        if not token or ':' not in token:
+            return 401, {'ok': False, 'error_code': 401, 'description': 'Unauthorized'}
+        if method == 'getMe':
+            bot_id = int(token.split(':')[0]) if token.split(':')[0].isdigit() else 1
+            return 200, {'ok': True, 'result': {'id': bot_id, 'is_bot': True, 'first_name': 'Fake', 'username': f"fake{bot_id}_bot"}}
+        if method == 'setWebhook':
+            with self._lock:
+                self.webhooks[token] = {
+                    'url': params.get('url'),
+                    'secret_token': params.get('secret_token'),
+                    'max_connections': params.get('max_connections', 40),
+                }
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was set'}
+        if method == 'deleteWebhook':
+            with self._lock:
+                self.webhooks.pop(token, None)
+                if params.get('drop_pending_updates'):
+                    self.pending.pop(token, None)
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was deleted'}
+        if method == 'getWebhookInfo':
+            webhook = self.webhooks.get(token) or {}
+            return 200, {'ok': True, 'result': {
+                'url': webhook.get('url', ''),
+                'has_custom_certificate': False,
+                'pending_update_count': len(self.pending.get(token, [])),
+                'max_connections': webhook.get('max_connections'),
+            }}
+        if method == 'getUpdates':
+            if token in self.webhooks:
+                return 409, {'ok': False, 'error_code': 409,
+                             'description': "Conflict: can't use getUpdates method while webhook is active"}
+            offset = params.get('offset')
+            with self._lock:
+                updates = self.pending.get(token, [])
+                if offset is not None:
+                    # Seperti Telegram: offset mengonfirmasi update sebelumnya
+                    updates = self.pending[token] = [update for update in updates if update['update_id'] >= int(offset)]
+                return 200, {'ok': True, 'result': updates[:int(params.get('limit', 100))]}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+    
+    def send_update(self, token: str, update: dict) -> int:
+        """
+        Masukkan update seolah dikirim user ke bot; langsung diantar jika
+        webhook terpasang
+        """
+        with self._lock:
+            update = dict(update, update_id=self._next_update_id)
+            self._next_update_id += 1
+            self.pending.setdefault(token, []).append(update)
+        self._flush(token)
+        return update['update_id']
+    
+    def _flush(self, token: str):
+        """
+        Antar update yang tertunda ke webhook secara berurutan; berhenti di
+        pengiriman pertama yang gagal (diulang oleh retry loop)
+        """
+        with self._flush_lock:
+            self._deliver_pending(token)
+    
+    def _deliver_pending(self, token: str):
+        while True:
+            with self._lock:
+                webhook = self.webhooks.get(token)
+                updates = self.pending.get(token)
+                if not webhook or not updates:
+                    return
+                update = updates[0]
+            headers = {SECRET_HEADER: webhook['secret_token']} if webhook.get('secret_token') else {}
+            try:
+                response = requests.post(webhook['url'], json=update, headers=headers, timeout=10)
+            except requests.RequestException:
+                return
+            if response.status_code != 200:
+                return
+            with self._lock:
+                if self.pending.get(token) and self.pending[token][0] is update:
+                    self.pending[token].pop(0)
+                self.delivered.append((token, update['update_id'], time.time()))
+    
+    def _retry_loop(self):
+        while not self._stopped.wait(self.retry_interval):
+            for token in list(self.pending):
+                self._flush(token)
+    
+    def stop(self):
+        self._stopped.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stand-in lokal Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    
+    telegram = FakeTelegram(host=args.host, port=args.port)
+    telegram.start()
+    print(f"Fake Bot API listening on {telegram.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        telegram.stop()
@@ -0,0 +1,109 @@
+import io
+import posixpath
+import tarfile
+import time
+import zipfile
+from typing import Dict, Iterator, List, Optional
+
+
+class _ChunkBuffer:
+    """
+    File-like yang hanya bisa ditulis; isinya diambil (dan dikosongkan)
+    lewat drain() sehingga tar bisa dikirim bertahap
+    """
+    
+    def __init__(self):
+        self._buffer = bytearray()
+    
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        return len(data)
+    
+    def drain(self) -> Iterator[bytes]:
+        if self._buffer:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            yield chunk
+
+
+def safe_member_name(name: str) -> Optional[str]:
+    """
+    Normalisasi path entri ZIP. Return None untuk path absolut atau yang
+    keluar dari root (path traversal)
+    """
+    name = name.replace('\\', '/')
+    if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+        return None
+    normalized = posixpath.normpath(name)
+    if normalized in ('.', '') or normalized == '..' or normalized.startswith('../'):
+        return None
+    return normalized
+
+
+def root_files(zip_file: zipfile.ZipFile) -> List[str]:
+    """
+    Daftar nama file yang berada langsung di root arsip
+    """
+    names = []
+    for info in zip_file.infolist():
+        name = safe_member_name(info.filename)
+        if name and not info.is_dir() and '/' not in name:
+            names.append(name)
+    return names
+
+
+def read_root_files(zip_file: zipfile.ZipFile, names: List[str]) -> Dict[str, bytes]:
+    """
+    Baca isi beberapa file di root arsip (yang tidak ada dilewati)
+    """
+    available = set(root_files(zip_file))
+    result = {}
+    for info in zip_file.infolist():
+        name = safe_member_name(info.filename)
+        if name in names and name in available and name not in result:
+            result[name] = zip_file.read(info)
+    return result
+
+
+def iter_build_context(zip_file: zipfile.ZipFile, dockerfile: str) -> Iterator[bytes]:
+    """
+    Ubah entri ZIP langsung menjadi stream tar untuk build context Docker,
+    dengan Dockerfile hasil generate disisipkan. Tidak ada yang ditulis ke
+    disk; memori maksimum kira-kira sebesar satu file terbesar di arsip
+    """
+    buffer = _ChunkBuffer()
+    seen = set()
+    
+    with tarfile.open(fileobj=buffer, mode='w|') as tar:
+        for info in zip_file.infolist():
+            name = safe_member_name(info.filename)
+            # Dockerfile bawaan arsip diganti dengan yang di-generate
+            if name is None or name in seen or name == 'Dockerfile':
+                continue
+            seen.add(name)
+            
+            tar_info = tarfile.TarInfo(name)
+            tar_info.mtime = time.mktime(info.date_time + (0, 0, -1))
+            mode = (info.external_attr >> 16) & 0o777
+            
+            if info.is_dir():
+                tar_info.type = tarfile.DIRTYPE
+                tar_info.mode = mode or 0o755
+                tar.addfile(tar_info)
+            else:
+                tar_info.size = info.file_size
+                tar_info.mode = mode or 0o644
+                with zip_file.open(info) as member:
+                    tar.addfile(tar_info, member)
+            
+            yield from buffer.drain()
+        
+        dockerfile_data = dockerfile.encode()
+        tar_info = tarfile.TarInfo('Dockerfile')
+        tar_info.size = len(dockerfile_data)
+        tar_info.mtime = time.time()
+        tar.addfile(tar_info, io.BytesIO(dockerfile_data))
+        yield from buffer.drain()
+    
+    # Blok penutup tar ditulis saat close
+    yield from buffer.drain()
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 import os
 
 
@@ -31,11 +31,99 @@ class Settings(BaseSettings):
     # Application Configuration
     domain: str = "mgx.dev"
     max_file_size: int = 50 * 1024 * 1024  # 50MB
+    max_extracted_size: int = 500 * 1024 * 1024  # 500MB, batas isi ZIP setelah diekstrak
     
     # Worker Configuration
     worker_concurrency: int = 2
+    docker_max_pool_size: int = 16  # koneksi ke Docker API per proses worker
+    # Docker host untuk container bot: nama -> base_url (mis. {"node1": "tcp://10.0.0.2:2376"}).
+    # Kosong = semua bot di daemon lokal. Build selalu di docker_build_host
+    docker_hosts: Dict[str, str] = {}
+    docker_build_host: str = "local"
+    # Sisa kapasitas host yang tidak dipakai bot, dan rasio overcommit saat
+    # admission (bot umumnya idle sehingga CPU aman di-overcommit)
+    host_memory_reserve: int = 512 * 1024 * 1024
+    host_memory_overcommit: float = 1.0
+    host_cpu_overcommit: float = 2.0
+    host_reservation_ttl: int = 10 * 60  # detik, reservasi container yang gagal dilepas kedaluwarsa
+    
+    # Profil resource container bot
+    default_resource_profile: str = "small"
+    resource_profiles: Dict[str, Dict[str, float]] = {
+        "small": {"memory": 256 * 1024 * 1024, "cpus": 0.5, "cpu_shares": 512, "pids_limit": 128, "nofile": 1024},
+        "medium": {"memory": 512 * 1024 * 1024, "cpus": 1.0, "cpu_shares": 1024, "pids_limit": 256, "nofile": 4096},
+        "large": {"memory": 1024 * 1024 * 1024, "cpus": 2.0, "cpu_shares": 2048, "pids_limit": 512, "nofile": 8192},
+    }
     clamav_host: str = "clamav"
     clamav_port: int = 3310
+    clamav_pool_size: int = 2
+    clamav_timeout: float = 120.0  # detik, per operasi socket
+    clamav_ready_timeout: float = 30.0  # detik menunggu clamd siap sebelum gagal
+    clamav_ready_check_interval: float = 30.0  # detik hasil PING dianggap masih valid
+    clamav_fail_open: bool = False  # hanya untuk development tanpa ClamAV
+    scan_verdict_cache_ttl: int = 30 * 24 * 60 * 60  # detik, 30 hari
+    
+    # Build Configuration
+    python_base_image: str = "python:3.10-slim"
+    nodejs_base_image: str = "node:18-alpine"
+    base_image_version: str = "1"
+    build_base_images_on_startup: bool = True
+    dependency_install_timeout: int = 15 * 60  # detik
+    
+    # Retry, lock & dedup task
+    task_max_retries: int = 5
+    task_retry_backoff: float = 5.0  # detik, dikali 2 setiap retry
+    task_retry_backoff_max: float = 120.0
+    project_lock_timeout: int = 10 * 60  # detik, lock kedaluwarsa jika worker mati
+    project_lock_wait: float = 30.0  # detik menunggu lock sebelum retry
+    build_dispatch_ttl: int = 2 * 60 * 60  # detik, dedup build (termasuk antre di scheduler)
+    control_dispatch_ttl: int = 5 * 60  # detik, dedup start/stop
+    
+    # Stop hanya menghentikan container (tidak dihapus); start berikutnya
+    # menjalankan container yang sama selama token/profil tidak berubah
+    reuse_stopped_containers: bool = False
+    
+    # Build Scheduler (fair-share per owner)
+    build_scheduler_slots: int = 2  # build bersamaan total, samakan dengan kapasitas worker build
+    build_max_concurrent_per_user: int = 1
+    build_owner_weights: Dict[int, int] = {}  # owner_id -> weight round-robin (default 1)
+    build_slot_timeout: int = 30 * 60  # detik, slot yang tidak dilepas diambil kembali
+    build_scheduler_tick_interval: int = 60  # detik, interval beat pengambilan slot kedaluwarsa
+    
+    # Hibernasi bot idle (opt-in per proyek, bot berjalan dalam mode webhook)
+    public_api_url: str = "https://mgx.dev/api"  # URL publik backend untuk setWebhook
+    telegram_api_base_url: str = "https://api.telegram.org"
+    telegram_api_timeout: float = 10.0  # detik
+    docker_local_address: str = "172.17.0.1"  # alamat daemon lokal dilihat dari backend
+    hibernation_idle_timeout: int = 6 * 60 * 60  # detik tanpa update sebelum container dihentikan
+    hibernation_check_interval: int = 5 * 60  # detik, interval beat pengecekan idle
+    hibernation_bot_port: int = 8080  # port HTTP bot di dalam container
+    hibernation_wake_timeout: float = 60.0  # detik menunggu bot siap setelah dibangunkan
+    hibernation_delivery_timeout: float = 10.0  # detik per update yang di-replay
+    
+    # Reconciler status proyek vs container di Docker host
+    reconcile_interval: int = 30  # detik, pass berbasis event Docker
+    reconcile_full_interval: int = 10 * 60  # detik, pass penuh (list semua container)
+    reconcile_event_overlap: float = 5.0  # detik, toleransi selisih jam host
+    reconcile_lock_timeout: int = 5 * 60  # detik
+    
+    # Garbage collector image proyek (per Docker host)
+    image_gc_budget_bytes: int = 20 * 1024 * 1024 * 1024  # 20GB total layer image
+    image_gc_interval: int = 60 * 60  # detik
+    
+    # Image hasil build diekspor ke MinIO agar node lain tidak perlu build ulang
+    image_store_enabled: bool = True
+    image_store_compression_level: int = 6
+    image_store_spool_size: int = 64 * 1024 * 1024  # di atas ini blob di-spool ke disk
+    image_store_blob_min_age: int = 60 * 60  # blob tanpa manifest lebih muda dari ini tidak di-prune
+    
+    # Prometheus exporter di proses utama worker (0 = nonaktif)
+    metrics_port: int = 9808
+    
+    # Package Cache Configuration (pip & npm)
+    package_cache_volume: str = "ziphostbot_package_cache"
+    package_cache_dir: str = "/var/cache/ziphostbot/packages"
+    package_cache_max_bytes: int = 5 * 1024 * 1024 * 1024  # 5GB
     
     class Config:
         env_file = ".env"
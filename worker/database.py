@@ -1,10 +1,11 @@
-from sqlalchemy import create_engine, Column, BigInteger, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import create_engine, select, update, values, column, or_, Column, BigInteger, Integer, Text, DateTime, Enum, ForeignKey, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import enum
 import uuid
+from typing import Dict, List, Sequence
 
 from config import settings
 
@@ -21,6 +22,20 @@ class ProjectStatus(enum.Enum):
     RUNNING = "RUNNING"
     STOPPED = "STOPPED"
     FAILED = "FAILED"
+    HIBERNATED = "HIBERNATED"  # container dihentikan karena idle, dibangunkan saat ada update
+
+
+# Transisi status yang diizinkan (selain ke status yang sama). Harus sama
+# dengan isi tabel project_status_transitions di backend/init.sql, yang
+# dipakai trigger untuk menolak transisi ilegal di database
+ALLOWED_TRANSITIONS = {
+    ProjectStatus.PENDING: {ProjectStatus.PROCESSING, ProjectStatus.FAILED},
+    ProjectStatus.PROCESSING: {ProjectStatus.RUNNING, ProjectStatus.FAILED},
+    ProjectStatus.RUNNING: {ProjectStatus.STOPPED, ProjectStatus.FAILED, ProjectStatus.HIBERNATED},
+    ProjectStatus.STOPPED: {ProjectStatus.PROCESSING, ProjectStatus.RUNNING, ProjectStatus.FAILED},
+    ProjectStatus.FAILED: {ProjectStatus.PROCESSING, ProjectStatus.RUNNING, ProjectStatus.STOPPED},
+    ProjectStatus.HIBERNATED: {ProjectStatus.PROCESSING, ProjectStatus.RUNNING, ProjectStatus.STOPPED, ProjectStatus.FAILED},
+}
 
 
 class User(Base):
@@ -42,9 +57,14 @@ class Project(Base):
     owner_id = Column(BigInteger, ForeignKey("users.telegram_id"), nullable=False)
     name = Column(Text, nullable=False)
     status = Column(Enum(ProjectStatus), default=ProjectStatus.PENDING)
+    pipeline_stage = Column(Text)  # tahap pipeline yang sedang/terakhir berjalan: queued, scan, build, run
     last_error_log = Column(Text)
     container_id = Column(Text)
+    docker_host = Column(Text)  # nama Docker host tempat container berjalan
+    resource_profile = Column(Text)  # profil resource container (small, medium, large)
+    hibernation_enabled = Column(Boolean, default=False)  # opt-in hibernasi saat idle (bot mode webhook)
     zip_storage_path = Column(Text)
+    zip_digest = Column(Text, index=True)
     encrypted_bot_token = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -53,10 +73,111 @@ class Project(Base):
     owner = relationship("User", back_populates="projects")
 
 
+class ZipObject(Base):
+    __tablename__ = "zip_objects"
+    
+    digest = Column(Text, primary_key=True)
+    storage_path = Column(Text, nullable=False, unique=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def transition_status(project_id: str, status: ProjectStatus, **values) -> bool:
+    """
+    Ubah status proyek dengan satu statement UPDATE ... WHERE status IN (...)
+    RETURNING, tanpa memuat row lewat ORM. Kolom lain bisa ikut di-update
+    lewat values. Return False jika proyek tidak ada atau transisi tidak valid
+    """
+    sources = [source for source, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+    statement = (
+        update(Project)
+        .where(Project.id == uuid.UUID(project_id), Project.status.in_(sources + [status]))
+        .values(status=status, **values)
+        .returning(Project.id)
+    )
+    with engine.begin() as conn:
+        return conn.execute(statement).first() is not None
+
+
+def set_project_fields(project_id: str, **values):
+    """
+    Update kolom proyek (selain status) dengan satu statement
+    """
+    with engine.begin() as conn:
+        conn.execute(update(Project).where(Project.id == uuid.UUID(project_id)).values(**values))
+
+
+def fetch_project(project_id: str, *columns):
+    """
+    Ambil beberapa kolom proyek saja (tanpa token/log jika tidak perlu).
+    Return Row atau None
+    """
+    with engine.connect() as conn:
+        return conn.execute(select(*columns).where(Project.id == uuid.UUID(project_id))).first()
+
+
+def hibernation_candidates() -> list:
+    """
+    ID proyek RUNNING yang mengaktifkan hibernasi
+    """
+    statement = select(Project.id).where(Project.status == ProjectStatus.RUNNING, Project.hibernation_enabled.is_(True))
+    with engine.connect() as conn:
+        return [str(project_id) for project_id, in conn.execute(statement)]
+
+
+def project_statuses() -> dict:
+    """
+    Status semua proyek (ID -> ProjectStatus)
+    """
+    with engine.connect() as conn:
+        return {str(project_id): status for project_id, status in conn.execute(select(Project.id, Project.status))}
+
+
+def container_projects(statuses: Sequence[ProjectStatus], project_ids: Sequence[str] = ()) -> list:
+    """
+    Kolom yang dibutuhkan reconciler untuk proyek berstatus statuses atau
+    yang ID-nya ada di project_ids, dengan satu query
+    """
+    conditions = [Project.status.in_(statuses)]
+    if project_ids:
+        conditions.append(Project.id.in_([uuid.UUID(project_id) for project_id in project_ids]))
+    statement = select(Project.id, Project.status, Project.container_id, Project.docker_host).where(or_(*conditions))
+    with engine.connect() as conn:
+        return conn.execute(statement).all()
+
+
+def bulk_transition(rows: List[Dict[str, str]], status: ProjectStatus, expected: ProjectStatus,
+                    match: Sequence[str] = (), columns: Sequence[str] = ()) -> List[str]:
+    """
+    Ubah status banyak proyek dengan satu statement UPDATE ... FROM (VALUES
+    ...) RETURNING. Setiap row berisi 'id' dan nilai kolom teks: kolom di
+    match harus sama dengan nilai di row (mis. container yang diamati),
+    kolom di columns ikut di-update. Hanya proyek yang masih berstatus
+    expected yang diubah. Return ID proyek yang berubah
+    """
+    if not rows:
+        return []
+    if status != expected and status not in ALLOWED_TRANSITIONS[expected]:
+        raise Exception(f"Transisi status {expected.value} -> {status.value} tidak valid")
+    names = list(dict.fromkeys([*match, *columns]))
+    data = values(
+        column('id', UUID(as_uuid=True)), *[column(name, Text) for name in names], name='changes'
+    ).data([(uuid.UUID(row['id']), *[row[name] for name in names]) for row in rows])
+    statement = (
+        update(Project)
+        .where(Project.id == data.c.id, Project.status == expected, *[getattr(Project, name) == data.c[name] for name in match])
+        .values(status=status, **{name: data.c[name] for name in columns})
+        .returning(Project.id)
+    )
+    with engine.begin() as conn:
+        return [str(project_id) for project_id, in conn.execute(statement)]
@@ -0,0 +1,281 @@
+import json
+import socket
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+import docker
+import redis
+
+from config import settings
+from resources import get_profile
+import image_store
+import metrics
+
+LOCAL_HOST = "local"
+
+# Label container bot; reservasi resource disimpan di label agar beban host
+# bisa dihitung dari satu request list container
+PROJECT_LABEL = "ziphostbot.project"
+MEMORY_LABEL = "ziphostbot.memory"
+CPUS_LABEL = "ziphostbot.cpus"
+PROFILE_LABEL = "ziphostbot.profile"
+# Hash token terenkripsi + profil + mode hibernasi, untuk reuse container
+CONFIG_LABEL = "ziphostbot.config"
+
+# Reservasi resource untuk container yang sedang dibuat (project_id ->
+# [memory, cpus, kedaluwarsa]); dicek dan ditulis di bawah lock per host
+RESERVATIONS_KEY = "ziphostbot:host:{host}:reservations"
+HOST_LOCK_KEY = "ziphostbot:lock:host:{host}"
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+class NoCapacityError(Exception):
+    """
+    Dilempar ketika tidak ada host dengan headroom untuk profil yang diminta
+    """
+    pass
+
+
+class HostLoad(NamedTuple):
+    name: str
+    memory_total: int
+    cpus: float
+    memory_reserved: int
+    cpus_reserved: float
+    containers: int
+    
+    @property
+    def free_memory(self) -> int:
+        return self.memory_total - self.memory_reserved
+    
+    @property
+    def free_cpus(self) -> float:
+        return self.cpus - self.cpus_reserved
+    
+    @property
+    def score(self) -> float:
+        # Rasio sisa resource yang paling sempit menentukan seberapa longgar host
+        return min(self.free_memory / self.memory_total, self.free_cpus / self.cpus)
+
+
+class DockerHostPool:
+    """
+    Kumpulan Docker daemon untuk menjalankan container bot. Host "local"
+    (socket worker) selalu ada dan dipakai untuk build; container bot
+    ditempatkan di host yang paling longgar berdasarkan memori dan CPU
+    """
+    
+    def __init__(self, hosts: Dict[str, str], build_host: str = LOCAL_HOST, capacity_ttl: float = 300.0):
+        self.urls = dict(hosts)
+        # Tanpa konfigurasi, semua bot berjalan di daemon lokal seperti sebelumnya
+        self.run_hosts = list(hosts) or [LOCAL_HOST]
+        self.build_host = build_host
+        self.capacity_ttl = capacity_ttl
+        self._clients: Dict[str, docker.DockerClient] = {}
+        self._capacity: Dict[str, tuple] = {}
+    
+    def client(self, name: Optional[str]) -> docker.DockerClient:
+        """
+        Client Docker untuk host tertentu. None berarti daemon lokal: proyek
+        lama yang docker_host-nya kosong berjalan di sana
+        """
+        if name is None:
+            name = LOCAL_HOST
+        if name not in self._clients:
+            if name in self.urls:
+                client = docker.DockerClient(base_url=self.urls[name], max_pool_size=settings.docker_max_pool_size)
+            elif name == LOCAL_HOST:
+                client = docker.from_env(max_pool_size=settings.docker_max_pool_size)
+            else:
+                raise Exception(f"Docker host tidak dikenal: {name}")
+            self._clients[name] = client
+        return self._clients[name]
+    
+    @property
+    def hosts(self) -> List[str]:
+        """
+        Semua host yang menyimpan image proyek (build + run)
+        """
+        return list(dict.fromkeys([self.build_host] + self.run_hosts))
+    
+    def is_run_host(self, name: Optional[str]) -> bool:
+        return name in self.run_hosts
+    
+    def address(self, name: str) -> str:
+        """
+        Alamat host untuk menjangkau port container yang dipublish
+        """
+        url = self.urls.get(name)
+        if not url or url.startswith('unix:'):
+            return settings.docker_local_address
+        return urllib.parse.urlsplit(url.replace('tcp://', 'http://', 1)).hostname
+    
+    def bind_address(self, name: str) -> str:
+        """
+        IP untuk bind port container yang dipublish: hanya alamat internal
+        host, bukan 0.0.0.0, agar port bot tidak terbuka ke luar
+        """
+        return socket.gethostbyname(self.address(name))
+    
+    def _host_capacity(self, name: str) -> tuple:
+        """
+        Kapasitas yang boleh dipesan bot: memori host dikurangi cadangan
+        sistem, dikali rasio overcommit
+        """
+        cached = self._capacity.get(name)
+        if cached and time.monotonic() - cached[0] < self.capacity_ttl:
+            return cached[1], cached[2]
+        info = self.client(name).info()
+        memory_total = max(int((info['MemTotal'] - settings.host_memory_reserve) * settings.host_memory_overcommit), 1)
+        cpus = float(info['NCPU']) * settings.host_cpu_overcommit
+        self._capacity[name] = (time.monotonic(), memory_total, cpus)
+        return memory_total, cpus
+    
+    def load(self, name: str) -> HostLoad:
+        """
+        Kapasitas host dan resource yang sudah dipesan container bot di
+        dalamnya, termasuk reservasi container yang sedang dibuat
+        """
+        memory_total, cpus = self._host_capacity(name)
+        # Reservasi dibaca sebelum list container: reservasi yang dilepas di
+        # antaranya container-nya sudah berjalan sehingga tetap terhitung
+        reservations = redis_client.hgetall(RESERVATIONS_KEY.format(host=name))
+        default = get_profile()
+        memory_reserved = 0
+        cpus_reserved = 0.0
+        running = set()
+        containers = self.client(name).api.containers(filters={'label': PROJECT_LABEL})
+        for container in containers:
+            labels = container.get('Labels') or {}
+            memory_reserved += int(labels.get(MEMORY_LABEL) or default.memory)
+            cpus_reserved += float(labels.get(CPUS_LABEL) or default.cpus)
+            running.add(labels.get(PROJECT_LABEL))
+        
+        pending = 0
+        now = time.time()
+        for project_id, value in reservations.items():
+            memory, reserved_cpus, expires_at = json.loads(value)
+            # Container yang sudah berjalan sudah dihitung dari label-nya
+            if expires_at > now and project_id.decode() not in running:
+                memory_reserved += memory
+                cpus_reserved += reserved_cpus
+                pending += 1
+        return HostLoad(name, memory_total, cpus, memory_reserved, cpus_reserved, len(containers) + pending)
+    
+    def loads(self) -> List[HostLoad]:
+        """
+        Beban semua host; host yang tidak bisa dihubungi dilewati
+        """
+        loads = []
+        for name in self.run_hosts:
+            try:
+                loads.append(self.load(name))
+            except Exception as e:
+                metrics.record_error(e)
+                print(f"Docker host {name} unavailable: {e}")
+        return loads
+    
+    def reserve(self, name: str, project_id: str, memory: int, cpus: float) -> bool:
+        """
+        Admission atomik per host: cek headroom dan catat reservasi di bawah
+        lock host, sehingga worker lain yang menempatkan container bersamaan
+        melihat reservasi ini. Return False jika host tidak muat
+        """
+        lock = redis_client.lock(HOST_LOCK_KEY.format(host=name), timeout=60,
+                                 blocking_timeout=settings.project_lock_wait)
+        if not lock.acquire():
+            print(f"Docker host {name} busy, skipping")
+            return False
+        try:
+            try:
+                load = self.load(name)
+            except Exception as e:
+                metrics.record_error(e)
+                print(f"Docker host {name} unavailable: {e}")
+                return False
+            if load.free_memory < memory or load.free_cpus < cpus:
+                return False
+            key = RESERVATIONS_KEY.format(host=name)
+            now = time.time()
+            expired = [project for project, value in redis_client.hgetall(key).items() if json.loads(value)[2] <= now]
+            pipe = redis_client.pipeline()
+            if expired:
+                pipe.hdel(key, *expired)
+            pipe.hset(key, project_id, json.dumps([memory, cpus, now + settings.host_reservation_ttl]))
+            pipe.execute()
+            print(f"Placing container on {name} (free memory {load.free_memory}, free cpus {load.free_cpus:.2f})")
+            return True
+        finally:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass
+    
+    def release(self, name: str, project_id: str):
+        """
+        Lepas reservasi setelah container berjalan (dihitung dari label) atau gagal dibuat
+        """
+        try:
+            redis_client.hdel(RESERVATIONS_KEY.format(host=name), project_id)
+        except redis.RedisError as e:
+            # Reservasi tetap kedaluwarsa setelah host_reservation_ttl
+            print(f"Error releasing reservation of project {project_id} on {name}: {e}")
+    
+    @contextmanager
+    def admit(self, project_id: str, memory: int, cpus: float, preferred: Optional[str] = None):
+        """
+        Admission + placement: pesan resource di host sebelumnya (preferred)
+        jika masih muat, selain itu di host dengan sisa resource paling
+        longgar. Reservasi dilepas setelah blok with selesai, jadi buat
+        container di dalam blok
+        """
+        candidates = sorted(self.loads(), key=lambda load: (load.score, -load.containers), reverse=True)
+        names = [load.name for load in candidates
+                 if load.free_memory >= memory and load.free_cpus >= cpus and load.name != preferred]
+        if self.is_run_host(preferred):
+            names.insert(0, preferred)
+        
+        for name in names:
+            if self.reserve(name, project_id, memory, cpus):
+                break
+        else:
+            raise NoCapacityError("Kapasitas server penuh, coba lagi nanti atau pilih profil resource yang lebih kecil")
+        try:
+            yield name
+        finally:
+            self.release(name, project_id)
+    
+    def ensure_image(self, name: str, image_tag: str):
+        """
+        Pastikan image ada di host; jika belum, muat dari image yang diekspor
+        ke MinIO (hanya layer yang belum ada di host), atau salin dari host
+        build secara streaming (docker save -> docker load tanpa file sementara)
+        """
+        client = self.client(name)
+        try:
+            client.images.get(image_tag)
+            return
+        except docker.errors.ImageNotFound:
+            pass
+        
+        if settings.image_store_enabled:
+            try:
+                if image_store.load_image(client, image_tag):
+                    return
+            except Exception as e:
+                metrics.record_error(e)
+                print(f"Error loading image {image_tag} from object storage: {e}")
+        
+        if name == self.build_host:
+            raise docker.errors.ImageNotFound(f"Image {image_tag} not found")
+        
+        print(f"Transferring image {image_tag} from {self.build_host} to {name}...")
+        source = self.client(self.build_host)
+        source.images.get(image_tag)
+        client.images.load(source.api.get_image(image_tag))
+
+
+host_pool = DockerHostPool(settings.docker_hosts, build_host=settings.docker_build_host)
@@ -0,0 +1,151 @@
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Dispatch(NamedTuple):
+    owner_id: int
+    project_id: str
+    wait: float
+
+
+class MemoryStore:
+    """
+    State scheduler di memori (untuk simulasi dan benchmark). Implementasi
+    Redis ada di scheduler.RedisStore dengan method yang sama
+    """
+    
+    def __init__(self):
+        self.queues: Dict[int, deque] = {}
+        self.ring: deque = deque()
+        self.credits: Dict[int, int] = {}
+        self.inflight: Dict[str, Tuple[int, float]] = {}
+    
+    def push(self, owner_id: int, project_id: str, enqueued_at: float):
+        self.queues.setdefault(owner_id, deque()).append((project_id, enqueued_at))
+        if owner_id not in self.ring:
+            self.ring.append(owner_id)
+    
+    def pop(self, owner_id: int) -> Optional[Tuple[str, float]]:
+        queue = self.queues.get(owner_id)
+        return queue.popleft() if queue else None
+    
+    def depth(self, owner_id: int) -> int:
+        return len(self.queues.get(owner_id, ()))
+    
+    def owners(self) -> List[int]:
+        return list(self.ring)
+    
+    def rotate(self, owner_id: int):
+        self.ring.remove(owner_id)
+        self.ring.append(owner_id)
+    
+    def remove_owner(self, owner_id: int):
+        self.ring.remove(owner_id)
+        self.credits.pop(owner_id, None)
+    
+    def get_credits(self, owner_id: int) -> Optional[int]:
+        return self.credits.get(owner_id)
+    
+    def set_credits(self, owner_id: int, credits: Optional[int]):
+        if credits is None:
+            self.credits.pop(owner_id, None)
+        else:
+            self.credits[owner_id] = credits
+    
+    def running(self, owner_id: int) -> int:
+        return sum(1 for owner, _ in self.inflight.values() if owner == owner_id)
+    
+    def total_running(self) -> int:
+        return len(self.inflight)
+    
+    def start(self, project_id: str, owner_id: int, started_at: float):
+        self.inflight[project_id] = (owner_id, started_at)
+    
+    def finish(self, project_id: str) -> Optional[int]:
+        entry = self.inflight.pop(project_id, None)
+        return entry[0] if entry else None
+    
+    def inflight_started(self) -> Dict[str, float]:
+        return {project_id: started_at for project_id, (_, started_at) in self.inflight.items()}
+
+
+class FairShareScheduler:
+    """
+    Weighted round-robin antar owner: setiap giliran owner boleh mendapat
+    sebanyak weight slot build sebelum pindah ke owner berikutnya, dengan
+    batas build bersamaan per owner dan jumlah slot total. Owner yang
+    mengunggah banyak proyek hanya mengantre di queue miliknya sendiri
+    """
+    
+    def __init__(self, store, slots: int, per_user_limit: int, weights: Dict[int, int] = None, slot_timeout: float = None):
+        self.store = store
+        self.slots = slots
+        self.per_user_limit = per_user_limit
+        self.weights = weights or {}
+        self.slot_timeout = slot_timeout
+    
+    def weight(self, owner_id: int) -> int:
+        return max(1, self.weights.get(owner_id, 1))
+    
+    def enqueue(self, owner_id: int, project_id: str, now: float):
+        self.store.push(owner_id, project_id, now)
+    
+    def release(self, project_id: str) -> Optional[int]:
+        """
+        Kembalikan slot build proyek. Aman dipanggil lebih dari sekali
+        """
+        return self.store.finish(project_id)
+    
+    def reclaim(self, now: float) -> List[str]:
+        """
+        Ambil kembali slot yang tidak pernah dilepas (misal worker mati)
+        """
+        if not self.slot_timeout:
+            return []
+        expired = [project_id for project_id, started_at in self.store.inflight_started().items()
+                   if now - started_at > self.slot_timeout]
+        for project_id in expired:
+            self.store.finish(project_id)
+        return expired
+    
+    def dispatch(self, now: float) -> List[Dispatch]:
+        """
+        Pilih proyek berikutnya sampai slot penuh atau tidak ada owner yang
+        boleh menjalankan build lagi
+        """
+        dispatched = []
+        while self.store.total_running() < self.slots:
+            picked = self._next(now)
+            if picked is None:
+                break
+            dispatched.append(picked)
+        return dispatched
+    
+    def _next(self, now: float) -> Optional[Dispatch]:
+        # Satu putaran penuh ring; owner yang sedang di batasnya dilewati
+        for owner_id in self.store.owners():
+            if self.store.depth(owner_id) == 0:
+                self.store.remove_owner(owner_id)
+                continue
+            if self.store.running(owner_id) >= self.per_user_limit:
+                self.store.set_credits(owner_id, None)
+                self.store.rotate(owner_id)
+                continue
+            
+            project_id, enqueued_at = self.store.pop(owner_id)
+            self.store.start(project_id, owner_id, now)
+            
+            credits = self.store.get_credits(owner_id)
+            credits = (self.weight(owner_id) if credits is None else credits) - 1
+            if credits <= 0 or self.store.depth(owner_id) == 0:
+                # Giliran habis: pindah ke belakang ring
+                self.store.set_credits(owner_id, None)
+                if self.store.depth(owner_id) == 0:
+                    self.store.remove_owner(owner_id)
+                else:
+                    self.store.rotate(owner_id)
+            else:
+                self.store.set_credits(owner_id, credits)
+            
+            return Dispatch(owner_id, project_id, now - enqueued_at)
+        return None
@@ -0,0 +1,233 @@
+import hashlib
+import hmac
+import socket
+import time
+from typing import Dict, List, Optional
+
+import redis
+import requests
+
+from config import settings
+
+# Key Redis yang dipakai bersama dengan ingress webhook di backend
+# (backend/hibernation.py)
+ENDPOINT_KEY = "ziphostbot:hibernation:endpoint:{project_id}"
+BUFFER_KEY = "ziphostbot:hibernation:buffer:{project_id}"
+WAKE_STARTED_KEY = "ziphostbot:hibernation:wake_started:{project_id}"
+ACTIVITY_KEY = "ziphostbot:hibernation:activity"
+STATS_KEY = "ziphostbot:hibernation:stats"
+COLD_STARTS_KEY = "ziphostbot:hibernation:cold_starts"
+RECENT_COLD_STARTS = 1000
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+http = requests.Session()
+
+
+def webhook_secret(project_id: str) -> str:
+    """
+    Secret token webhook per proyek (dikirim Telegram di header dan
+    diteruskan ingress ke container bot)
+    """
+    return hmac.new(settings.encryption_key.encode(), project_id.encode(), hashlib.sha256).hexdigest()
+
+
+def webhook_url(project_id: str) -> str:
+    return f"{settings.public_api_url}/telegram/webhook/{project_id}"
+
+
+def bot_api(bot_token: str, method: str, **params) -> dict:
+    """
+    Panggil method Telegram Bot API (base URL bisa diarahkan ke stand-in lokal)
+    """
+    response = http.post(
+        f"{settings.telegram_api_base_url}/bot{bot_token}/{method}",
+        json=params,
+        timeout=settings.telegram_api_timeout
+    )
+    data = response.json()
+    if not data.get('ok'):
+        raise Exception(f"Bot API {method} failed: {data.get('description')}")
+    return data.get('result')
+
+
+def register_webhook(project_id: str, bot_token: str):
+    """
+    Arahkan update bot ke ingress platform. max_connections=1 agar update
+    dikirim berurutan
+    """
+    bot_api(
+        bot_token, 'setWebhook',
+        url=webhook_url(project_id),
+        secret_token=webhook_secret(project_id),
+        max_connections=1
+    )
+
+
+def container_environment(project_id: str) -> Dict[str, str]:
+    """
+    Environment tambahan container bot mode hibernasi: bot menerima update
+    sebagai POST JSON di PORT (bukan getUpdates)
+    """
+    return {
+        'PORT': str(settings.hibernation_bot_port),
+        'WEBHOOK_SECRET': webhook_secret(project_id),
+    }
+
+
+def container_endpoint(address: str, container) -> str:
+    """
+    URL HTTP bot di container berdasarkan port yang dipublish Docker
+    """
+    container.reload()
+    bindings = container.attrs['NetworkSettings']['Ports'].get(f"{settings.hibernation_bot_port}/tcp")
+    if not bindings:
+        raise Exception(f"Port {settings.hibernation_bot_port} of container {container.id} is not published")
+    return f"http://{address}:{bindings[0]['HostPort']}"
+
+
+def wait_ready(endpoint: str, timeout: float):
+    """
+    Tunggu sampai bot menerima koneksi di endpoint-nya
+    """
+    host, port = endpoint.rsplit('/', 1)[-1].rsplit(':', 1)
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while True:
+        try:
+            socket.create_connection((host, int(port)), timeout=1.0).close()
+            return
+        except OSError:
+            if time.monotonic() + delay > deadline:
+                raise Exception(f"Bot endpoint {endpoint} not ready after {timeout:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+def deliver(endpoint: str, project_id: str, update: bytes):
+    response = http.post(
+        endpoint,
+        data=update,
+        headers={'Content-Type': 'application/json', SECRET_HEADER: webhook_secret(project_id)},
+        timeout=settings.hibernation_delivery_timeout
+    )
+    response.raise_for_status()
+
+
+def publish_endpoint(project_id: str, endpoint: str) -> int:
+    """
+    Kirim ulang update yang di-buffer ingress secara berurutan, lalu publish
+    endpoint agar update berikutnya diteruskan langsung. Endpoint hanya di-set
+    saat buffer kosong (WATCH) sehingga urutan update tetap terjaga. Return
+    jumlah update yang di-replay
+    """
+    wait_ready(endpoint, settings.hibernation_wake_timeout)
+    
+    buffer_key = BUFFER_KEY.format(project_id=project_id)
+    replayed = 0
+    while True:
+        update = redis_client.lindex(buffer_key, 0)
+        if update is not None:
+            deliver(endpoint, project_id, update)
+            redis_client.lpop(buffer_key)
+            replayed += 1
+            continue
+        
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(buffer_key)
+                if pipe.llen(buffer_key):
+                    continue
+                pipe.multi()
+                pipe.set(ENDPOINT_KEY.format(project_id=project_id), endpoint)
+                pipe.zadd(ACTIVITY_KEY, {project_id: time.time()})
+                pipe.execute()
+            except redis.WatchError:
+                # Ingress menambah update di antara cek dan set
+                continue
+        break
+    
+    record_cold_start(project_id, replayed)
+    return replayed
+
+
+def clear_endpoint(project_id: str):
+    """
+    Hentikan penerusan langsung; update berikutnya di-buffer ingress
+    """
+    redis_client.delete(ENDPOINT_KEY.format(project_id=project_id))
+
+
+def has_buffered_updates(project_id: str) -> bool:
+    return redis_client.llen(BUFFER_KEY.format(project_id=project_id)) > 0
+
+
+def record_cold_start(project_id: str, replayed: int):
+    """
+    Catat latensi cold start: dari update pertama yang di-buffer sampai bot
+    siap dan buffer selesai di-replay
+    """
+    started = redis_client.getdel(WAKE_STARTED_KEY.format(project_id=project_id))
+    if started is None:
+        return
+    elapsed = time.time() - float(started)
+    pipe = redis_client.pipeline()
+    pipe.hincrby(STATS_KEY, "wakes", 1)
+    pipe.hincrby(STATS_KEY, "replayed_updates", replayed)
+    pipe.hincrbyfloat(STATS_KEY, "cold_start_seconds_total", elapsed)
+    pipe.lpush(COLD_STARTS_KEY, elapsed)
+    pipe.ltrim(COLD_STARTS_KEY, 0, RECENT_COLD_STARTS - 1)
+    pipe.execute()
+    print(f"Project {project_id} woke up in {elapsed:.2f}s, replayed {replayed} updates")
+
+
+def record_hibernation():
+    redis_client.hincrby(STATS_KEY, "hibernations", 1)
+
+
+def idle_projects(project_ids: List[str], idle_timeout: float) -> List[str]:
+    """
+    Proyek yang tidak menerima update selama idle_timeout. Proyek tanpa
+    catatan aktivitas mulai dihitung dari sekarang
+    """
+    if not project_ids:
+        return []
+    now = time.time()
+    pipe = redis_client.pipeline()
+    for project_id in project_ids:
+        pipe.zadd(ACTIVITY_KEY, {project_id: now}, nx=True)
+    pipe.execute()
+    
+    scores = redis_client.zmscore(ACTIVITY_KEY, project_ids)
+    return [project_id for project_id, last in zip(project_ids, scores) if last is not None and now - last >= idle_timeout]
+
+
+def forget(project_id: str):
+    """
+    Hapus semua state hibernasi proyek (proyek dihentikan/dihapus)
+    """
+    pipe = redis_client.pipeline()
+    pipe.delete(ENDPOINT_KEY.format(project_id=project_id))
+    pipe.delete(BUFFER_KEY.format(project_id=project_id))
+    pipe.delete(WAKE_STARTED_KEY.format(project_id=project_id))
+    pipe.zrem(ACTIVITY_KEY, project_id)
+    pipe.execute()
+
+
+def get_stats() -> dict:
+    """
+    Jumlah wake/hibernasi dan latensi cold start
+    """
+    counters = {key.decode(): float(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
+    cold_starts = sorted(float(value) for value in redis_client.lrange(COLD_STARTS_KEY, 0, -1))
+    
+    def percentile(p: float) -> Optional[float]:
+        return cold_starts[min(len(cold_starts) - 1, int(len(cold_starts) * p))] if cold_starts else None
+    
+    return {
+        'cold_start_p50': percentile(0.5),
+        'cold_start_p95': percentile(0.95),
+        'cold_start_max': cold_starts[-1] if cold_starts else None,
+        **counters,
+    }
@@ -0,0 +1,291 @@
+import time
+import uuid
+from typing import Dict, List, NamedTuple
+
+import docker
+import redis
+
+from config import settings
+from database import Project, ProjectStatus, fetch_project, project_statuses
+from docker_hosts import host_pool
+from images import DEPS_IMAGE_REPOSITORY
+from locks import ProjectLocked, project_lock
+import image_store
+import metrics
+
+PROJECT_REPOSITORY = "ziphostbot/project"
+
+# Waktu terakhir image proyek (member: project_id) dan image dependency
+# (member: tag) dipakai, per host
+LAST_USED_KEY = "ziphostbot:images:last_used:{host}"
+STATS_KEY = "ziphostbot:image_gc:stats"
+
+# Image proyek dengan status ini tidak pernah dihapus karena budget. Bot
+# HIBERNATED dibangunkan dari image lokal saat update masuk; tanpa image cold
+# start harus memuat ulang dari MinIO atau build ulang
+PROTECTED_STATUSES = {ProjectStatus.PENDING, ProjectStatus.PROCESSING, ProjectStatus.RUNNING, ProjectStatus.HIBERNATED}
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+class ProjectImage(NamedTuple):
+    project_id: str  # untuk image dependency berisi tag image
+    tag: str
+    size: int  # bytes yang hanya dipakai image ini (tanpa layer bersama)
+    containers: int
+    created: int
+
+
+def project_image_tag(project_id: str) -> str:
+    return f"{PROJECT_REPOSITORY}:{project_id}"
+
+
+def record_use(host: str, project_id: str):
+    """
+    Catat image proyek (atau tag image dependency) baru saja dipakai di
+    host (untuk urutan LRU)
+    """
+    try:
+        redis_client.zadd(LAST_USED_KEY.format(host=host), {project_id: time.time()})
+    except redis.RedisError as e:
+        print(f"Error recording image use of project {project_id}: {e}")
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
+
+
+def project_images(usage: dict) -> List[ProjectImage]:
+    """
+    Image proyek dari hasil docker system df
+    """
+    images = []
+    for image in usage.get('Images') or []:
+        for tag in image.get('RepoTags') or []:
+            repository, _, project_id = tag.rpartition(':')
+            if repository == PROJECT_REPOSITORY and _is_uuid(project_id):
+                shared = max(image.get('SharedSize') or 0, 0)
+                images.append(ProjectImage(project_id, tag, image['Size'] - shared, image.get('Containers') or 0, image.get('Created') or 0))
+    return images
+
+
+def unused_deps_images(usage: dict) -> List[ProjectImage]:
+    """
+    Image dependency yang tidak menjadi dasar image lain: layer-nya tidak
+    dibagi dengan image mana pun selain base image, jadi menghapusnya
+    benar-benar membebaskan disk
+    """
+    images = []
+    for image in usage.get('Images') or []:
+        size = image['Size'] - max(image.get('SharedSize') or 0, 0)
+        if size <= 0 or image.get('Containers'):
+            continue
+        for tag in image.get('RepoTags') or []:
+            if tag.startswith(f"{DEPS_IMAGE_REPOSITORY}:"):
+                images.append(ProjectImage(tag, tag, size, 0, image.get('Created') or 0))
+    return images
+
+
+def evict_deps(client: docker.DockerClient, host: str, budget: int, used: int) -> tuple:
+    """
+    Hapus image dependency yang tidak dipakai, paling lama tidak dipakai
+    lebih dulu, sampai total layer di bawah budget. Return (jumlah, used)
+    """
+    candidates = unused_deps_images(client.df())
+    if not candidates:
+        return 0, used
+    last_used = dict(zip(
+        [image.tag for image in candidates],
+        redis_client.zmscore(LAST_USED_KEY.format(host=host), [image.tag for image in candidates])
+    ))
+    candidates.sort(key=lambda image: last_used.get(image.tag) or image.created)
+    removed = 0
+    for image in candidates:
+        if used <= budget:
+            break
+        if remove_image(client, host, image):
+            removed += 1
+            used -= image.size
+    return removed, used
+
+
+def remove_stopped_container(client: docker.DockerClient, project_id: str):
+    """
+    Hapus container proyek yang disimpan dalam keadaan berhenti (mode reuse)
+    agar image-nya bisa dihapus; start berikutnya membuat container baru
+    """
+    try:
+        container = client.containers.get(f"ziphostbot_{project_id}")
+    except docker.errors.NotFound:
+        return
+    if container.status != 'running':
+        container.remove()
+
+
+def remove_image(client: docker.DockerClient, host: str, image: ProjectImage) -> bool:
+    """
+    Hapus tag image proyek. Image yang masih dipakai container dilewati
+    """
+    try:
+        client.images.remove(image.tag)
+    except docker.errors.ImageNotFound:
+        pass
+    except docker.errors.APIError as e:
+        if e.status_code != 409:
+            raise
+        print(f"Image {image.tag} on {host} is in use, skipping")
+        return False
+    redis_client.zrem(LAST_USED_KEY.format(host=host), image.project_id)
+    print(f"Removed image {image.tag} from {host} ({image.size} bytes)")
+    return True
+
+
+def evict(client: docker.DockerClient, host: str, image: ProjectImage) -> bool:
+    """
+    Hapus image proyek yang masih ada di database karena budget. Dicek ulang
+    di bawah lock proyek agar tidak bentrok dengan start/wake
+    """
+    try:
+        with project_lock(image.project_id, wait=0):
+            project = fetch_project(image.project_id, Project.status)
+            if project is None or project.status in PROTECTED_STATUSES:
+                return False
+            remove_stopped_container(client, image.project_id)
+            return remove_image(client, host, image)
+    except ProjectLocked:
+        return False
+
+
+def collect_host(host: str, budget: int, statuses: Dict[str, ProjectStatus]) -> dict:
+    """
+    Jalankan GC di satu host: hapus image proyek yang sudah dihapus, lalu
+    image dependency yang tidak dipakai dan image proyek yang paling lama
+    tidak dipakai sampai total layer di bawah budget, lalu layer menggantung
+    dan build cache
+    """
+    client = host_pool.client(host)
+    usage = client.df()
+    used_before = usage.get('LayersSize') or 0
+    images = project_images(usage)
+    removed = 0
+    
+    # Proyek yang sudah dihapus: tidak perlu menunggu budget terlampaui.
+    # Dicek ulang karena proyek baru bisa dibuat setelah statuses diambil
+    deleted = [image for image in images
+               if image.project_id not in statuses and fetch_project(image.project_id, Project.id) is None]
+    for image in deleted:
+        remove_stopped_container(client, image.project_id)
+        if remove_image(client, host, image):
+            removed += 1
+    
+    used = used_before - sum(image.size for image in deleted)
+    # Image dependency yang tidak dipakai hanya cache build, dibuang sebelum
+    # image proyek
+    if used > budget:
+        count, used = evict_deps(client, host, budget, used)
+        removed += count
+    if used > budget:
+        last_used = dict(zip(
+            [image.project_id for image in images],
+            redis_client.zmscore(LAST_USED_KEY.format(host=host), [image.project_id for image in images]) if images else []
+        ))
+        candidates = [
+            image for image in images
+            if image.project_id in statuses and statuses[image.project_id] not in PROTECTED_STATUSES
+        ]
+        # Image tanpa catatan pemakaian diurutkan dari waktu dibuat
+        candidates.sort(key=lambda image: last_used.get(image.project_id) or image.created)
+        for image in candidates:
+            if used <= budget:
+                break
+            if evict(client, host, image):
+                removed += 1
+                used -= image.size
+        
+        # Image dependency yang baru tidak dipakai setelah image proyek dihapus
+        if used > budget:
+            count, used = evict_deps(client, host, budget, used)
+            removed += count
+    
+    # Layer menggantung dari build ulang dan image yang baru dihapus
+    client.images.prune(filters={'dangling': True})
+    build_cache = 0
+    if host == host_pool.build_host:
+        try:
+            build_cache = client.api.prune_builds().get('SpaceReclaimed') or 0
+        except docker.errors.APIError as e:
+            print(f"Error pruning build cache on {host}: {e}")
+    
+    used_after = client.df().get('LayersSize') or 0
+    return {
+        'images_removed': removed,
+        'bytes_reclaimed': max(used_before - used_after, 0) + build_cache,
+        'layers_size': used_after,
+        'budget': budget,
+    }
+
+
+def collect(budget: int = None) -> Dict[str, dict]:
+    """
+    GC image di semua host. Return laporan per host
+    """
+    budget = budget or settings.image_gc_budget_bytes
+    statuses = project_statuses()
+    report = {}
+    for host in host_pool.hosts:
+        try:
+            report[host] = collect_host(host, budget, statuses)
+        except Exception as e:
+            metrics.record_error(e)
+            print(f"Error collecting images on {host}: {e}")
+            continue
+        print(f"Image GC on {host}: removed {report[host]['images_removed']} images, "
+              f"reclaimed {report[host]['bytes_reclaimed']} bytes")
+    
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(STATS_KEY, "runs", 1)
+        pipe.hincrby(STATS_KEY, "images_removed", sum(host['images_removed'] for host in report.values()))
+        pipe.hincrby(STATS_KEY, "bytes_reclaimed", sum(host['bytes_reclaimed'] for host in report.values()))
+        pipe.hset(STATS_KEY, "last_run_at", int(time.time()))
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error recording image GC stats: {e}")
+    return report
+
+
+def remove_project(project_id: str) -> int:
+    """
+    Hapus container dan image proyek yang dihapus dari semua host (dan
+    export image-nya di MinIO). Return jumlah image yang dihapus
+    """
+    tag = project_image_tag(project_id)
+    removed = 0
+    for host in host_pool.hosts:
+        client = host_pool.client(host)
+        try:
+            client.containers.get(f"ziphostbot_{project_id}").remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        try:
+            client.images.remove(tag, force=True)
+            removed += 1
+        except docker.errors.ImageNotFound:
+            pass
+        redis_client.zrem(LAST_USED_KEY.format(host=host), project_id)
+    if settings.image_store_enabled:
+        image_store.delete_image(tag)
+    if removed:
+        redis_client.hincrby(STATS_KEY, "images_removed", removed)
+    return removed
+
+
+def get_stats() -> Dict[str, int]:
+    """
+    Counter GC image
+    """
+    return {key.decode(): int(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
@@ -0,0 +1,385 @@
+import hashlib
+import io
+import json
+import posixpath
+import tarfile
+import tempfile
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Set
+
+import docker
+import redis
+from minio.commonconfig import REPLACE, CopySource
+from minio.error import S3Error
+
+from config import settings
+from storage import storage
+
+# Image hasil build disimpan di bucket MinIO yang sama dengan arsip ZIP:
+#   images/blobs/sha256/<digest>       isi file dari docker save (gzip),
+#                                      dedup antar image (layer base/deps)
+#   images/manifests/<repo>/<tag>.json daftar entri tar image + RootFS
+BLOB_PREFIX = "images/blobs/sha256/"
+MANIFEST_PREFIX = "images/manifests/"
+STATS_KEY = "ziphostbot:image_store:stats"
+
+CHUNK_SIZE = 1024 * 1024
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+class _IterReader(io.RawIOBase):
+    """
+    File-like read-only di atas iterator chunk bytes (stream docker save)
+    """
+    
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b''
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def manifest_key(image_tag: str) -> str:
+    repository, _, tag = image_tag.rpartition(':')
+    return f"{MANIFEST_PREFIX}{repository}/{tag}.json"
+
+
+def blob_key(digest: str) -> str:
+    return f"{BLOB_PREFIX}{digest}"
+
+
+def _known_digest(name: str) -> Optional[str]:
+    """
+    Digest isi entri dari namanya (format OCI: blobs/sha256/<digest>)
+    """
+    directory, digest = posixpath.split(name)
+    if directory == 'blobs/sha256' and len(digest) == 64:
+        return digest
+    return None
+
+
+def _touch_blob(digest: str) -> bool:
+    """
+    Perbarui last_modified blob yang sudah ada (copy ke dirinya sendiri di
+    server) agar prune() yang berjalan bersamaan export tidak menganggapnya
+    blob lama tanpa manifest. Return False jika blob belum ada
+    """
+    key = blob_key(digest)
+    try:
+        storage.client.copy_object(
+            storage.bucket_name, key, CopySource(storage.bucket_name, key),
+            metadata={'Content-Type': 'application/gzip'}, metadata_directive=REPLACE
+        )
+        return True
+    except S3Error as e:
+        if e.code in ('NoSuchKey', 'NoSuchObject'):
+            return False
+        raise
+
+
+def _upload_blob(fileobj, expected: Optional[str]) -> tuple:
+    """
+    Kompres dan upload isi satu entri tar. Isi di-spool ke memori/disk dulu
+    karena digest (nama object) baru diketahui setelah seluruh isi dibaca.
+    Return (digest, bytes terupload; 0 jika blob sudah ada)
+    """
+    sha = hashlib.sha256()
+    compressor = zlib.compressobj(settings.image_store_compression_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with tempfile.SpooledTemporaryFile(max_size=settings.image_store_spool_size) as spool:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+            spool.write(compressor.compress(chunk))
+        spool.write(compressor.flush())
+        
+        digest = sha.hexdigest()
+        if expected and digest != expected:
+            raise Exception(f"Digest blob tidak cocok: {digest} != {expected}")
+        if expected is None and _touch_blob(digest):
+            return digest, 0
+        
+        size = spool.tell()
+        spool.seek(0)
+        storage.client.put_object(
+            storage.bucket_name,
+            blob_key(digest),
+            spool,
+            length=size,
+            content_type='application/gzip'
+        )
+        return digest, size
+
+
+def read_manifest(image_tag: str) -> Optional[dict]:
+    try:
+        response = storage.client.get_object(storage.bucket_name, manifest_key(image_tag))
+    except S3Error as e:
+        if e.code in ('NoSuchKey', 'NoSuchObject'):
+            return None
+        raise
+    try:
+        return json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def export_image(client: docker.DockerClient, image_tag: str) -> Optional[dict]:
+    """
+    Simpan image ke MinIO dari stream docker save tanpa file tar sementara.
+    Setiap file di tar (layer, config) disimpan sebagai blob terkompresi
+    berdasarkan digest isinya sehingga layer yang sama hanya diupload sekali.
+    Return manifest, atau None jika image dibuild ulang selama export
+    """
+    image = client.images.get(image_tag)
+    existing = read_manifest(image_tag)
+    if existing and existing['image_id'] == image.id:
+        print(f"Image {image_tag} already exported")
+        return existing
+    
+    started = time.monotonic()
+    entries = []
+    uploaded = 0
+    reader = io.BufferedReader(_IterReader(client.api.get_image(image_tag)), CHUNK_SIZE)
+    with tarfile.open(fileobj=reader, mode='r|') as tar:
+        for member in tar:
+            entry = {'name': member.name, 'mode': member.mode, 'mtime': member.mtime}
+            if member.isdir():
+                entry['type'] = 'dir'
+            elif member.issym():
+                entry.update(type='symlink', target=member.linkname)
+            elif member.isfile():
+                digest = _known_digest(member.name)
+                # Blob OCI yang sudah ada tidak perlu dibaca sama sekali
+                if digest is None or not _touch_blob(digest):
+                    digest, size = _upload_blob(tar.extractfile(member), digest)
+                    uploaded += size
+                entry.update(type='file', digest=digest, size=member.size)
+            else:
+                raise Exception(f"Entri tar tidak didukung di image {image_tag}: {member.name}")
+            entries.append(entry)
+    
+    # Proyek bisa dihapus (image lokal lalu manifest) atau dibuild ulang selama
+    # export; manifest hanya ditulis jika image yang sama masih ada, selain itu
+    # manifest akan menghidupkan lagi export proyek yang sudah dihapus.
+    # ImageNotFound diteruskan ke pemanggil
+    if client.images.get(image_tag).id != image.id:
+        print(f"Image {image_tag} was rebuilt during export, skipping manifest")
+        return None
+    
+    manifest = {
+        'image_tag': image_tag,
+        'image_id': image.id,
+        'diff_ids': image.attrs['RootFS']['Layers'],
+        'entries': entries,
+        'exported_at': time.time(),
+    }
+    data = json.dumps(manifest).encode()
+    storage.client.put_object(
+        storage.bucket_name,
+        manifest_key(image_tag),
+        io.BytesIO(data),
+        length=len(data),
+        content_type='application/json'
+    )
+    
+    pipe = redis_client.pipeline()
+    pipe.hincrby(STATS_KEY, "exports", 1)
+    pipe.hincrby(STATS_KEY, "exported_bytes", uploaded)
+    pipe.execute()
+    print(f"Exported image {image_tag} in {time.monotonic() - started:.1f}s ({uploaded} bytes uploaded)")
+    return manifest
+
+
+def chain_ids(diff_ids: List[str]) -> List[str]:
+    """
+    Chain ID tiap layer (identitas layer di layer store Docker)
+    """
+    chains = []
+    for diff_id in diff_ids:
+        if chains:
+            diff_id = 'sha256:' + hashlib.sha256(f"{chains[-1]} {diff_id}".encode()).hexdigest()
+        chains.append(diff_id)
+    return chains
+
+
+def local_chain_ids(client: docker.DockerClient) -> Set[str]:
+    """
+    Chain ID semua layer yang sudah ada di host
+    """
+    chains = set()
+    for summary in client.api.images():
+        try:
+            layers = client.api.inspect_image(summary['Id'])['RootFS'].get('Layers') or []
+        except docker.errors.ImageNotFound:
+            continue
+        chains.update(chain_ids(layers))
+    return chains
+
+
+def _iter_blob(digest: str) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    response = storage.client.get_object(storage.bucket_name, blob_key(digest))
+    try:
+        for chunk in response.stream(CHUNK_SIZE):
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        yield decompressor.flush()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def iter_image_tar(manifest: dict, skip: Set[str]) -> Iterator[bytes]:
+    """
+    Susun ulang tar docker save dari blob di MinIO, di-stream per chunk.
+    Blob layer yang ada di skip dilewati: docker load tidak membuka file
+    layer yang chain ID-nya sudah ada di host
+    """
+    for entry in manifest['entries']:
+        info = tarfile.TarInfo(entry['name'])
+        info.mode = entry['mode']
+        info.mtime = entry['mtime']
+        if entry['type'] == 'dir':
+            info.type = tarfile.DIRTYPE
+            yield info.tobuf()
+        elif entry['type'] == 'symlink':
+            info.type = tarfile.SYMTYPE
+            info.linkname = entry['target']
+            yield info.tobuf()
+        elif entry['digest'] not in skip:
+            info.size = entry['size']
+            yield info.tobuf()
+            written = 0
+            for chunk in _iter_blob(entry['digest']):
+                written += len(chunk)
+                yield chunk
+            if written != entry['size']:
+                raise Exception(f"Ukuran blob {entry['digest']} tidak cocok dengan manifest")
+            if written % TAR_BLOCK:
+                yield b'\0' * (TAR_BLOCK - written % TAR_BLOCK)
+    yield b'\0' * (2 * TAR_BLOCK)
+
+
+def load_image(client: docker.DockerClient, image_tag: str) -> bool:
+    """
+    Muat image yang sudah diekspor ke host. Jika image (ID yang sama) sudah
+    ada cukup di-tag ulang; layer yang sudah ada di host tidak diunduh.
+    Return False jika image belum pernah diekspor
+    """
+    manifest = read_manifest(image_tag)
+    if manifest is None:
+        return False
+    
+    repository, _, tag = image_tag.rpartition(':')
+    try:
+        client.images.get(manifest['image_id']).tag(repository, tag)
+        print(f"Image {image_tag} found in local cache")
+        return True
+    except docker.errors.ImageNotFound:
+        pass
+    
+    started = time.monotonic()
+    diff_ids = manifest['diff_ids']
+    chains = chain_ids(diff_ids)
+    present = local_chain_ids(client)
+    cached = {diff_id for diff_id, chain in zip(diff_ids, chains) if chain in present}
+    # Layer yang sama bisa muncul di posisi lain yang belum ada di host
+    cached -= {diff_id for diff_id, chain in zip(diff_ids, chains) if chain not in present}
+    skip = {diff_id.split(':', 1)[1] for diff_id in cached}
+    
+    try:
+        client.images.load(iter_image_tar(manifest, skip))
+    except docker.errors.ImageLoadError as e:
+        if not skip:
+            raise
+        # Daemon yang tetap membutuhkan semua layer (mis. containerd image
+        # store): ulangi dengan tar lengkap
+        print(f"Partial load of {image_tag} failed ({e}), loading all layers")
+        skip = set()
+        client.images.load(iter_image_tar(manifest, skip))
+    client.images.get(manifest['image_id']).tag(repository, tag)
+    
+    transferred = sum(entry['size'] for entry in manifest['entries'] if entry['type'] == 'file' and entry['digest'] not in skip)
+    pipe = redis_client.pipeline()
+    pipe.hincrby(STATS_KEY, "loads", 1)
+    pipe.hincrby(STATS_KEY, "loaded_bytes", transferred)
+    pipe.hincrby(STATS_KEY, "layers_skipped", len(skip))
+    pipe.execute()
+    print(f"Loaded image {image_tag} from object storage in {time.monotonic() - started:.1f}s "
+          f"({len(skip)}/{len(diff_ids)} layers cached, {transferred} bytes transferred)")
+    return True
+
+
+def delete_image(image_tag: str):
+    """
+    Hapus manifest image; blob yang tidak dipakai lagi dibuang oleh prune()
+    """
+    storage.client.remove_object(storage.bucket_name, manifest_key(image_tag))
+
+
+def prune(min_age: float = None, live_tags: Optional[Set[str]] = None) -> dict:
+    """
+    Hapus blob yang tidak direferensikan manifest mana pun. Blob yang lebih
+    muda dari min_age dilewati karena bisa milik export yang sedang berjalan
+    (export memperbarui last_modified blob lama yang dipakainya). Jika
+    live_tags diberikan, manifest image lain (proyek yang sudah dihapus,
+    misalnya ditulis export yang selesai setelah delete_image) ikut dihapus
+    """
+    min_age = settings.image_store_blob_min_age if min_age is None else min_age
+    referenced = set()
+    manifests_removed = 0
+    now = time.time()
+    for obj in storage.client.list_objects(storage.bucket_name, prefix=MANIFEST_PREFIX, recursive=True):
+        response = storage.client.get_object(storage.bucket_name, obj.object_name)
+        try:
+            manifest = json.loads(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+        # Manifest baru bisa milik proyek yang dibuat setelah live_tags dibaca
+        if live_tags is not None and manifest['image_tag'] not in live_tags and now - obj.last_modified.timestamp() >= min_age:
+            storage.client.remove_object(storage.bucket_name, obj.object_name)
+            manifests_removed += 1
+            continue
+        referenced.update(entry['digest'] for entry in manifest['entries'] if entry['type'] == 'file')
+    if manifests_removed:
+        print(f"Removed {manifests_removed} image manifests of deleted projects")
+    
+    removed = 0
+    reclaimed = 0
+    for obj in storage.client.list_objects(storage.bucket_name, prefix=BLOB_PREFIX, recursive=True):
+        digest = obj.object_name[len(BLOB_PREFIX):]
+        if digest in referenced or now - obj.last_modified.timestamp() < min_age:
+            continue
+        storage.client.remove_object(storage.bucket_name, obj.object_name)
+        removed += 1
+        reclaimed += obj.size
+    if removed:
+        print(f"Pruned {removed} unused image blobs ({reclaimed} bytes)")
+    return {'manifests_removed': manifests_removed, 'blobs_removed': removed, 'bytes_reclaimed': reclaimed}
+
+
+def get_stats() -> Dict[str, int]:
+    """
+    Counter export/load image
+    """
+    return {key.decode(): int(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
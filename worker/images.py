@@ -0,0 +1,271 @@
+import argparse
+import hashlib
+import io
+import os
+import tarfile
+import zipfile
+from typing import Dict, List
+
+import docker
+
+from build_context import read_root_files
+from config import settings
+from package_cache import (PACKAGE_CACHE_MOUNT, cached_install_command, install_command, plain_requirements,
+                           record_install_stats, enforce_budget)
+
+# Image upstream per runtime (bisa diganti lewat config)
+RUNTIME_UPSTREAM_IMAGES = {
+    'python': settings.python_base_image,
+    'nodejs': settings.nodejs_base_image,
+}
+
+# File manifest dependency per runtime, urutan menentukan hash
+DEPENDENCY_MANIFESTS = {
+    'python': ['requirements.txt'],
+    'nodejs': ['package.json', 'package-lock.json', 'npm-shrinkwrap.json'],
+}
+
+BASE_IMAGE_REPOSITORY = "ziphostbot/base"
+DEPS_IMAGE_REPOSITORY = "ziphostbot/deps"
+
+
+def build_tar_context(files: Dict[str, bytes]) -> io.BytesIO:
+    """
+    Buat build context (tar) di memori dari dict nama file -> isi
+    """
+    context = io.BytesIO()
+    with tarfile.open(fileobj=context, mode='w') as tar:
+        directories = {os.path.dirname(name) for name in files if os.path.dirname(name)}
+        for directory in sorted(directories):
+            info = tarfile.TarInfo(directory)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            tar.addfile(info)
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    context.seek(0)
+    return context
+
+
+def base_image_tag(runtime: str) -> str:
+    """
+    Tag base image warm milik platform. Versi ikut di tag sehingga menaikkan
+    base_image_version otomatis membuat image (dan image dependency) baru
+    """
+    return f"{BASE_IMAGE_REPOSITORY}:{runtime}-v{settings.base_image_version}"
+
+
+def create_base_dockerfile(runtime: str) -> str:
+    """
+    Dockerfile base image dengan toolchain build yang sudah terpasang
+    """
+    if runtime == 'python':
+        return f"""FROM {RUNTIME_UPSTREAM_IMAGES['python']}
+
+# Install system dependencies
+RUN apt-get update && apt-get install -y \\
+    gcc \\
+    && rm -rf /var/lib/apt/lists/*
+
+RUN pip install --no-cache-dir --upgrade pip wheel setuptools
+"""
+
+    return f"""FROM {RUNTIME_UPSTREAM_IMAGES['nodejs']}
+
+# Toolchain untuk native module (node-gyp)
+RUN apk add --no-cache python3 make g++
+"""
+
+
+def ensure_base_image(client: docker.DockerClient, runtime: str, force: bool = False) -> str:
+    """
+    Pastikan base image warm untuk runtime ada, build jika belum ada
+    (atau selalu build ulang jika force=True)
+    """
+    tag = base_image_tag(runtime)
+    
+    if not force:
+        try:
+            client.images.get(tag)
+            return tag
+        except docker.errors.ImageNotFound:
+            pass
+    
+    print(f"Building base image {tag}...")
+    try:
+        client.images.build(
+            fileobj=build_tar_context({'Dockerfile': create_base_dockerfile(runtime).encode()}),
+            custom_context=True,
+            tag=tag,
+            labels={'ziphostbot.role': 'base', 'ziphostbot.runtime': runtime},
+            pull=force,
+            rm=True,
+            forcerm=True
+        )
+    except docker.errors.BuildError as e:
+        raise Exception(f"Base image build failed ({runtime}):\n" + _build_log_text(e.build_log))
+    
+    return tag
+
+
+def ensure_base_images(client: docker.DockerClient, force: bool = False) -> List[str]:
+    """
+    Pastikan base image semua runtime tersedia
+    """
+    return [ensure_base_image(client, runtime, force) for runtime in RUNTIME_UPSTREAM_IMAGES]
+
+
+def read_dependency_manifests(zip_file: zipfile.ZipFile, runtime: str) -> Dict[str, bytes]:
+    """
+    Baca file manifest dependency yang ada di root arsip proyek
+    """
+    return read_root_files(zip_file, DEPENDENCY_MANIFESTS[runtime])
+
+
+def dependency_hash(runtime: str, manifests: Dict[str, bytes], base_image_id: str) -> str:
+    """
+    Hash dari runtime, base image dan isi manifest dependency. Proyek dengan
+    hash yang sama (juga milik user lain) bisa memakai image dependency yang
+    sama. Base image dihitung dari ID-nya, bukan tag, sehingga build ulang
+    base image dengan versi yang sama (patch keamanan) membuat image
+    dependency baru
+    """
+    digest = hashlib.sha256()
+    digest.update(runtime.encode())
+    digest.update(b'\0' + base_image_id.encode())
+    for name in DEPENDENCY_MANIFESTS[runtime]:
+        if name in manifests:
+            digest.update(b'\0' + name.encode() + b'\0')
+            digest.update(manifests[name])
+    return digest.hexdigest()
+
+
+def deps_image_tag(runtime: str, deps_hash: str) -> str:
+    return f"{DEPS_IMAGE_REPOSITORY}:{runtime}-{deps_hash[:32]}"
+
+
+# Instruksi yang diterapkan saat container install di-commit menjadi image
+DEPS_IMAGE_CHANGES = {
+    'python': ['WORKDIR /app', 'CMD ["python3"]'],
+    'nodejs': ['WORKDIR /app', 'CMD ["node"]'],
+}
+
+
+def _build_log_text(build_log: List[dict]) -> str:
+    return ''.join(log['stream'] for log in build_log if 'stream' in log)
+
+
+def _run_install(client: docker.DockerClient, image: str, command: str, manifests: Dict[str, bytes] = None,
+                 cache: bool = False) -> tuple:
+    """
+    Jalankan satu tahap install di container sementara. Return (container,
+    exit code, log); caller menghapus container
+    """
+    volumes = {settings.package_cache_volume: {'bind': PACKAGE_CACHE_MOUNT, 'mode': 'rw'}} if cache else {}
+    container = client.containers.create(
+        image,
+        command=['sh', '-c', command],
+        working_dir='/app',
+        volumes=volumes,
+        labels={'ziphostbot.role': 'deps-install'}
+    )
+    try:
+        if manifests is not None:
+            container.put_archive('/', build_tar_context({f"app/{name}": data for name, data in manifests.items()}))
+        container.start()
+        result = container.wait(timeout=settings.dependency_install_timeout)
+        return container, result.get('StatusCode'), container.logs().decode(errors='replace')
+    except Exception:
+        container.remove(force=True)
+        raise
+
+
+def install_dependencies(client: docker.DockerClient, base_image: str, runtime: str, manifests: Dict[str, bytes], tag: str):
+    """
+    Install dependency di container sementara lalu commit hasilnya menjadi
+    image dependency. Builder klasik tidak mendukung cache mount, jadi
+    install tidak lewat docker build.
+    
+    Image dipakai bersama semua user, jadi kode paket (setup.py, script npm)
+    tidak pernah berjalan di container yang me-mount package cache bersama:
+    tahap pertama memakai cache tanpa menjalankan kode paket (wheel saja /
+    --ignore-scripts), tahap kedua menjalankan kode paket tanpa cache
+    """
+    containers = []
+    try:
+        if runtime == 'python':
+            status = None
+            if plain_requirements(manifests.get('requirements.txt', b'')):
+                container, status, logs = _run_install(client, base_image, cached_install_command(runtime), manifests, cache=True)
+                containers.append(container)
+                record_install_stats(runtime, logs)
+            if status != 0:
+                # Ada paket tanpa wheel (atau opsi pip di requirements.txt):
+                # install dari awal tanpa cache
+                print("Wheel-only install not possible, installing without package cache")
+                container, status, logs = _run_install(client, base_image, install_command(runtime), manifests)
+                containers.append(container)
+        else:
+            container, status, logs = _run_install(client, base_image, cached_install_command(runtime), manifests, cache=True)
+            containers.append(container)
+            record_install_stats(runtime, logs)
+            if status == 0:
+                # Script install paket dijalankan di container baru tanpa cache
+                fetched = container.commit()
+                container, status, logs = _run_install(client, fetched.id, install_command(runtime))
+                containers.append(container)
+        
+        if status != 0:
+            raise Exception("Dependency install failed:\n" + logs)
+        
+        repository, image_tag = tag.rsplit(':', 1)
+        container.commit(
+            repository=repository,
+            tag=image_tag,
+            changes=DEPS_IMAGE_CHANGES[runtime] + [
+                'LABEL ziphostbot.role=deps',
+                f'LABEL ziphostbot.runtime={runtime}'
+            ]
+        )
+    finally:
+        for container in containers:
+            container.remove(force=True)
+    
+    enforce_budget()
+
+
+def ensure_deps_image(client: docker.DockerClient, zip_file: zipfile.ZipFile, runtime: str) -> str:
+    """
+    Return tag image dependency untuk proyek ini, build dulu jika belum ada
+    """
+    base_image = ensure_base_image(client, runtime)
+    base_image_id = client.images.get(base_image).id
+    
+    manifests = read_dependency_manifests(zip_file, runtime)
+    tag = deps_image_tag(runtime, dependency_hash(runtime, manifests, base_image_id))
+    
+    try:
+        client.images.get(tag)
+        print(f"Dependency image cache hit: {tag}")
+        return tag
+    except docker.errors.ImageNotFound:
+        print(f"Dependency image cache miss: {tag}")
+    
+    install_dependencies(client, base_image_id, runtime, manifests, tag)
+    
+    return tag
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Kelola base image runtime ZipHostBot")
+    parser.add_argument('command', choices=['rebuild-base'])
+    parser.add_argument('--runtime', choices=list(RUNTIME_UPSTREAM_IMAGES), help="Hanya runtime ini")
+    parser.add_argument('--if-missing', action='store_true', help="Lewati image yang sudah ada")
+    args = parser.parse_args()
+    
+    client = docker.from_env()
+    runtimes = [args.runtime] if args.runtime else list(RUNTIME_UPSTREAM_IMAGES)
+    for runtime in runtimes:
+        print(ensure_base_image(client, runtime, force=not args.if_missing))
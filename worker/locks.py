@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+
+import redis
+
+from config import settings
+
+# Sama dengan key yang dipakai backend (backend/dispatch.py)
+DISPATCH_KEY = "ziphostbot:dispatch:{project_id}:{action}"
+LOCK_KEY = "ziphostbot:lock:project:{project_id}"
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+class ProjectLocked(Exception):
+    """
+    Dilempar ketika lock proyek dipegang task lain terlalu lama
+    """
+    pass
+
+
+def claim_dispatch(project_id: str, action: str, task_id: str, ttl: int) -> bool:
+    """
+    Tandai aksi proyek sedang dijalankan task_id. Return False jika aksi yang
+    sama sudah dijalankan task lain (request duplikat digabung ke task itu)
+    """
+    key = DISPATCH_KEY.format(project_id=project_id, action=action)
+    try:
+        if redis_client.set(key, task_id, nx=True, ex=ttl):
+            return True
+        # Key milik task ini sendiri (diklaim backend saat kirim, atau retry)
+        existing = redis_client.get(key)
+        return existing is not None and existing.decode() == task_id
+    except redis.RedisError as e:
+        # Tanpa Redis dedup tidak bisa dilakukan; lock proyek tetap menjaga container
+        print(f"Error claiming dispatch {key}: {e}")
+        return True
+
+
+def clear_dispatch(project_id: str, action: str):
+    """
+    Hapus tanda aksi setelah task selesai (sukses atau gagal permanen)
+    """
+    key = DISPATCH_KEY.format(project_id=project_id, action=action)
+    try:
+        redis_client.delete(key)
+    except redis.RedisError as e:
+        # Key tetap kedaluwarsa lewat TTL
+        print(f"Error clearing dispatch {key}: {e}")
+
+
+def locked_projects(project_ids) -> set:
+    """
+    Proyek yang lock-nya sedang dipegang task (container sedang diubah)
+    """
+    project_ids = list(project_ids)
+    if not project_ids:
+        return set()
+    pipe = redis_client.pipeline()
+    for project_id in project_ids:
+        pipe.exists(LOCK_KEY.format(project_id=project_id))
+    return {project_id for project_id, exists in zip(project_ids, pipe.execute()) if exists}
+
+
+@contextmanager
+def project_lock(project_id: str, wait: float = None):
+    """
+    Lock per proyek untuk operasi container (run, start, stop) agar tidak
+    berjalan bersamaan untuk proyek yang sama. wait=0 untuk tidak menunggu
+    """
+    lock = redis_client.lock(
+        LOCK_KEY.format(project_id=project_id),
+        timeout=settings.project_lock_timeout,
+        blocking_timeout=settings.project_lock_wait if wait is None else wait
+    )
+    if not lock.acquire():
+        raise ProjectLocked(f"Project {project_id} sedang diproses task lain")
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            # Lock sudah kedaluwarsa (operasi lebih lama dari timeout)
+            print(f"Lock of project {project_id} expired before release")
@@ -0,0 +1,145 @@
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import docker
+import redis
+import urllib3
+from minio.error import MinioException
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, multiprocess, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+from config import settings
+
+# Worker prefork: setiap child menulis metrik ke file di direktori ini dan
+# exporter di proses utama menggabungkannya (mode multiprocess)
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+# Label dibatasi nilai yang jumlahnya tetap (nama tahap/task/kelas error),
+# tidak pernah ID proyek atau user
+STAGE_SECONDS = Histogram(
+    'ziphostbot_pipeline_stage_duration_seconds',
+    'Durasi tahap pipeline proyek',
+    ['stage', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+)
+TASK_SECONDS = Histogram(
+    'ziphostbot_task_duration_seconds',
+    'Durasi task Celery',
+    ['task', 'state'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+)
+DOCKER_ERRORS = Counter('ziphostbot_docker_errors_total', 'Error dari Docker daemon', ['kind'])
+MINIO_ERRORS = Counter('ziphostbot_minio_errors_total', 'Error dari MinIO', ['kind'])
+
+# Queue Celery yang dipakai worker (lihat task_routes di tasks.py)
+QUEUES = ['celery', 'control', 'scan', 'build', 'run']
+
+_task_started: Dict[str, float] = {}
+
+
+def record_error(error: BaseException):
+    """
+    Hitung error Docker/MinIO, termasuk yang dibungkus Exception lain
+    (raise di dalam except). Error yang sama hanya dihitung sekali walau
+    melewati beberapa handler
+    """
+    if getattr(error, '_metrics_recorded', False):
+        return
+    current, seen = error, set()
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if isinstance(current, docker.errors.BuildError):
+            # Gagal build karena isi proyek user, bukan gangguan daemon
+            break
+        if isinstance(current, docker.errors.DockerException):
+            DOCKER_ERRORS.labels(type(current).__name__).inc()
+            break
+        if isinstance(current, (MinioException, urllib3.exceptions.HTTPError)):
+            # S3Error: kode error S3 (NoSuchKey, AccessDenied, ...)
+            MINIO_ERRORS.labels(getattr(current, 'code', None) or type(current).__name__).inc()
+            break
+        current = current.__cause__ or current.__context__
+    try:
+        error._metrics_recorded = True
+    except AttributeError:
+        pass
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Ukur durasi satu tahap pipeline (download, scan, extract, build, ...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        STAGE_SECONDS.labels(name, 'error').observe(time.perf_counter() - started)
+        record_error(e)
+        raise
+    STAGE_SECONDS.labels(name, 'ok').observe(time.perf_counter() - started)
+
+
+def task_started(task_id: str):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_finished(task_id: str, task_name: str, state: str):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task_name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+class QueueDepthCollector:
+    """
+    Kedalaman queue Celery dan antrean scheduler build, dibaca dari Redis
+    saat di-scrape (bukan setiap task)
+    """
+    
+    def __init__(self, redis_client: redis.Redis, scheduler):
+        self.redis = redis_client
+        self.scheduler = scheduler
+    
+    def collect(self):
+        depth = GaugeMetricFamily('ziphostbot_queue_depth', 'Jumlah task yang menunggu di queue Celery', labels=['queue'])
+        pipe = self.redis.pipeline()
+        for queue in QUEUES:
+            pipe.llen(queue)
+        for queue, length in zip(QUEUES, pipe.execute()):
+            depth.add_metric([queue], length)
+        yield depth
+        
+        stats = self.scheduler.get_stats()
+        yield GaugeMetricFamily('ziphostbot_build_queue_depth', 'Build yang menunggu slot di scheduler fair-share',
+                                value=stats['queue_depth'])
+        yield GaugeMetricFamily('ziphostbot_builds_running', 'Build yang sedang berjalan', value=stats['running'])
+
+
+def clear_multiproc_dir():
+    """
+    Buang file metrik dari proses worker sebelumnya (panggil sebelum pool
+    worker dibuat)
+    """
+    if MULTIPROC_DIR:
+        shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def start_exporter(redis_client: redis.Redis, scheduler, port: int = None):
+    """
+    Jalankan endpoint /metrics worker di thread latar proses utama
+    """
+    port = port or settings.metrics_port
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(QueueDepthCollector(redis_client, scheduler))
+    start_http_server(port, registry=registry)
+    print(f"Metrics exporter listening on :{port}")
@@ -0,0 +1,145 @@
+import os
+import re
+import time
+from typing import Dict, Tuple
+
+import redis
+
+from config import settings
+
+# Lokasi volume cache di dalam container install dependency
+PACKAGE_CACHE_MOUNT = "/cache"
+
+STATS_KEY = "ziphostbot:package_cache:stats"
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+# Pola log installer untuk menghitung paket yang diambil dari cache
+_PIP_HIT = re.compile(r'^\s*Using cached ', re.MULTILINE)
+_PIP_MISS = re.compile(r'^\s*Downloading ', re.MULTILINE)
+_NPM_HIT = re.compile(r'\((cache hit|cache revalidated)\)')
+_NPM_MISS = re.compile(r'\((cache miss|cache stale)\)')
+# Baris requirements.txt yang hanya berisi nama paket, versi dan marker
+# (tanpa opsi pip, URL atau path lokal)
+_PLAIN_REQUIREMENT = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*(\[[A-Za-z0-9._,\s-]*\])?\s*([<>=!~][^@#]*)?(;[^@#]*)?$')
+
+
+def cached_install_command(runtime: str) -> str:
+    """
+    Perintah install yang memakai cache bersama tanpa menjalankan kode
+    paket: pip hanya memasang wheel, npm tanpa lifecycle script
+    """
+    if runtime == 'python':
+        return f"pip install --progress-bar off --only-binary=:all: --cache-dir {PACKAGE_CACHE_MOUNT}/pip -r requirements.txt"
+    return f"npm install --ignore-scripts --cache {PACKAGE_CACHE_MOUNT}/npm --prefer-offline --loglevel=http"
+
+
+def install_command(runtime: str) -> str:
+    """
+    Perintah install yang boleh menjalankan kode paket (setup.py, script
+    npm), tanpa cache bersama. Untuk npm hanya menjalankan script paket yang
+    sudah dipasang cached_install_command
+    """
+    if runtime == 'python':
+        return "pip install --progress-bar off --no-cache-dir -r requirements.txt"
+    return "npm rebuild"
+
+
+def plain_requirements(data: bytes) -> bool:
+    """
+    True jika requirements.txt hanya berisi requirement biasa dari index,
+    sehingga opsi pip di file (mis. --no-binary, index lain) tidak bisa
+    membuat cached_install_command membangun paket dari source
+    """
+    for line in data.decode(errors='replace').splitlines():
+        line = line.split(' #', 1)[0].strip()
+        if line and not line.startswith('#') and (' -' in line or not _PLAIN_REQUIREMENT.match(line)):
+            return False
+    return True
+
+
+def parse_install_log(runtime: str, log: str) -> Tuple[int, int]:
+    """
+    Hitung jumlah paket yang diambil dari cache (hit) dan yang diunduh (miss)
+    """
+    if runtime == 'python':
+        return len(_PIP_HIT.findall(log)), len(_PIP_MISS.findall(log))
+    return len(_NPM_HIT.findall(log)), len(_NPM_MISS.findall(log))
+
+
+def record_install_stats(runtime: str, log: str):
+    """
+    Simpan counter hit/miss ke Redis agar bisa dimonitor dari semua worker
+    """
+    hits, misses = parse_install_log(runtime, log)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(STATS_KEY, f"{runtime}_hits", hits)
+        pipe.hincrby(STATS_KEY, f"{runtime}_misses", misses)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error recording package cache stats: {e}")
+    print(f"Package cache ({runtime}): {hits} hits, {misses} misses")
+
+
+def get_stats() -> Dict[str, int]:
+    """
+    Ambil counter package cache
+    """
+    return {key.decode(): int(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
+
+
+def enforce_budget(cache_dir: str = None, max_bytes: int = None) -> Tuple[int, int]:
+    """
+    Jaga ukuran cache tetap di bawah batas dengan menghapus file yang paling
+    lama tidak dipakai (LRU berdasarkan atime/mtime). Return (jumlah file, bytes)
+    yang dihapus
+    """
+    cache_dir = cache_dir or settings.package_cache_dir
+    max_bytes = max_bytes or settings.package_cache_max_bytes
+    
+    if not os.path.isdir(cache_dir):
+        print(f"Package cache directory {cache_dir} not mounted, skipping eviction")
+        return 0, 0
+    
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+            total += stat.st_size
+    
+    if total <= max_bytes:
+        return 0, 0
+    
+    # Hapus sampai 90% dari batas agar eviction tidak terjadi di setiap build
+    target = int(max_bytes * 0.9)
+    evicted_files = 0
+    evicted_bytes = 0
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted_files += 1
+        evicted_bytes += size
+    
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(STATS_KEY, "evicted_files", evicted_files)
+        pipe.hincrby(STATS_KEY, "evicted_bytes", evicted_bytes)
+        pipe.hset(STATS_KEY, "last_eviction_at", int(time.time()))
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error recording package cache stats: {e}")
+    
+    print(f"Package cache eviction: {evicted_files} files, {evicted_bytes} bytes")
+    return evicted_files, evicted_bytes
@@ -0,0 +1,253 @@
+import re
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional
+
+import docker
+import redis
+
+from config import settings
+from database import ProjectStatus, bulk_transition, container_projects
+from docker_hosts import host_pool, PROJECT_LABEL
+from locks import locked_projects
+import metrics
+
+# Waktu (detik) event Docker terakhir yang sudah diproses, per host
+CURSOR_KEY = "ziphostbot:reconcile:cursor:{host}"
+LOCK_KEY = "ziphostbot:lock:reconcile"
+STATS_KEY = "ziphostbot:reconcile:stats"
+
+# Event container yang mengubah keadaan bot
+EVENTS = ['start', 'die', 'oom', 'destroy']
+ALIVE_STATES = {'running', 'restarting', 'paused'}
+# Daemon Docker hanya menyimpan event terakhir sebanyak ini untuk since
+EVENTS_BUFFER_SIZE = 256
+
+_EXIT_CODE = re.compile(r'Exited \((\d+)\)')
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+class ContainerState(NamedTuple):
+    container_id: Optional[str]  # None jika container sudah dihapus
+    alive: bool
+    exit_code: Optional[int] = None
+    oom_killed: bool = False
+    
+    def describe(self) -> str:
+        if self.container_id is None:
+            return "Container bot hilang dari Docker host"
+        if self.oom_killed:
+            return "Container bot dihentikan karena kehabisan memori (OOM)"
+        if self.exit_code is not None:
+            return f"Container bot berhenti (exit code {self.exit_code})"
+        return "Container bot tidak berjalan"
+
+
+def _project_id(labels: dict) -> Optional[str]:
+    """
+    ID proyek dari label container; label yang bukan UUID (mis. container
+    benchmark) diabaikan
+    """
+    try:
+        return str(uuid.UUID(labels.get(PROJECT_LABEL) or ''))
+    except ValueError:
+        return None
+
+
+def list_states(client: docker.DockerClient) -> Dict[str, ContainerState]:
+    """
+    Keadaan semua container bot di host dengan satu request list container
+    """
+    states = {}
+    for container in client.api.containers(all=True, filters={'label': PROJECT_LABEL}):
+        project_id = _project_id(container.get('Labels') or {})
+        if not project_id:
+            continue
+        match = _EXIT_CODE.search(container.get('Status') or '')
+        state = ContainerState(container['Id'], container.get('State') in ALIVE_STATES,
+                               int(match.group(1)) if match else None)
+        # Lebih dari satu container untuk proyek yang sama: yang hidup menang
+        if project_id not in states or state.alive:
+            states[project_id] = state
+    return states
+
+
+def event_states(client: docker.DockerClient, since: float, until: float) -> Optional[Dict[str, ContainerState]]:
+    """
+    Keadaan akhir container bot yang berubah antara since dan until, dari
+    event Docker. Biayanya sebanding dengan jumlah perubahan. Return None
+    jika buffer event daemon mungkin sudah terlewati sehingga ada perubahan
+    yang hilang
+    """
+    states = {}
+    # Tanpa filter agar jumlah event bisa dibandingkan dengan ukuran buffer
+    # daemon (buffer berisi event semua jenis); difilter di sini
+    events = list(client.events(since=int(since), until=int(until), decode=True))
+    if len(events) >= EVENTS_BUFFER_SIZE:
+        return None
+    for event in events:
+        action = event.get('Action') or event.get('status')
+        if event.get('Type', 'container') != 'container' or action not in EVENTS:
+            continue
+        attributes = event.get('Actor', {}).get('Attributes') or {}
+        project_id = _project_id(attributes)
+        if not project_id:
+            continue
+        container_id = event['Actor']['ID']
+        previous = states.get(project_id)
+        if action == 'start':
+            states[project_id] = ContainerState(container_id, True)
+        elif action == 'oom':
+            states[project_id] = ContainerState(container_id, False, oom_killed=True)
+        elif action == 'die':
+            oom = previous is not None and previous.container_id == container_id and previous.oom_killed
+            states[project_id] = ContainerState(container_id, False, int(attributes.get('exitCode') or 0), oom)
+        elif action == 'destroy':
+            # Container lama yang dihapus setelah container baru dibuat tidak
+            # menghapus keadaan container baru
+            if previous is None or previous.container_id == container_id:
+                states[project_id] = ContainerState(None, False)
+    return states
+
+
+def plan(host: str, states: Dict[str, ContainerState], projects: list, full: bool) -> dict:
+    """
+    Bandingkan keadaan container dengan tabel projects. Return perubahan
+    yang perlu diterapkan per jenis
+    """
+    failed, relinked, recovered = [], [], []
+    known = set()
+    for project_id, status, container_id, docker_host in projects:
+        project_id = str(project_id)
+        known.add(project_id)
+        if docker_host != host:
+            continue
+        state = states.get(project_id)
+        if state is None:
+            # Pass penuh melihat semua container; pass event hanya proyek yang berubah
+            if not full or status != ProjectStatus.RUNNING:
+                continue
+            state = ContainerState(None, False)
+        
+        if status == ProjectStatus.RUNNING:
+            if state.alive and state.container_id != container_id:
+                relinked.append({'id': project_id, 'container_id': state.container_id})
+            elif not state.alive and state.container_id in (None, container_id):
+                failed.append({'id': project_id, 'container_id': container_id, 'last_error_log': state.describe()})
+        elif status == ProjectStatus.FAILED and state.alive and state.container_id == container_id:
+            # Container yang sama hidup lagi (restart policy) setelah ditandai FAILED
+            recovered.append({'id': project_id, 'container_id': container_id})
+    
+    orphans = [state.container_id for project_id, state in states.items()
+               if project_id not in known and state.container_id is not None]
+    return {'failed': failed, 'relinked': relinked, 'recovered': recovered, 'orphans': orphans}
+
+
+def apply(host: str, changes: dict) -> Dict[str, int]:
+    """
+    Terapkan perubahan dengan UPDATE bersyarat per jenis (status dan
+    container yang diamati harus masih sama) dan hapus container yatim
+    """
+    failed = bulk_transition(changes['failed'], ProjectStatus.FAILED, ProjectStatus.RUNNING,
+                             match=('container_id',), columns=('last_error_log',))
+    relinked = bulk_transition(changes['relinked'], ProjectStatus.RUNNING, ProjectStatus.RUNNING,
+                               columns=('container_id',))
+    recovered = bulk_transition(changes['recovered'], ProjectStatus.RUNNING, ProjectStatus.FAILED,
+                                match=('container_id',))
+    for project_id in failed:
+        print(f"Project {project_id} marked FAILED: container on {host} is not running")
+    
+    # Container proyek yang sudah dihapus (dibuat hanya untuk proyek yang ada)
+    client = host_pool.client(host)
+    orphans = 0
+    for container_id in changes['orphans']:
+        try:
+            client.api.remove_container(container_id, force=True)
+            orphans += 1
+        except docker.errors.NotFound:
+            pass
+    return {'failed': len(failed), 'relinked': len(relinked), 'recovered': len(recovered), 'orphans_removed': orphans}
+
+
+def reconcile_host(host: str, full: bool) -> dict:
+    """
+    Satu pass untuk satu host. Pass penuh: list semua container + satu
+    query. Pass event: hanya proyek yang container-nya berubah sejak cursor;
+    tanpa perubahan tidak ada query database sama sekali. Jika event sejak
+    cursor tidak lengkap lagi di daemon, pass event diganti pass penuh
+    """
+    client = host_pool.client(host)
+    cursor_key = CURSOR_KEY.format(host=host)
+    until = time.time()
+    cursor = redis_client.get(cursor_key)
+    
+    states = None
+    if not full and cursor is not None:
+        # Tumpang tindih sedikit untuk selisih jam host; pass idempoten
+        since = float(cursor) - settings.reconcile_event_overlap
+        states = event_states(client, since, until)
+        if states is None:
+            print(f"Docker event buffer on {host} overflowed since last pass, running full pass")
+    
+    if states is None:
+        full = True
+        states = list_states(client)
+        projects = container_projects([ProjectStatus.RUNNING, ProjectStatus.FAILED], list(states))
+    else:
+        projects = container_projects([], list(states)) if states else []
+    
+    # Proyek yang container-nya sedang diubah task diperiksa di pass berikutnya
+    busy = locked_projects(str(row[0]) for row in projects)
+    projects = [row for row in projects if str(row[0]) not in busy]
+    changes = plan(host, {project_id: state for project_id, state in states.items() if project_id not in busy}, projects, full)
+    
+    report = apply(host, changes)
+    redis_client.set(cursor_key, until)
+    report.update(full=full, containers=len(states), projects=len(projects), skipped_locked=len(busy))
+    return report
+
+
+def reconcile(full: bool = False) -> Dict[str, dict]:
+    """
+    Sinkronkan status proyek dengan keadaan container di semua host. Hanya
+    satu pass yang berjalan bersamaan
+    """
+    lock = redis_client.lock(LOCK_KEY, timeout=settings.reconcile_lock_timeout, blocking_timeout=0)
+    if not lock.acquire():
+        print("Reconcile pass already running, skipping")
+        return {}
+    
+    started = time.monotonic()
+    report = {}
+    try:
+        for host in host_pool.run_hosts:
+            try:
+                report[host] = reconcile_host(host, full)
+            except Exception as e:
+                metrics.record_error(e)
+                print(f"Error reconciling {host}: {e}")
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+    
+    changed = sum(host['failed'] + host['relinked'] + host['recovered'] + host['orphans_removed'] for host in report.values())
+    pipe = redis_client.pipeline()
+    pipe.hincrby(STATS_KEY, "full_passes" if full else "event_passes", 1)
+    pipe.hincrby(STATS_KEY, "changes", changed)
+    for key in ('failed', 'relinked', 'recovered', 'orphans_removed'):
+        pipe.hincrby(STATS_KEY, key, sum(host[key] for host in report.values()))
+    pipe.hset(STATS_KEY, "last_pass_seconds", f"{time.monotonic() - started:.3f}")
+    pipe.execute()
+    if changed:
+        print(f"Reconcile pass ({'full' if full else 'events'}) applied {changed} changes")
+    return report
+
+
+def get_stats() -> Dict[str, float]:
+    """
+    Counter reconciler
+    """
+    return {key.decode(): float(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
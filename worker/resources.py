@@ -0,0 +1,49 @@
+from typing import NamedTuple, Optional
+
+import docker
+
+from config import settings
+
+
+class ResourceProfile(NamedTuple):
+    name: str
+    memory: int  # bytes, batas keras (tanpa swap)
+    cpus: float  # kuota CPU (nano_cpus)
+    cpu_shares: int  # bobot relatif saat CPU host penuh
+    pids_limit: int
+    nofile: int  # ulimit jumlah file descriptor
+
+
+def get_profile(name: Optional[str] = None) -> ResourceProfile:
+    """
+    Profil resource proyek; None atau nama yang tidak dikenal memakai
+    default_resource_profile
+    """
+    name = name or settings.default_resource_profile
+    values = settings.resource_profiles.get(name)
+    if values is None:
+        print(f"Unknown resource profile {name}, using {settings.default_resource_profile}")
+        name = settings.default_resource_profile
+        values = settings.resource_profiles[name]
+    return ResourceProfile(
+        name=name,
+        memory=int(values['memory']),
+        cpus=float(values['cpus']),
+        cpu_shares=int(values['cpu_shares']),
+        pids_limit=int(values['pids_limit']),
+        nofile=int(values['nofile'])
+    )
+
+
+def container_limits(profile: ResourceProfile) -> dict:
+    """
+    Argumen containers.run untuk membatasi resource container bot
+    """
+    return {
+        'mem_limit': profile.memory,
+        'memswap_limit': profile.memory,
+        'nano_cpus': int(profile.cpus * 1e9),
+        'cpu_shares': profile.cpu_shares,
+        'pids_limit': profile.pids_limit,
+        'ulimits': [docker.types.Ulimit(name='nofile', soft=profile.nofile, hard=profile.nofile)],
+    }
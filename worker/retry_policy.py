@@ -0,0 +1,51 @@
+import random
+
+import docker
+import requests
+import urllib3
+from minio.error import S3Error
+
+from config import settings
+from locks import ProjectLocked
+
+# Kode error MinIO/S3 yang biasanya hilang sendiri jika dicoba lagi
+TRANSIENT_S3_CODES = {
+    'InternalError',
+    'RequestTimeout',
+    'ServiceUnavailable',
+    'SlowDown',
+    'XMinioServerNotInitialized',
+}
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Apakah error (atau penyebabnya) gangguan sementara MinIO/Docker yang
+    layak dicoba ulang, bukan kesalahan proyek
+    """
+    while error is not None:
+        if isinstance(error, ProjectLocked):
+            return True
+        if isinstance(error, (docker.errors.NotFound, docker.errors.BuildError)):
+            return False
+        if isinstance(error, docker.errors.APIError):
+            return error.is_server_error()
+        if isinstance(error, S3Error):
+            return error.code in TRANSIENT_S3_CODES
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              urllib3.exceptions.HTTPError, ConnectionError, TimeoutError)):
+            return True
+        error = error.__cause__
+    return False
+
+
+def retry_countdown(retries: int) -> float:
+    """
+    Exponential backoff dengan batas atas dan jitter
+    """
+    countdown = min(settings.task_retry_backoff_max, settings.task_retry_backoff * (2 ** retries))
+    return countdown * random.uniform(0.5, 1.0)
+
+
+def should_retry(task, error: BaseException) -> bool:
+    return is_transient_error(error) and task.request.retries < settings.task_max_retries
@@ -0,0 +1,77 @@
+import json
+from typing import Dict, Optional
+
+import redis
+
+from config import settings
+from scanner import ScanResult
+
+VERDICT_KEY = "ziphostbot:scan_verdict:{signature_version}:{digest}"
+STATS_KEY = "ziphostbot:scan_cache:stats"
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+def _key(digest: str, signature_version: str) -> str:
+    # Versi signature ikut di key: update database ClamAV otomatis membuat
+    # semua verdict lama tidak terpakai (dan kedaluwarsa lewat TTL)
+    return VERDICT_KEY.format(signature_version=signature_version, digest=digest)
+
+
+def get_verdict(digest: str, signature_version: str) -> Optional[ScanResult]:
+    """
+    Ambil verdict scan untuk isi arsip (sha256) dan versi signature tertentu
+    """
+    try:
+        data = redis_client.get(_key(digest, signature_version))
+    except redis.RedisError as e:
+        print(f"Error reading scan verdict cache: {e}")
+        return None
+    if data is None:
+        return None
+    verdict = json.loads(data)
+    return ScanResult(verdict['clean'], verdict['signature'], verdict['elapsed'])
+
+
+def set_verdict(digest: str, signature_version: str, result: ScanResult):
+    """
+    Simpan verdict scan
+    """
+    data = json.dumps({'clean': result.clean, 'signature': result.signature, 'elapsed': result.elapsed})
+    try:
+        redis_client.set(_key(digest, signature_version), data, ex=settings.scan_verdict_cache_ttl)
+    except redis.RedisError as e:
+        print(f"Error writing scan verdict cache: {e}")
+
+
+def record_hit(saved_seconds: float):
+    """
+    Catat cache hit beserta waktu scan yang dihemat (durasi scan aslinya)
+    """
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(STATS_KEY, "hits", 1)
+        pipe.hincrbyfloat(STATS_KEY, "saved_seconds", saved_seconds)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error recording scan cache stats: {e}")
+
+
+def record_miss(scan_seconds: float):
+    """
+    Catat cache miss beserta waktu yang dipakai untuk scan
+    """
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(STATS_KEY, "misses", 1)
+        pipe.hincrbyfloat(STATS_KEY, "scan_seconds", scan_seconds)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error recording scan cache stats: {e}")
+
+
+def get_stats() -> Dict[str, float]:
+    """
+    Ambil counter scan verdict cache
+    """
+    return {key.decode(): float(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
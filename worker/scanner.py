@@ -0,0 +1,241 @@
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional
+
+from config import settings
+
+
+class ClamdError(Exception):
+    """
+    Dilempar ketika clamd tidak bisa dihubungi atau membalas dengan error
+    """
+    pass
+
+
+class ScanResult(NamedTuple):
+    clean: bool
+    signature: Optional[str]
+    elapsed: float
+
+
+class _Connection:
+    """
+    Satu koneksi clamd dalam mode IDSESSION sehingga bisa dipakai untuk
+    banyak perintah berturut-turut
+    """
+    
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.request_id = 0
+        self._buffer = b''
+        self.sock.sendall(b'zIDSESSION\0')
+    
+    def _read_reply(self) -> str:
+        while b'\0' not in self._buffer:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ClamdError("Connection closed by clamd")
+            self._buffer += data
+        reply, self._buffer = self._buffer.split(b'\0', 1)
+        reply = reply.decode(errors='replace')
+        # Balasan dalam session diawali "<id>: "
+        prefix = f"{self.request_id}: "
+        return reply[len(prefix):] if reply.startswith(prefix) else reply
+    
+    def command(self, command: str) -> str:
+        self.request_id += 1
+        self.sock.sendall(b'z' + command.encode() + b'\0')
+        return self._read_reply()
+    
+    def instream(self, chunks: Iterable[bytes], chunk_size: int) -> str:
+        self.request_id += 1
+        self.sock.sendall(b'zINSTREAM\0')
+        try:
+            for chunk in chunks:
+                for offset in range(0, len(chunk), chunk_size):
+                    piece = chunk[offset:offset + chunk_size]
+                    self.sock.sendall(struct.pack('!L', len(piece)) + piece)
+            self.sock.sendall(struct.pack('!L', 0))
+        except (BrokenPipeError, ConnectionResetError):
+            # clamd menutup koneksi di tengah stream (misal StreamMaxLength
+            # terlampaui); alasannya ada di balasan
+            pass
+        return self._read_reply()
+    
+    def close(self):
+        try:
+            self.sock.sendall(b'zEND\0')
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ClamdScanner:
+    """
+    Client clamd jangka panjang dengan pool koneksi, pelacakan kesiapan
+    dan scan INSTREAM dari stream data (tanpa file sementara)
+    """
+    
+    def __init__(self, host: str, port: int, pool_size: int = 2, timeout: float = 120.0, chunk_size: int = 64 * 1024):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._pool: "queue.LifoQueue[_Connection]" = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self.ready = False
+        self.last_ready_check = 0.0
+    
+    def _acquire(self) -> _Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return _Connection(self.host, self.port, self.timeout)
+    
+    def _acquire_live(self) -> _Connection:
+        """
+        Ambil koneksi yang dipastikan masih hidup (PING dulu untuk koneksi
+        dari pool), dipakai untuk perintah yang tidak bisa diulang
+        """
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return _Connection(self.host, self.port, self.timeout)
+            try:
+                if conn.command('PING') == 'PONG':
+                    return conn
+            except (OSError, ClamdError):
+                pass
+            conn.sock.close()
+    
+    def _release(self, conn: _Connection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    def _run(self, func):
+        """
+        Jalankan func(conn) dengan koneksi dari pool. Koneksi yang sudah
+        ditutup clamd (idle timeout) dibuang dan dicoba sekali lagi
+        """
+        for attempt in range(2):
+            try:
+                conn = self._acquire()
+            except OSError as e:
+                self.ready = False
+                raise ClamdError(f"Cannot connect to clamd at {self.host}:{self.port}: {e}")
+            try:
+                result = func(conn)
+            except (OSError, ClamdError) as e:
+                conn.sock.close()
+                if attempt == 0 and not isinstance(e, socket.timeout):
+                    continue
+                self.ready = False
+                raise ClamdError(f"clamd request failed: {e}")
+            self._release(conn)
+            return result
+    
+    def ping(self) -> bool:
+        try:
+            self.ready = self._run(lambda conn: conn.command('PING')) == 'PONG'
+        except ClamdError:
+            self.ready = False
+        self.last_ready_check = time.monotonic()
+        return self.ready
+    
+    def version(self) -> str:
+        return self._run(lambda conn: conn.command('VERSION'))
+    
+    def signature_version(self) -> str:
+        """
+        Versi database signature dari balasan VERSION
+        ("ClamAV 1.2.0/27100/Mon Oct 16 ..." -> "27100")
+        """
+        parts = self.version().split('/')
+        if len(parts) < 2 or not parts[1].strip():
+            raise ClamdError(f"Unexpected VERSION reply: {'/'.join(parts)}")
+        return parts[1].strip()
+    
+    def wait_until_ready(self, timeout: float) -> bool:
+        """
+        Tunggu clamd siap dengan backoff. Hasil pengecekan di-cache sebentar
+        agar scan berturut-turut tidak selalu mengirim PING
+        """
+        with self._lock:
+            if self.ready and time.monotonic() - self.last_ready_check < settings.clamav_ready_check_interval:
+                return True
+            deadline = time.monotonic() + timeout
+            delay = 0.5
+            while not self.ping():
+                if time.monotonic() + delay > deadline:
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            return True
+    
+    def scan_stream(self, chunks: Iterable[bytes]) -> ScanResult:
+        """
+        Scan data dengan perintah INSTREAM
+        """
+        start = time.monotonic()
+        # Stream tidak bisa diulang, jadi koneksi harus hidup sebelum mulai
+        try:
+            conn = self._acquire_live()
+        except OSError as e:
+            self.ready = False
+            raise ClamdError(f"Cannot connect to clamd at {self.host}:{self.port}: {e}")
+        source_failed = False
+        
+        def source():
+            nonlocal source_failed
+            try:
+                yield from chunks
+            except Exception:
+                source_failed = True
+                raise
+        
+        try:
+            reply = conn.instream(source(), self.chunk_size)
+        except BaseException as e:
+            # Koneksi berhenti di tengah INSTREAM dan tidak bisa dipakai lagi
+            conn.sock.close()
+            # Error dari sumber data (download MinIO, cek digest/ukuran)
+            # diteruskan apa adanya; clamd sendiri tidak bermasalah
+            if source_failed or not isinstance(e, (OSError, ClamdError)):
+                raise
+            self.ready = False
+            raise ClamdError(f"clamd scan failed: {e}")
+        self._release(conn)
+        elapsed = time.monotonic() - start
+        
+        # Format balasan: "stream: OK", "stream: <nama> FOUND" atau "... ERROR"
+        if reply.endswith('OK'):
+            return ScanResult(True, None, elapsed)
+        if reply.endswith('FOUND'):
+            signature = reply[len('stream: '):-len(' FOUND')] if reply.startswith('stream: ') else reply
+            return ScanResult(False, signature, elapsed)
+        raise ClamdError(f"clamd error: {reply}")
+
+
+_scanner: Optional[ClamdScanner] = None
+
+
+def get_scanner() -> ClamdScanner:
+    """
+    Instance scanner per proses worker (dibuat setelah fork agar socket
+    tidak dipakai bersama antar proses)
+    """
+    global _scanner
+    if _scanner is None:
+        _scanner = ClamdScanner(
+            settings.clamav_host,
+            settings.clamav_port,
+            pool_size=settings.clamav_pool_size,
+            timeout=settings.clamav_timeout
+        )
+    return _scanner
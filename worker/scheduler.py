@@ -0,0 +1,190 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from config import settings
+from fair_share import Dispatch, FairShareScheduler
+
+KEY_PREFIX = "ziphostbot:scheduler"
+LOCK_KEY = f"{KEY_PREFIX}:lock"
+RING_KEY = f"{KEY_PREFIX}:owners"
+CREDITS_KEY = f"{KEY_PREFIX}:credits"
+INFLIGHT_KEY = f"{KEY_PREFIX}:inflight"
+RUNNING_KEY = f"{KEY_PREFIX}:running"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+WAITS_KEY = f"{KEY_PREFIX}:waits"
+
+# Jumlah wait time terakhir yang disimpan untuk menghitung persentil
+RECENT_WAITS = 1000
+
+redis_client = redis.Redis.from_url(settings.redis_url)
+
+
+def _queue_key(owner_id: int) -> str:
+    return f"{KEY_PREFIX}:queue:{owner_id}"
+
+
+class RedisStore:
+    """
+    State FairShareScheduler di Redis agar sama untuk semua proses worker.
+    Semua method dipanggil saat memegang lock scheduler
+    """
+    
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+    
+    def push(self, owner_id: int, project_id: str, enqueued_at: float):
+        self.redis.rpush(_queue_key(owner_id), json.dumps([project_id, enqueued_at]))
+        if self.redis.lpos(RING_KEY, owner_id) is None:
+            self.redis.rpush(RING_KEY, owner_id)
+    
+    def pop(self, owner_id: int) -> Optional[Tuple[str, float]]:
+        data = self.redis.lpop(_queue_key(owner_id))
+        return tuple(json.loads(data)) if data else None
+    
+    def depth(self, owner_id: int) -> int:
+        return self.redis.llen(_queue_key(owner_id))
+    
+    def owners(self) -> List[int]:
+        return [int(owner_id) for owner_id in self.redis.lrange(RING_KEY, 0, -1)]
+    
+    def rotate(self, owner_id: int):
+        pipe = self.redis.pipeline()
+        pipe.lrem(RING_KEY, 1, owner_id)
+        pipe.rpush(RING_KEY, owner_id)
+        pipe.execute()
+    
+    def remove_owner(self, owner_id: int):
+        pipe = self.redis.pipeline()
+        pipe.lrem(RING_KEY, 1, owner_id)
+        pipe.hdel(CREDITS_KEY, owner_id)
+        pipe.execute()
+    
+    def get_credits(self, owner_id: int) -> Optional[int]:
+        credits = self.redis.hget(CREDITS_KEY, owner_id)
+        return int(credits) if credits is not None else None
+    
+    def set_credits(self, owner_id: int, credits: Optional[int]):
+        if credits is None:
+            self.redis.hdel(CREDITS_KEY, owner_id)
+        else:
+            self.redis.hset(CREDITS_KEY, owner_id, credits)
+    
+    def running(self, owner_id: int) -> int:
+        return int(self.redis.hget(RUNNING_KEY, owner_id) or 0)
+    
+    def total_running(self) -> int:
+        return self.redis.hlen(INFLIGHT_KEY)
+    
+    def start(self, project_id: str, owner_id: int, started_at: float):
+        pipe = self.redis.pipeline()
+        pipe.hset(INFLIGHT_KEY, project_id, json.dumps([owner_id, started_at]))
+        pipe.hincrby(RUNNING_KEY, owner_id, 1)
+        pipe.execute()
+    
+    def finish(self, project_id: str) -> Optional[int]:
+        data = self.redis.hget(INFLIGHT_KEY, project_id)
+        if data is None:
+            return None
+        owner_id = json.loads(data)[0]
+        pipe = self.redis.pipeline()
+        pipe.hdel(INFLIGHT_KEY, project_id)
+        pipe.hincrby(RUNNING_KEY, owner_id, -1)
+        pipe.execute()
+        return owner_id
+    
+    def inflight_started(self) -> Dict[str, float]:
+        return {
+            project_id.decode(): json.loads(data)[1]
+            for project_id, data in self.redis.hgetall(INFLIGHT_KEY).items()
+        }
+
+
+class BuildScheduler:
+    """
+    Lapisan antara API dan worker build: proyek diantrekan per owner dan
+    dikirim ke pipeline secara fair-share (lihat fair_share.FairShareScheduler)
+    """
+    
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+        self.policy = FairShareScheduler(
+            RedisStore(client),
+            slots=settings.build_scheduler_slots,
+            per_user_limit=settings.build_max_concurrent_per_user,
+            weights=settings.build_owner_weights,
+            slot_timeout=settings.build_slot_timeout
+        )
+    
+    def _lock(self):
+        return self.redis.lock(LOCK_KEY, timeout=30, blocking_timeout=30)
+    
+    def enqueue(self, owner_id: int, project_id: str) -> List[Dispatch]:
+        """
+        Antrekan build proyek; return proyek yang boleh langsung dijalankan
+        """
+        with self._lock():
+            self.policy.enqueue(owner_id, project_id, time.time())
+            self.redis.hincrby(STATS_KEY, "enqueued", 1)
+            return self._dispatch()
+    
+    def release(self, project_id: str) -> List[Dispatch]:
+        """
+        Lepas slot build proyek; return proyek berikutnya yang dijalankan
+        """
+        with self._lock():
+            self.policy.release(project_id)
+            return self._dispatch()
+    
+    def tick(self) -> List[Dispatch]:
+        """
+        Ambil kembali slot build yang kedaluwarsa (worker mati) lalu jalankan
+        build yang menunggu. Dipanggil berkala agar antrean tidak macet saat
+        tidak ada enqueue/release lain
+        """
+        with self._lock():
+            return self._dispatch()
+    
+    def _dispatch(self) -> List[Dispatch]:
+        now = time.time()
+        for project_id in self.policy.reclaim(now):
+            print(f"Reclaimed stale build slot of project {project_id}")
+        
+        dispatched = self.policy.dispatch(now)
+        if dispatched:
+            pipe = self.redis.pipeline()
+            for item in dispatched:
+                pipe.hincrby(STATS_KEY, "dispatched", 1)
+                pipe.hincrbyfloat(STATS_KEY, "wait_seconds_total", item.wait)
+                pipe.lpush(WAITS_KEY, item.wait)
+            pipe.ltrim(WAITS_KEY, 0, RECENT_WAITS - 1)
+            pipe.execute()
+        return dispatched
+    
+    def get_stats(self) -> dict:
+        """
+        Kedalaman antrean per owner, build yang berjalan dan wait time
+        """
+        depths = {owner_id: self.policy.store.depth(owner_id) for owner_id in self.policy.store.owners()}
+        running = {int(owner_id): int(count) for owner_id, count in self.redis.hgetall(RUNNING_KEY).items() if int(count) > 0}
+        counters = {key.decode(): float(value) for key, value in self.redis.hgetall(STATS_KEY).items()}
+        waits = sorted(float(wait) for wait in self.redis.lrange(WAITS_KEY, 0, -1))
+        
+        def percentile(p: float) -> Optional[float]:
+            return waits[min(len(waits) - 1, int(len(waits) * p))] if waits else None
+        
+        return {
+            'queue_depth': sum(depths.values()),
+            'queue_depth_by_owner': depths,
+            'running': sum(running.values()),
+            'running_by_owner': running,
+            'wait_p50': percentile(0.5),
+            'wait_p95': percentile(0.95),
+            'wait_max': waits[-1] if waits else None,
+            **counters,
+        }
+
+
+build_scheduler = BuildScheduler(redis_client)
@@ -1,7 +1,7 @@
 from minio import Minio
 from minio.error import S3Error
 import io
-from typing import Optional
+from typing import Iterator, Optional
 import uuid
 from config import settings
 
@@ -47,7 +47,7 @@ class MinIOStorage:
             
             return unique_filename
         except S3Error as e:
-            raise Exception(f"Failed to upload file: {e}")
+            raise Exception(f"Failed to upload file: {e}") from e
     
     def download_file(self, file_path: str) -> bytes:
         """
@@ -57,12 +57,26 @@ class MinIOStorage:
             response = self.client.get_object(self.bucket_name, file_path)
             return response.read()
         except S3Error as e:
-            raise Exception(f"Failed to download file: {e}")
+            raise Exception(f"Failed to download file: {e}") from e
         finally:
             if 'response' in locals():
                 response.close()
                 response.release_conn()
     
+    def stream_file(self, file_path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Download file dari MinIO secara bertahap (per chunk)
+        """
+        try:
+            response = self.client.get_object(self.bucket_name, file_path)
+        except S3Error as e:
+            raise Exception(f"Failed to download file: {e}") from e
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+    
     def delete_file(self, file_path: str) -> bool:
         """
         Hapus file dari MinIO
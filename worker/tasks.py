@@ -1,20 +1,34 @@
-import os
-import shutil
-import tempfile
+import hashlib
+import io
 import zipfile
 import docker
-import time
-from celery import Celery
+from celery import Celery, chain
+from celery.exceptions import Ignore
+from celery.signals import task_failure, task_postrun, task_prerun, task_retry, worker_init, worker_ready
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 import uuid
-import subprocess
-import socket
+from typing import List
 
 from config import settings
-from database import Project, ProjectStatus, SessionLocal
+from database import Project, ProjectStatus, transition_status, set_project_fields, fetch_project, hibernation_candidates, project_statuses
 from encryption import token_encryption
 from storage import storage
+from docker_hosts import host_pool, PROJECT_LABEL, MEMORY_LABEL, CPUS_LABEL, PROFILE_LABEL, CONFIG_LABEL
+from resources import ResourceProfile, get_profile, container_limits
+from images import ensure_deps_image, ensure_base_images
+from build_context import iter_build_context, root_files
+from scanner import get_scanner
+from scheduler import build_scheduler
+from locks import claim_dispatch, clear_dispatch, project_lock
+from retry_policy import is_transient_error, retry_countdown, should_retry
+import hibernation
+import image_gc
+import image_store
+import metrics
+import package_cache
+import reconcile
+import scan_cache
 
 # Konfigurasi Celery
 app = Celery(
@@ -34,95 +48,155 @@ app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Tahap pipeline punya queue sendiri agar tiap jenis pekerjaan bisa
+    # di-scale di pool worker masing-masing. Start/stop masuk queue control
+    # yang dilayani pool thread sehingga tidak menunggu di belakang build
+    task_routes={
+        'stop_project': {'queue': 'control'},
+        'start_project': {'queue': 'control'},
+        'wake_project': {'queue': 'control'},
+        'hibernate_project': {'queue': 'control'},
+        'hibernate_idle_projects': {'queue': 'control'},
+        'remove_project_images': {'queue': 'control'},
+        'collect_images': {'queue': 'control'},
+        'reconcile_projects': {'queue': 'control'},
+        'tick_build_scheduler': {'queue': 'control'},
+        'scan_project': {'queue': 'scan'},
+        'build_project': {'queue': 'build'},
+        # Membaca image dari Docker daemon build
+        'export_project_image': {'queue': 'build'},
+        'run_project': {'queue': 'run'},
+        # Butuh volume package cache dan Docker daemon build
+        'rebuild_base_images': {'queue': 'build'},
+        'prune_package_cache': {'queue': 'build'},
+    },
+    # Dijalankan oleh service beat (celery -A tasks beat)
+    beat_schedule={
+        'tick-build-scheduler': {
+            'task': 'tick_build_scheduler',
+            'schedule': settings.build_scheduler_tick_interval,
+        },
+        'hibernate-idle-projects': {
+            'task': 'hibernate_idle_projects',
+            'schedule': settings.hibernation_check_interval,
+        },
+        'collect-images': {
+            'task': 'collect_images',
+            'schedule': settings.image_gc_interval,
+        },
+        'reconcile-projects': {
+            'task': 'reconcile_projects',
+            'schedule': settings.reconcile_interval,
+        },
+        'reconcile-projects-full': {
+            'task': 'reconcile_projects',
+            'schedule': settings.reconcile_full_interval,
+            'kwargs': {'full': True},
+        },
+    },
 )
 
-# Docker client
-docker_client = docker.from_env()
+# Docker client host build (satu per proses; pool koneksi cukup untuk semua
+# thread di worker control). Container bot dijalankan lewat host_pool
+docker_client = host_pool.client(host_pool.build_host)
 
 
-def update_project_status(project_id: str, status: ProjectStatus, error_log: str = None, container_id: str = None):
+def update_project_status(project_id: str, status: ProjectStatus, error_log: str = None, container_id: str = None, **values) -> bool:
     """
-    Update status proyek di database
+    Update status proyek di database (satu UPDATE bersyarat). Return False
+    jika transisi ditolak karena status saat ini tidak mengizinkannya
     """
-    db = SessionLocal()
-    try:
-        project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
-        if project:
-            project.status = status
-            if error_log:
-                project.last_error_log = error_log
-            if container_id:
-                project.container_id = container_id
-            db.commit()
-    finally:
-        db.close()
+    if error_log:
+        values['last_error_log'] = error_log
+    if container_id:
+        values['container_id'] = container_id
+    if not transition_status(project_id, status, **values):
+        print(f"Status transition of project {project_id} to {status.value} rejected")
+        return False
+    return True
 
 
-def scan_with_clamav(file_path: str) -> bool:
+def download_and_scan(file_path: str, digest: str = None) -> bytes:
     """
-    Scan file dengan ClamAV
+    Download file ZIP dari MinIO sambil di-scan ClamAV (INSTREAM), tanpa
+    file sementara. Verdict disimpan per isi arsip (sha256) dan versi
+    signature ClamAV, sehingga arsip yang sama tidak di-scan ulang selama
+    signature belum berubah. Return isi file jika bersih
     """
-    try:
-        # Tunggu ClamAV siap
-        max_retries = 30
-        for i in range(max_retries):
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                result = sock.connect_ex((settings.clamav_host, settings.clamav_port))
-                sock.close()
-                if result == 0:
-                    break
-            except:
-                pass
-            time.sleep(2)
-        
-        # Jalankan clamdscan
-        result = subprocess.run([
-            'clamdscan', 
-            '--fdpass',
-            f'--stream',
-            file_path
-        ], capture_output=True, text=True, timeout=300)
-        
-        # Jika return code 0, file bersih
-        return result.returncode == 0
-        
-    except Exception as e:
-        print(f"ClamAV scan error: {e}")
-        # Jika ClamAV tidak tersedia, lanjutkan (untuk development)
-        return True
+    scanner = get_scanner()
+    if not scanner.wait_until_ready(settings.clamav_ready_timeout):
+        if settings.clamav_fail_open:
+            # Hanya untuk development tanpa ClamAV
+            print("ClamAV not available, skipping scan")
+            return storage.download_file(file_path)
+        raise Exception("ClamAV tidak tersedia, scan tidak dapat dilakukan")
+    
+    signature_version = scanner.signature_version()
+    
+    if digest:
+        cached = scan_cache.get_verdict(digest, signature_version)
+        if cached is not None:
+            zip_data = storage.download_file(file_path)
+            # Pastikan object yang di-download memang isi yang pernah di-scan
+            if hashlib.sha256(zip_data).hexdigest() == digest:
+                scan_cache.record_hit(cached.elapsed)
+                print(f"ClamAV verdict cache hit ({digest[:12]}, signatures {signature_version})")
+                if not cached.clean:
+                    raise Exception(f"File contains malware or virus ({cached.signature})")
+                return zip_data
+            print(f"Digest mismatch for {file_path}, rescanning")
+    
+    buffer = io.BytesIO()
+    sha256 = hashlib.sha256()
+    
+    def tee():
+        for chunk in storage.stream_file(file_path):
+            buffer.write(chunk)
+            sha256.update(chunk)
+            yield chunk
+    
+    result = scanner.scan_stream(tee())
+    print(f"ClamAV scan finished in {result.elapsed:.3f}s: {'clean' if result.clean else result.signature}")
+    
+    # Verdict disimpan dengan digest hasil hitung, bukan yang tercatat di DB
+    scan_cache.set_verdict(sha256.hexdigest(), signature_version, result)
+    scan_cache.record_miss(result.elapsed)
+    
+    if not result.clean:
+        raise Exception(f"File contains malware or virus ({result.signature})")
+    
+    return buffer.getvalue()
 
 
-def detect_runtime(work_dir: str) -> str:
+def detect_runtime(files: List[str]) -> str:
     """
-    Deteksi runtime berdasarkan file yang ada
+    Deteksi runtime berdasarkan file yang ada di root arsip
     """
-    if os.path.exists(os.path.join(work_dir, 'requirements.txt')):
+    if 'requirements.txt' in files:
         return 'python'
-    elif os.path.exists(os.path.join(work_dir, 'package.json')):
+    elif 'package.json' in files:
         return 'nodejs'
     else:
         return None
 
 
-def create_dockerfile(work_dir: str, runtime: str) -> str:
+def create_dockerfile(files: List[str], runtime: str, deps_image: str) -> str:
     """
-    Buat Dockerfile dinamis berdasarkan runtime
+    Buat isi Dockerfile dinamis berdasarkan runtime. Dependency sudah
+    terpasang di deps_image sehingga build proyek hanya menambah layer kode
     """
-    dockerfile_path = os.path.join(work_dir, 'Dockerfile')
-    
     if runtime == 'python':
         # Cari file utama Python
         main_files = ['main.py', 'bot.py', 'app.py', 'run.py']
         main_file = None
         for file in main_files:
-            if os.path.exists(os.path.join(work_dir, file)):
+            if file in files:
                 main_file = file
                 break
         
         if not main_file:
             # Cari file .py pertama
-            for file in os.listdir(work_dir):
+            for file in files:
                 if file.endswith('.py'):
                     main_file = file
                     break
@@ -130,19 +204,10 @@ def create_dockerfile(work_dir: str, runtime: str) -> str:
         if not main_file:
             raise Exception("No Python main file found")
         
-        dockerfile_content = f"""FROM python:3.10-slim
+        dockerfile_content = f"""FROM {deps_image}
 
 WORKDIR /app
 
-# Install system dependencies
-RUN apt-get update && apt-get install -y \\
-    gcc \\
-    && rm -rf /var/lib/apt/lists/*
-
-# Copy requirements and install dependencies
-COPY requirements.txt .
-RUN pip install --no-cache-dir -r requirements.txt
-
 # Copy application code
 COPY . .
 
@@ -151,16 +216,10 @@ CMD ["python", "{main_file}"]
 """
     
     elif runtime == 'nodejs':
-        dockerfile_content = """FROM node:18-alpine
+        dockerfile_content = f"""FROM {deps_image}
 
 WORKDIR /app
 
-# Copy package files
-COPY package*.json ./
-
-# Install dependencies
-RUN npm install
-
 # Copy application code
 COPY . .
 
@@ -168,82 +227,416 @@ COPY . .
 CMD ["npm", "start"]
 """
     
-    with open(dockerfile_path, 'w') as f:
-        f.write(dockerfile_content)
+    return dockerfile_content
+
+
+@worker_ready.connect
+def prepare_base_images(**kwargs):
+    """
+    Siapkan base image runtime saat worker start agar build pertama tidak
+    perlu menunggu
+    """
+    if not settings.build_base_images_on_startup:
+        return
+    try:
+        ensure_base_images(docker_client)
+    except Exception as e:
+        print(f"Error preparing base images: {e}")
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    """
+    Jalankan exporter Prometheus di proses utama worker sebelum pool dibuat
+    """
+    if not settings.metrics_port:
+        return
+    metrics.clear_multiproc_dir()
+    try:
+        metrics.start_exporter(build_scheduler.redis, build_scheduler)
+    except Exception as e:
+        print(f"Error starting metrics exporter: {e}")
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    metrics.task_started(task_id)
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    metrics.task_finished(task_id, task.name, state)
+
+
+@task_failure.connect
+def record_task_failure(exception=None, **kwargs):
+    metrics.record_error(exception)
+
+
+@task_retry.connect
+def record_task_retry(reason=None, **kwargs):
+    if isinstance(reason, BaseException):
+        metrics.record_error(reason)
+
+
+@app.task(bind=True, name='rebuild_base_images')
+def rebuild_base_images(self, force: bool = True):
+    """
+    Task untuk build ulang base image runtime (misal setelah update upstream)
+    """
+    return ensure_base_images(docker_client, force=force)
+
+
+@app.task(bind=True, name='prune_package_cache')
+def prune_package_cache(self):
+    """
+    Task untuk menjalankan eviction package cache dan melaporkan counter-nya
+    """
+    package_cache.enforce_budget()
+    return package_cache.get_stats()
+
+
+@app.task(bind=True, name='scan_cache_stats')
+def scan_cache_stats(self):
+    """
+    Task untuk melaporkan counter hit/miss scan verdict cache
+    """
+    return scan_cache.get_stats()
+
+
+def update_pipeline_stage(project_id: str, stage: str):
+    """
+    Update tahap pipeline proyek (scan, build, run) agar progres terlihat
+    oleh user; None setelah pipeline selesai
+    """
+    set_project_fields(project_id, pipeline_stage=stage)
+
+
+def launch_builds(dispatched: list):
+    """
+    Jalankan pipeline untuk proyek yang dipilih scheduler
+    """
+    for item in dispatched:
+        print(f"Dispatching build of project {item.project_id} (owner {item.owner_id}, waited {item.wait:.1f}s)")
+        process_project.delay(item.project_id)
+
+
+def schedule_build(project_id: str, owner_id: int, task_id: str):
+    """
+    Antrekan build proyek di scheduler fair-share per owner. Build yang
+    sudah antre/berjalan untuk proyek yang sama tidak diantrekan lagi
+    """
+    if not claim_dispatch(project_id, 'build', task_id, settings.build_dispatch_ttl):
+        print(f"Build of project {project_id} already in progress, skipping duplicate")
+        return
+    update_pipeline_stage(project_id, 'queued')
+    launch_builds(build_scheduler.enqueue(owner_id, project_id))
+
+
+def release_build_slot(project_id: str):
+    """
+    Lepas slot build proyek dan jalankan build berikutnya yang menunggu
+    """
+    try:
+        launch_builds(build_scheduler.release(project_id))
+    except Exception as e:
+        # Slot yang gagal dilepas diambil kembali setelah build_slot_timeout
+        print(f"Error releasing build slot of project {project_id}: {e}")
+
+
+def fail_stage(project_id: str, stage: str, error: Exception):
+    """
+    Tandai proyek FAILED dan hentikan chain (tahap berikutnya tidak dijalankan)
+    """
+    error_msg = str(error)
+    print(f"Error in {stage} stage of project {project_id}: {error_msg}")
+    update_project_status(project_id, ProjectStatus.FAILED, error_log=error_msg)
+    release_build_slot(project_id)
+    clear_dispatch(project_id, 'build')
+    raise Ignore()
+
+
+def handle_stage_error(task, project_id: str, stage: str, error: Exception):
+    """
+    Gangguan sementara MinIO/Docker dicoba ulang dengan backoff (chain tetap
+    berlanjut setelah retry berhasil); error lain menggagalkan proyek
+    """
+    if should_retry(task, error):
+        countdown = retry_countdown(task.request.retries)
+        print(f"Transient error in {stage} stage of project {project_id}, retrying in {countdown:.0f}s: {error}")
+        raise task.retry(exc=error, countdown=countdown)
+    fail_stage(project_id, stage, error)
+
+
+def container_config(encrypted_bot_token: str, profile: ResourceProfile, hibernation_enabled: bool) -> str:
+    """
+    Hash konfigurasi container untuk label CONFIG_LABEL. Dihitung dari token
+    terenkripsi sehingga bisa dibandingkan tanpa dekripsi
+    """
+    data = f"{encrypted_bot_token}:{profile.name}:{int(bool(hibernation_enabled))}"
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def run_container(project_id: str, image_tag: str, bot_token: str, host: str, profile: ResourceProfile,
+                  hibernation_enabled: bool = False, config: str = None):
+    """
+    Jalankan container proyek di host secara idempoten: container dengan nama
+    yang sama dari image yang sama dan masih berjalan dipakai lagi, sisa
+    container lain dihapus dulu agar nama tidak bentrok. Batas resource
+    diambil dari profil proyek. Bot mode hibernasi mendapat port HTTP yang
+    dipublish di alamat internal host untuk menerima update dari ingress. Panggil saat memegang lock
+    proyek
+    """
+    client = host_pool.client(host)
+    host_pool.ensure_image(host, image_tag)
+    
+    name = f"ziphostbot_{project_id}"
+    image_gc.record_use(host, project_id)
+    try:
+        existing = client.containers.get(name)
+        if existing.status == 'running' and existing.attrs.get('Image') == client.images.get(image_tag).id:
+            print(f"Container {name} already running on {host}")
+            return existing
+        existing.remove(force=True)
+    except docker.errors.NotFound:
+        pass
+    
+    environment = {'BOT_TOKEN': bot_token}
+    ports = {}
+    if hibernation_enabled:
+        environment.update(hibernation.container_environment(project_id))
+        # Hanya di alamat internal; update masuk lewat ingress yang memeriksa secret
+        ports[f"{settings.hibernation_bot_port}/tcp"] = (host_pool.bind_address(host), None)
+    
+    labels = {
+        PROJECT_LABEL: project_id,
+        PROFILE_LABEL: profile.name,
+        MEMORY_LABEL: str(profile.memory),
+        CPUS_LABEL: str(profile.cpus),
+    }
+    if config:
+        labels[CONFIG_LABEL] = config
+    
+    return client.containers.run(
+        image_tag,
+        environment=environment,
+        ports=ports,
+        detach=True,
+        restart_policy={"Name": "unless-stopped"},
+        name=name,
+        labels=labels,
+        **container_limits(profile)
+    )
+
+
+def restart_stopped_container(project_id: str, container_id: str, host: str, config: str):
+    """
+    Mode reuse: jalankan lagi container yang dihentikan stop_project di
+    tempat, tanpa dekripsi token dan pembuatan container baru. Container
+    dengan konfigurasi lain (token diganti, profil atau mode hibernasi
+    berubah) dihapus agar dibuat ulang dengan environment baru. Return None
+    jika container harus dibuat ulang. Panggil saat memegang lock proyek
+    """
+    if not settings.reuse_stopped_containers or not container_id:
+        return None
+    
+    try:
+        container = host_pool.client(host).containers.get(container_id)
+    except docker.errors.NotFound:
+        return None
     
-    return dockerfile_path
+    if container.labels.get(CONFIG_LABEL) != config:
+        print(f"Configuration of container {container_id} changed, recreating")
+        container.remove(force=True)
+        return None
+    
+    if container.status != 'running':
+        container.start()
+    image_gc.record_use(host, project_id)
+    return container
+
+
+def remove_container(host: str, container_id: str):
+    """
+    Hapus container proyek yang tertinggal di host lama (best effort)
+    """
+    try:
+        host_pool.client(host).containers.get(container_id).remove(force=True)
+    except docker.errors.NotFound:
+        pass
+    except Exception as e:
+        print(f"Error removing container {container_id} on {host}: {e}")
+
+
+def place_container(project_id: str, profile: ResourceProfile, preferred: str = None):
+    """
+    Pilih Docker host untuk container bot dan pesan resource profil proyek
+    di sana sampai blok with selesai (buat container di dalam blok). Host
+    sebelumnya dipakai lagi selama masih terdaftar dan punya headroom
+    """
+    return host_pool.admit(project_id, profile.memory, profile.cpus, preferred)
+
+
+def publish_bot(project_id: str, host: str, container) -> int:
+    """
+    Replay update yang di-buffer ingress ke bot mode hibernasi lalu teruskan
+    update berikutnya langsung ke container
+    """
+    endpoint = hibernation.container_endpoint(host_pool.address(host), container)
+    return hibernation.publish_endpoint(project_id, endpoint)
+
+
+def open_project_zip(zip_data: bytes) -> zipfile.ZipFile:
+    """
+    Buka ZIP langsung dari memori (tanpa ekstrak ke disk) dan cek ukuran isinya
+    """
+    zip_ref = zipfile.ZipFile(io.BytesIO(zip_data), 'r')
+    extracted_size = sum(info.file_size for info in zip_ref.infolist())
+    if extracted_size > settings.max_extracted_size:
+        raise Exception(f"Isi ZIP terlalu besar setelah diekstrak ({extracted_size} bytes)")
+    return zip_ref
+
+
+@app.task(bind=True, name='enqueue_build')
+def enqueue_build(self, project_id: str, owner_id: int):
+    """
+    Titik masuk build dari API: proyek masuk antrean fair-share milik owner
+    """
+    schedule_build(project_id, owner_id, self.request.id)
+
+
+@app.task(bind=True, name='tick_build_scheduler')
+def tick_build_scheduler(self):
+    """
+    Task periodik (beat): ambil kembali slot build milik worker yang mati dan
+    jalankan build yang menunggu slot
+    """
+    dispatched = build_scheduler.tick()
+    launch_builds(dispatched)
+    return len(dispatched)
+
+
+@app.task(bind=True, name='scheduler_stats')
+def scheduler_stats(self):
+    """
+    Task untuk melaporkan kedalaman antrean dan wait time scheduler build
+    """
+    return build_scheduler.get_stats()
 
 
-@app.task(bind=True)
+@app.task(bind=True, name='process_project')
 def process_project(self, project_id: str):
     """
-    Task utama untuk memproses proyek ZIP
+    Task utama untuk memproses proyek ZIP. Pekerjaan dipecah menjadi chain
+    scan -> build -> run yang masing-masing berjalan di queue sendiri
+    """
+    print(f"Processing project {project_id}")
+    
+    # Update status ke PROCESSING (ditolak jika proyek sudah dihapus atau
+    # sedang berjalan)
+    if not update_project_status(project_id, ProjectStatus.PROCESSING, pipeline_stage='scan'):
+        release_build_slot(project_id)
+        clear_dispatch(project_id, 'build')
+        return
+    
+    chain(
+        scan_project.s(project_id),
+        build_project.s(),
+        run_project.s()
+    ).apply_async()
+
+
+@app.task(bind=True, name='scan_project')
+def scan_project(self, project_id: str) -> dict:
+    """
+    Tahap scan: download + scan ClamAV, validasi isi ZIP dan deteksi runtime.
+    Artefak untuk tahap build adalah digest arsip yang sudah di-scan
     """
-    work_dir = None
     try:
-        print(f"Processing project {project_id}")
-        
-        # Update status ke PROCESSING
-        update_project_status(project_id, ProjectStatus.PROCESSING)
-        
         # Ambil data proyek dari database
-        db = SessionLocal()
-        project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+        project = fetch_project(project_id, Project.zip_storage_path, Project.zip_digest)
         if not project:
             raise Exception("Project not found")
+        zip_storage_path = project.zip_storage_path
         
-        # Download file ZIP dari MinIO
-        print("Downloading ZIP file...")
-        zip_data = storage.download_file(project.zip_storage_path)
-        
-        # Buat direktori kerja temporary
-        work_dir = f"/tmp/builds/{project_id}"
-        os.makedirs(work_dir, exist_ok=True)
-        
-        # Simpan file ZIP sementara untuk scanning
-        zip_file_path = os.path.join(work_dir, 'project.zip')
-        with open(zip_file_path, 'wb') as f:
-            f.write(zip_data)
-        
-        # Scan dengan ClamAV
-        print("Scanning with ClamAV...")
-        if not scan_with_clamav(zip_file_path):
-            raise Exception("File contains malware or virus")
-        
-        # Ekstrak ZIP
-        print("Extracting ZIP file...")
-        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-            zip_ref.extractall(work_dir)
-        
-        # Hapus file ZIP setelah ekstrak
-        os.remove(zip_file_path)
+        # Download file ZIP dari MinIO sekaligus scan dengan ClamAV
+        print("Downloading and scanning ZIP file...")
+        with metrics.stage('scan'):
+            zip_data = download_and_scan(zip_storage_path, project.zip_digest)
         
         # Deteksi runtime
         print("Detecting runtime...")
-        runtime = detect_runtime(work_dir)
+        with metrics.stage('extract'):
+            zip_ref = open_project_zip(zip_data)
+            runtime = detect_runtime(root_files(zip_ref))
         if not runtime:
             raise Exception("Runtime tidak dapat dideteksi. Pastikan ada requirements.txt (Python) atau package.json (Node.js)")
         
         print(f"Detected runtime: {runtime}")
         
+        return {
+            'project_id': project_id,
+            'zip_storage_path': zip_storage_path,
+            'zip_digest': hashlib.sha256(zip_data).hexdigest(),
+            'runtime': runtime,
+        }
+    
+    except Exception as e:
+        handle_stage_error(self, project_id, 'scan', e)
+
+
+@app.task(bind=True, name='build_project')
+def build_project(self, artifact: dict) -> dict:
+    """
+    Tahap build: siapkan image dependency lalu build image proyek
+    """
+    project_id = artifact['project_id']
+    try:
+        update_pipeline_stage(project_id, 'build')
+        
+        # Arsip diambil ulang dari MinIO; digest memastikan isinya sama
+        # dengan yang sudah lolos scan
+        with metrics.stage('download'):
+            zip_data = storage.download_file(artifact['zip_storage_path'])
+            if hashlib.sha256(zip_data).hexdigest() != artifact['zip_digest']:
+                raise Exception("File ZIP berubah setelah di-scan")
+        
+        zip_ref = open_project_zip(zip_data)
+        runtime = artifact['runtime']
+        
+        # Siapkan image dependency (dipakai ulang jika manifest sama)
+        print("Preparing dependency image...")
+        with metrics.stage('dependencies'):
+            deps_image = ensure_deps_image(docker_client, zip_ref, runtime)
+        image_gc.record_use(host_pool.build_host, deps_image)
+        
         # Buat Dockerfile
         print("Creating Dockerfile...")
-        dockerfile_path = create_dockerfile(work_dir, runtime)
+        dockerfile = create_dockerfile(root_files(zip_ref), runtime, deps_image)
         
         # Build Docker image
         print("Building Docker image...")
-        image_tag = f"ziphostbot/project:{project_id}"
+        image_tag = image_gc.project_image_tag(project_id)
         
         try:
-            # Build image
-            image, build_logs = docker_client.images.build(
-                path=work_dir,
-                tag=image_tag,
-                rm=True,
-                forcerm=True
-            )
+            # Build image; build context di-stream langsung dari entri ZIP
+            with metrics.stage('build'):
+                image, build_logs = docker_client.images.build(
+                    fileobj=iter_build_context(zip_ref, dockerfile),
+                    custom_context=True,
+                    tag=image_tag,
+                    labels={'ziphostbot.role': 'project', PROJECT_LABEL: project_id},
+                    rm=True,
+                    forcerm=True
+                )
+            image_gc.record_use(host_pool.build_host, project_id)
             
             print("Docker image built successfully")
+            release_build_slot(project_id)
+            
+            # Ekspor ke MinIO berjalan paralel dengan tahap run
+            if settings.image_store_enabled:
+                export_project_image.delay(project_id)
             
         except docker.errors.BuildError as e:
             error_msg = "Docker build failed:\n"
@@ -252,120 +645,407 @@ def process_project(self, project_id: str):
                     error_msg += log['stream']
             raise Exception(error_msg)
         
+        return {
+            'project_id': project_id,
+            'image_tag': image_tag,
+        }
+    
+    except Exception as e:
+        handle_stage_error(self, project_id, 'build', e)
+
+
+@app.task(bind=True, name='run_project')
+def run_project(self, artifact: dict):
+    """
+    Tahap run: jalankan container dari image hasil tahap build
+    """
+    project_id = artifact['project_id']
+    try:
+        update_pipeline_stage(project_id, 'run')
+        
+        project = fetch_project(project_id, Project.encrypted_bot_token, Project.resource_profile, Project.hibernation_enabled)
+        if not project:
+            raise Exception("Project not found")
+        profile = get_profile(project.resource_profile)
+        config = container_config(project.encrypted_bot_token, profile, project.hibernation_enabled)
+        
         # Dekripsi bot token
         bot_token = token_encryption.decrypt_token(project.encrypted_bot_token)
         
         # Jalankan container
         print("Starting container...")
-        container = docker_client.containers.run(
-            image_tag,
-            environment={'BOT_TOKEN': bot_token},
-            detach=True,
-            restart_policy={"Name": "unless-stopped"},
-            name=f"ziphostbot_{project_id}"
-        )
+        with metrics.stage('container_start'), project_lock(project_id), place_container(project_id, profile) as host:
+            container = run_container(project_id, artifact['image_tag'], bot_token, host, profile, project.hibernation_enabled, config)
+        
+        print(f"Container started on {host}: {container.id}")
         
-        print(f"Container started: {container.id}")
+        if project.hibernation_enabled:
+            hibernation.register_webhook(project_id, bot_token)
+            publish_bot(project_id, host, container)
         
         # Update status ke RUNNING
-        update_project_status(project_id, ProjectStatus.RUNNING, container_id=container.id)
+        update_project_status(project_id, ProjectStatus.RUNNING, container_id=container.id, docker_host=host, pipeline_stage=None)
+        clear_dispatch(project_id, 'build')
         
         print(f"Project {project_id} processed successfully")
-        
-        db.close()
-        
+    
     except Exception as e:
-        error_msg = str(e)
-        print(f"Error processing project {project_id}: {error_msg}")
-        update_project_status(project_id, ProjectStatus.FAILED, error_log=error_msg)
-        
-    finally:
-        # Cleanup work directory
-        if work_dir and os.path.exists(work_dir):
-            shutil.rmtree(work_dir, ignore_errors=True)
+        handle_stage_error(self, project_id, 'run', e)
 
 
-@app.task(bind=True)
+@app.task(bind=True, name='stop_project')
 def stop_project(self, project_id: str):
     """
     Task untuk menghentikan proyek
     """
     try:
+        if not claim_dispatch(project_id, 'stop', self.request.id, settings.control_dispatch_ttl):
+            print(f"Stop of project {project_id} already in progress, skipping duplicate")
+            return
+        
         print(f"Stopping project {project_id}")
         
         # Ambil data proyek dari database
-        db = SessionLocal()
-        project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
-        if not project or not project.container_id:
-            return
+        project = fetch_project(project_id, Project.container_id, Project.docker_host, Project.status, Project.hibernation_enabled)
+        container_id = project.container_id if project else None
         
-        # Stop dan hapus container
-        try:
-            container = docker_client.containers.get(project.container_id)
-            container.stop(timeout=10)
-            container.remove()
-            print(f"Container {project.container_id} stopped and removed")
-        except docker.errors.NotFound:
-            print(f"Container {project.container_id} not found")
-        except Exception as e:
-            print(f"Error stopping container: {e}")
+        if project and project.hibernation_enabled:
+            # Update berikutnya tidak lagi diteruskan/di-buffer
+            hibernation.forget(project_id)
         
-        # Update status
-        update_project_status(project_id, ProjectStatus.STOPPED, container_id=None)
+        # Proyek yang dihibernasi tidak punya container, cukup ubah statusnya
+        if container_id or (project and project.status == ProjectStatus.HIBERNATED):
+            with project_lock(project_id):
+                # Stop container di host tempat proyek berjalan. Mode reuse
+                # menyimpan container (dan container_id) untuk start berikutnya
+                keep = settings.reuse_stopped_containers
+                try:
+                    if container_id:
+                        container = host_pool.client(project.docker_host).containers.get(container_id)
+                        with metrics.stage('container_stop'):
+                            container.stop(timeout=10)
+                        if keep:
+                            print(f"Container {container_id} stopped")
+                        else:
+                            container.remove()
+                            print(f"Container {container_id} stopped and removed")
+                except docker.errors.NotFound:
+                    print(f"Container {container_id} not found")
+                    keep = False
+                except Exception as e:
+                    if is_transient_error(e):
+                        raise
+                    metrics.record_error(e)
+                    print(f"Error stopping container: {e}")
+                    keep = False
+                
+                # Update status (container_id dikosongkan kecuali container disimpan)
+                fields = {} if keep and container_id else {'container_id': None}
+                if not transition_status(project_id, ProjectStatus.STOPPED, **fields):
+                    print(f"Status transition of project {project_id} to STOPPED rejected")
         
-        db.close()
+        clear_dispatch(project_id, 'stop')
         
     except Exception as e:
+        if should_retry(self, e):
+            raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+        metrics.record_error(e)
         print(f"Error stopping project {project_id}: {e}")
+        clear_dispatch(project_id, 'stop')
 
 
-@app.task(bind=True)
+@app.task(bind=True, name='start_project')
 def start_project(self, project_id: str):
     """
     Task untuk memulai ulang proyek
     """
     try:
+        if not claim_dispatch(project_id, 'start', self.request.id, settings.control_dispatch_ttl):
+            print(f"Start of project {project_id} already in progress, skipping duplicate")
+            return
+        
         print(f"Starting project {project_id}")
         
         # Ambil data proyek dari database
-        db = SessionLocal()
-        project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+        project = fetch_project(project_id, Project.encrypted_bot_token, Project.owner_id, Project.container_id,
+                                Project.docker_host, Project.resource_profile, Project.hibernation_enabled)
         if not project:
+            clear_dispatch(project_id, 'start')
             return
         
-        # Dekripsi bot token
-        bot_token = token_encryption.decrypt_token(project.encrypted_bot_token)
-        
         # Jalankan container dengan image yang sudah ada
-        image_tag = f"ziphostbot/project:{project_id}"
+        image_tag = image_gc.project_image_tag(project_id)
         
-        try:
-            # Cek apakah image ada
-            docker_client.images.get(image_tag)
+        # Tetap di host sebelumnya jika masih terdaftar dan muat
+        profile = get_profile(project.resource_profile)
+        config = container_config(project.encrypted_bot_token, profile, project.hibernation_enabled)
+        bot_token = None
+        
+        # Image dicek di dalam lock agar tidak dihapus GC sebelum container jalan
+        with (metrics.stage('container_start'), project_lock(project_id),
+              place_container(project_id, profile, preferred=project.docker_host) as host):
+            container = None
+            if host == project.docker_host:
+                container = restart_stopped_container(project_id, project.container_id, host, config)
+            elif project.container_id:
+                remove_container(project.docker_host, project.container_id)
             
-            # Jalankan container
-            container = docker_client.containers.run(
-                image_tag,
-                environment={'BOT_TOKEN': bot_token},
-                detach=True,
-                restart_policy={"Name": "unless-stopped"},
-                name=f"ziphostbot_{project_id}"
-            )
+            if container is None:
+                try:
+                    # Cek apakah image ada (disalin dari host build jika perlu)
+                    host_pool.ensure_image(host, image_tag)
+                except docker.errors.ImageNotFound:
+                    # Image tidak ada (atau sudah dihapus GC), proses ulang dari
+                    # awal lewat scheduler
+                    schedule_build(project_id, project.owner_id, self.request.id)
+                    clear_dispatch(project_id, 'start')
+                    return
+                
+                # Dekripsi bot token
+                bot_token = token_encryption.decrypt_token(project.encrypted_bot_token)
+                container = run_container(project_id, image_tag, bot_token, host, profile, project.hibernation_enabled, config)
+        
+        print(f"Container restarted on {host}: {container.id}")
+        
+        if project.hibernation_enabled:
+            # Container yang di-reuse memakai token yang sama; webhook sudah terpasang
+            if bot_token:
+                hibernation.register_webhook(project_id, bot_token)
+            publish_bot(project_id, host, container)
+        
+        # Update status
+        update_project_status(project_id, ProjectStatus.RUNNING, container_id=container.id, docker_host=host)
+        clear_dispatch(project_id, 'start')
+        
+    except Exception as e:
+        if should_retry(self, e):
+            raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+        metrics.record_error(e)
+        print(f"Error starting project {project_id}: {e}")
+        update_project_status(project_id, ProjectStatus.FAILED, error_log=str(e))
+        clear_dispatch(project_id, 'start')
+
+
+@app.task(bind=True, name='wake_project')
+def wake_project(self, project_id: str):
+    """
+    Bangunkan proyek yang dihibernasi saat ingress menerima update, lalu
+    replay update yang di-buffer. Untuk proyek RUNNING yang endpoint-nya
+    hilang (container restart) endpoint dipublish ulang
+    """
+    try:
+        if not claim_dispatch(project_id, 'wake', self.request.id, settings.control_dispatch_ttl):
+            print(f"Wake of project {project_id} already in progress, skipping duplicate")
+            return
+        
+        with project_lock(project_id):
+            project = fetch_project(project_id, Project.status, Project.container_id, Project.docker_host, Project.owner_id,
+                                    Project.encrypted_bot_token, Project.resource_profile, Project.hibernation_enabled)
+            if not project or not project.hibernation_enabled or project.status not in (ProjectStatus.RUNNING, ProjectStatus.HIBERNATED):
+                clear_dispatch(project_id, 'wake')
+                return
             
-            print(f"Container restarted: {container.id}")
+            container = None
+            host = project.docker_host
+            if project.status == ProjectStatus.RUNNING and project.container_id:
+                try:
+                    container = host_pool.client(host).containers.get(project.container_id)
+                except docker.errors.NotFound:
+                    pass
             
-            # Update status
-            update_project_status(project_id, ProjectStatus.RUNNING, container_id=container.id)
+            if container is None:
+                print(f"Waking up project {project_id}")
+                profile = get_profile(project.resource_profile)
+                image_tag = image_gc.project_image_tag(project_id)
+                with place_container(project_id, profile, preferred=project.docker_host) as host:
+                    try:
+                        host_pool.ensure_image(host, image_tag)
+                    except docker.errors.ImageNotFound:
+                        # Image sudah dihapus; build ulang, tahap run akan replay buffer
+                        schedule_build(project_id, project.owner_id, self.request.id)
+                        clear_dispatch(project_id, 'wake')
+                        return
+                    
+                    bot_token = token_encryption.decrypt_token(project.encrypted_bot_token)
+                    config = container_config(project.encrypted_bot_token, profile, True)
+                    container = run_container(project_id, image_tag, bot_token, host, profile, hibernation_enabled=True, config=config)
+                update_project_status(project_id, ProjectStatus.RUNNING, container_id=container.id, docker_host=host)
             
-        except docker.errors.ImageNotFound:
-            # Jika image tidak ada, proses ulang dari awal
-            process_project.delay(project_id)
-        
-        db.close()
+            publish_bot(project_id, host, container)
         
+        clear_dispatch(project_id, 'wake')
+    
     except Exception as e:
-        print(f"Error starting project {project_id}: {e}")
+        if should_retry(self, e):
+            raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+        metrics.record_error(e)
+        print(f"Error waking project {project_id}: {e}")
         update_project_status(project_id, ProjectStatus.FAILED, error_log=str(e))
+        clear_dispatch(project_id, 'wake')
+
+
+def dispatch_wake(project_id: str):
+    """
+    Kirim wake_project kecuali wake untuk proyek yang sama sedang berjalan
+    """
+    task_id = str(uuid.uuid4())
+    if claim_dispatch(project_id, 'wake', task_id, settings.control_dispatch_ttl):
+        wake_project.apply_async(args=[project_id], task_id=task_id)
+
+
+@app.task(bind=True, name='hibernate_project')
+def hibernate_project(self, project_id: str):
+    """
+    Hentikan container proyek yang idle. Update yang datang setelahnya
+    di-buffer ingress dan membangunkan proyek lagi
+    """
+    try:
+        if not claim_dispatch(project_id, 'hibernate', self.request.id, settings.control_dispatch_ttl):
+            return
+        
+        with project_lock(project_id):
+            project = fetch_project(project_id, Project.status, Project.container_id, Project.docker_host, Project.hibernation_enabled)
+            # Cek ulang: proyek bisa saja dihentikan atau menerima update sejak dicek beat
+            if (not project or not project.hibernation_enabled or project.status != ProjectStatus.RUNNING
+                    or not hibernation.idle_projects([project_id], settings.hibernation_idle_timeout)):
+                clear_dispatch(project_id, 'hibernate')
+                return
+            
+            print(f"Hibernating idle project {project_id}")
+            hibernation.clear_endpoint(project_id)
+            if project.container_id:
+                try:
+                    container = host_pool.client(project.docker_host).containers.get(project.container_id)
+                    container.stop(timeout=10)
+                    container.remove()
+                except docker.errors.NotFound:
+                    pass
+            
+            if transition_status(project_id, ProjectStatus.HIBERNATED, container_id=None):
+                hibernation.record_hibernation()
+        
+        # Update yang masuk selama container dihentikan langsung membangunkan lagi
+        if hibernation.has_buffered_updates(project_id):
+            dispatch_wake(project_id)
+        clear_dispatch(project_id, 'hibernate')
+    
+    except Exception as e:
+        if should_retry(self, e):
+            raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+        metrics.record_error(e)
+        print(f"Error hibernating project {project_id}: {e}")
+        clear_dispatch(project_id, 'hibernate')
+
+
+@app.task(bind=True, name='hibernate_idle_projects')
+def hibernate_idle_projects(self):
+    """
+    Task periodik (beat): hibernasi proyek opt-in yang tidak menerima update
+    selama hibernation_idle_timeout
+    """
+    idle = hibernation.idle_projects(hibernation_candidates(), settings.hibernation_idle_timeout)
+    for project_id in idle:
+        hibernate_project.delay(project_id)
+    return len(idle)
+
+
+@app.task(bind=True, name='reconcile_projects')
+def reconcile_projects(self, full: bool = False):
+    """
+    Task periodik (beat): tandai proyek RUNNING yang container-nya crash,
+    OOM atau hilang sebagai FAILED, perbaiki container_id yang berubah dan
+    hapus container proyek yang sudah dihapus. Pass biasa hanya membaca
+    event Docker sejak pass sebelumnya; pass penuh membandingkan semua
+    """
+    return reconcile.reconcile(full=full)
+
+
+@app.task(bind=True, name='reconcile_stats')
+def reconcile_stats(self):
+    """
+    Task untuk melaporkan counter reconciler
+    """
+    return reconcile.get_stats()
+
+
+@app.task(bind=True, name='export_project_image')
+def export_project_image(self, project_id: str):
+    """
+    Simpan image proyek yang baru dibuild ke MinIO agar start di node lain
+    cukup memuat image, bukan build ulang dari ZIP
+    """
+    image_tag = image_gc.project_image_tag(project_id)
+    try:
+        with metrics.stage('export'):
+            image_store.export_image(host_pool.client(host_pool.build_host), image_tag)
+    except docker.errors.ImageNotFound:
+        # Proyek dihapus atau image sudah dibuild ulang
+        print(f"Image {image_tag} no longer exists, skipping export")
+    except Exception as e:
+        if should_retry(self, e):
+            raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+        # Tanpa export, start di node lain tetap bisa lewat host build/build ulang
+        metrics.record_error(e)
+        print(f"Error exporting image {image_tag}: {e}")
+
+
+@app.task(bind=True, name='image_store_stats')
+def image_store_stats(self):
+    """
+    Task untuk melaporkan counter export/load image di MinIO
+    """
+    return image_store.get_stats()
+
+
+@app.task(bind=True, name='collect_images')
+def collect_images(self):
+    """
+    Task periodik (beat): GC image proyek per host dengan budget disk, lalu
+    buang blob image di MinIO yang tidak dipakai lagi. Return laporan per
+    host termasuk bytes yang dibebaskan
+    """
+    report = {'hosts': image_gc.collect()}
+    if settings.image_store_enabled:
+        try:
+            live_tags = {image_gc.project_image_tag(project_id) for project_id in project_statuses()}
+            report['image_store'] = image_store.prune(live_tags=live_tags)
+        except Exception as e:
+            metrics.record_error(e)
+            print(f"Error pruning image store: {e}")
+    return report
+
+
+@app.task(bind=True, name='remove_project_images')
+def remove_project_images(self, project_id: str):
+    """
+    Hapus container dan image proyek yang baru dihapus dari semua host
+    """
+    try:
+        removed = image_gc.remove_project(project_id)
+    except Exception as e:
+        if should_retry(self, e):
+            raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+        metrics.record_error(e)
+        print(f"Error removing images of project {project_id}: {e}")
+        removed = 0
+    clear_dispatch(project_id, 'remove_images')
+    return removed
+
+
+@app.task(bind=True, name='image_gc_stats')
+def image_gc_stats(self):
+    """
+    Task untuk melaporkan counter GC image
+    """
+    return image_gc.get_stats()
+
+
+@app.task(bind=True, name='hibernation_stats')
+def hibernation_stats(self):
+    """
+    Task untuk melaporkan jumlah wake/hibernasi dan latensi cold start
+    """
+    return hibernation.get_stats()
 
 
 if __name__ == '__main__':